@@ -0,0 +1,7 @@
+"""
+Benchmarks for the Tetris engine. Run from the repository root:
+
+    python -m benchmarks                   # time the tetris_logic hot paths against baseline.json
+    python -m benchmarks.bench_board       # list board against bitboard
+    python -m benchmarks.bench_batch       # BatchTetris against Tetris
+"""
@@ -0,0 +1,6 @@
+import sys
+
+from benchmarks.bench_logic import main
+
+
+sys.exit(main())
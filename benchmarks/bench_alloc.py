@@ -0,0 +1,82 @@
+"""
+Counts the memory allocated by moving and rotating a block, with tracemalloc.
+
+    python -m benchmarks.bench_alloc [--moves N]
+
+Each move is traced on its own: if the peak of traced memory rises above what was allocated before the move, the
+move allocated something, even if it was freed again before returning. The game's version counter is the one
+exception, as every change makes a new int once it passes the small ints Python caches, so the moves are made with
+the version reset below that. Some moves are made before counting, as Python specialises the bytecode of a function
+over its first few calls, which allocates. tests/test_alloc.py fails if any move allocates.
+"""
+import argparse
+import tracemalloc
+from random import Random
+
+from tetris_logic import Board, BitBoard
+from benchmarks.fixtures import make_game
+
+
+MOVES = ('LEFT', 'RIGHT', 'SOFT_DROP', 'ROTATE_CW', 'ROTATE_CCW')
+FIXTURES = ('empty', 'holes')
+WARMUP_MOVES = 1000
+
+
+def trace_moves(game, moves, rng):
+    """
+    Makes random moves with the current block, counting the ones that allocate memory after the first WARMUP_MOVES.
+    The block is put back at the top of the board whenever it lands, so it keeps moving through the same rows.
+
+    Args:
+        game (Tetris): The game.
+        moves (int): The number of moves to count.
+        rng (Random): The random number generator used to pick moves.
+
+    Returns:
+        dict: Maps each move to (moves made, moves that allocated, the most bytes one allocated).
+    """
+    block = game.current_block
+    start = (block.orientation, block.x, block.y)
+    counts = {move: [0, 0, 0] for move in MOVES}
+    for i, action in enumerate(rng.choices(MOVES, k=WARMUP_MOVES + moves)):
+        if game.check_y_collision(block):
+            block.set_position(*start)
+        game.version = 0
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        game.apply_action(action)
+        allocated = tracemalloc.get_traced_memory()[1] - before
+        if i < WARMUP_MOVES:
+            continue
+        count = counts[action]
+        count[0] += 1
+        count[1] += allocated > 0
+        count[2] = max(count[2], allocated)
+    return counts
+
+
+def run(moves):
+    """
+    Prints how many moves of each kind allocated memory, on each fixture and board type.
+
+    Args:
+        moves (int): The number of moves to make on each fixture.
+    """
+    print(f'{"fixture":<14}{"board":<10}{"move":<12}{"moves":>8}{"allocating":>12}{"max bytes":>11}')
+    tracemalloc.start()
+    try:
+        for fixture in FIXTURES:
+            for board_type in (Board, BitBoard):
+                game = make_game(fixture, board_type=board_type)
+                counts = trace_moves(game, moves, Random(0))
+                for move, (made, allocating, most) in counts.items():
+                    print(f'{fixture:<14}{board_type.__name__:<10}{move:<12}{made:>8}{allocating:>12}{most:>11}')
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--moves', type=int, default=10000, help='moves to make on each fixture')
+    args = parser.parse_args()
+    run(args.moves)
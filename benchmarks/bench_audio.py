@@ -0,0 +1,166 @@
+"""
+Measures the pygame frontend's audio: sounds dropped while keys are held, and how long music changes hold up the
+main thread.
+
+    python -m benchmarks.bench_audio [--seconds N]
+
+Set SDL_AUDIODRIVER=dummy to run without a sound card. Sounds still play, and finish, in real time.
+"""
+import argparse
+import threading
+from collections import Counter
+from time import perf_counter, sleep
+
+from pygame import mixer
+
+from tetris_audio import AudioEngine, SOUND_CHANNELS
+from tetris_gui_pygame import ASSETS, SOUND_RULES, MUSIC_TRACKS
+from benchmarks.bench_logic import format_ns
+
+
+KEY_REPEAT_INTERVAL = 0.035     # As set by pygame.key.set_repeat in the frontend, and the soft drop interval
+CLEAR_INTERVAL = 0.5            # Seconds between line clears while the keys are held
+# Sounds played while left and down are held: the name and every how many key repeats it plays
+HELD_SOUNDS = [('MOVE_X_SOUND', 1), ('MOVE_Y_SOUND', 1), ('ROTATE_SOUND', 4)]
+
+
+def hold_keys(play, seconds):
+    """
+    Plays the sounds of holding left and down, rotating now and then, with a line clear every CLEAR_INTERVAL.
+
+    Args:
+        play (function): Plays a sound by name, returning its channel, or None if it was dropped.
+        seconds (float): How long to hold the keys for.
+
+    Returns:
+        tuple: Counters of the plays asked for and the plays dropped, by sound name.
+    """
+    asked = Counter()
+    dropped = Counter()
+    start = perf_counter()
+    next_clear = start + CLEAR_INTERVAL
+    repeat = 0
+    while perf_counter() - start < seconds:
+        names = [name for name, every in HELD_SOUNDS if repeat % every == 0]
+        if (perf_counter() >= next_clear):
+            names.append('CLEAR_4')
+            next_clear += CLEAR_INTERVAL
+        for name in names:
+            asked[name] += 1
+            dropped[name] += play(name) is None
+        repeat += 1
+        sleep(KEY_REPEAT_INTERVAL)
+    return asked, dropped
+
+
+def play_anywhere(name):
+    """
+    Plays a sound the way the frontend did before AudioEngine, on any free channel.
+
+    Args:
+        name (str): The sound name.
+
+    Returns:
+        Channel: The channel it played on, or None if every channel was busy.
+    """
+    return ASSETS.sound(name).play()
+
+
+def watch_mixer(is_done):
+    """
+    Starts and stops a sound over and over on the main thread until something finishes, timing each call.
+
+    Args:
+        is_done (function): Returns whether to stop.
+
+    Returns:
+        float: The longest call, in seconds.
+    """
+    channel = mixer.Channel(0)
+    sound = ASSETS.sound('MOVE_Y_SOUND')
+    longest = 0
+    while not is_done():
+        start = perf_counter()
+        channel.play(sound)
+        longest = max(longest, perf_counter() - start)
+        sleep(0.001)
+    channel.stop()
+    return longest
+
+
+def decode_on_thread(track):
+    """
+    Decodes a track with mixer.Sound on a thread of this process, while watching the main thread's mixer calls.
+
+    Args:
+        track (Path): The track file.
+
+    Returns:
+        float: The longest mixer call on the main thread, in seconds.
+    """
+    thread = threading.Thread(target=mixer.Sound, args=(str(track),))
+    thread.start()
+    return watch_mixer(lambda: not thread.is_alive())
+
+
+def print_dropped(label, play, seconds):
+    """
+    Holds keys and prints the plays asked for and dropped.
+
+    Args:
+        label (str): What the plays are labelled with.
+        play (function): Plays a sound by name, returning its channel, or None if it was dropped.
+        seconds (float): How long to hold the keys for.
+    """
+    asked, dropped = hold_keys(play, seconds)
+    for name in asked:
+        print(f'{label:<14}{name:<16}{asked[name]:>8}{dropped[name]:>10}')
+
+
+def run(seconds):
+    """
+    Holds keys with and without the channel pool, then times changing music both ways.
+
+    Args:
+        seconds (float): How long to hold the keys for, each way.
+    """
+    mixer.init()
+    mixer.set_num_channels(SOUND_CHANNELS)
+    for name, _ in HELD_SOUNDS:
+        ASSETS.sound(name)
+    ASSETS.sound('CLEAR_4')
+
+    print(f'holding keys for {seconds:g} s on {SOUND_CHANNELS} channels, a line clear every {CLEAR_INTERVAL:g} s')
+    print(f'{"":<14}{"sound":<16}{"asked":>8}{"dropped":>10}')
+    print_dropped('any channel', play_anywhere, seconds)
+    mixer.stop()
+    audio = AudioEngine(ASSETS, SOUND_RULES)
+    print_dropped('AudioEngine', audio.play, seconds)
+
+    track = MUSIC_TRACKS[0]
+    start = perf_counter()
+    mixer.music.load(track)
+    mixer.music.play()
+    streamed = perf_counter() - start
+    mixer.music.stop()
+    longest_on_thread = decode_on_thread(track)
+
+    audio.prefetch(track)
+    longest_prefetching = watch_mixer(audio.tracks[track].done)
+    start = perf_counter()
+    audio.play_music(track)
+    crossfade = perf_counter() - start
+    audio.stop_music()
+    audio.close()
+
+    print(f'{"music.load and play on the main thread":<52}{format_ns(streamed*1e9):>10}')
+    print(f'{"longest mixer call while a thread decodes a track":<52}{format_ns(longest_on_thread*1e9):>10}')
+    print(f'{"longest mixer call while AudioEngine prefetches":<52}{format_ns(longest_prefetching*1e9):>10}')
+    print(f'{"AudioEngine.play_music of a prefetched track":<52}{format_ns(crossfade*1e9):>10}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3, help='seconds to hold the keys for, each way')
+    args = parser.parse_args()
+    run(args.seconds)
@@ -0,0 +1,253 @@
+"""
+Checks BatchTetris against the scalar Tetris class and reports batch throughput in game-steps per second.
+
+The check runs twice: once with the bot's moves mixed with random actions, which cover every kind of move, and
+once with the bot alone playing on boards built up around a well, which covers multi-line clears, tetrises and
+back-to-back chains. Either fails only if the engines disagree; the clears they made are reported.
+
+Random actions top out most games within a few hundred steps, so when timing, finished games are restarted with
+a new seed in both engines between the timed steps, and every game-step counted is one of a running game.
+
+    python -m benchmarks.bench_batch [--games N] [--steps N] [--check-games N]
+"""
+import argparse
+from random import Random
+from time import perf_counter
+
+from collections import Counter
+
+import numpy as np
+
+from tetris_logic import Tetris, ACTIONS
+from tetris_batch import BatchTetris, SHAPE_IDS, ACTION_IDS, get_scalar_state, step_scalar
+from tetris_bot import TetrisBot
+
+
+# Hard drops are rarer than the other inputs so that games last long enough to clear lines.
+ACTION_WEIGHTS = {'NOOP': 1, 'LEFT': 3, 'RIGHT': 3, 'ROTATE_CW': 2, 'ROTATE_CCW': 2,
+                  'SOFT_DROP': 3, 'HARD_DROP': 1, 'HOLD': 1, 'LOCK': 0.2, 'CLEAR': 0}
+# Rows filled around a well for the bot to play on, enough for several tetrises in a row
+WELL_DEPTH = 16
+RANDOM_FRACTION = 0.3   # Share of the actions in the mixed check that are random rather than the bot's
+
+
+def get_actions(n_games, n_steps, seed):
+    """
+    Gets random actions for every game and step.
+    
+    Args:
+        n_games (int): The number of games.
+        n_steps (int): The number of steps.
+        seed (int): The seed for the actions.
+        
+    Returns:
+        ndarray: Shape (n_steps, n_games), indices into ACTIONS.
+    """
+    weights = np.array([ACTION_WEIGHTS[action] for action in ACTIONS])
+    return np.random.default_rng(seed).choice(len(ACTIONS), size=(n_steps, n_games), p=weights/weights.sum())
+
+
+def fill_rows(game, batch, index, n_rows, seed, well=None):
+    """
+    Fills the bottom rows of a scalar game and the matching batch game, leaving one hole per row,
+    so that random play clears lines.
+    
+    Args:
+        game (Tetris): The scalar game.
+        batch (BatchTetris): The batch.
+        index (int): The index of the game in the batch.
+        n_rows (int): The number of rows to fill.
+        seed (int): The seed used to pick the holes and colours.
+        well (int): The column to leave every hole in, or None for a random column in each row.
+    """
+    rng = Random(seed)
+    for y in range(game.height - n_rows, game.height):
+        hole = rng.randrange(game.width) if well is None else well
+        for x in range(game.width):
+            if x != hole:
+                shape_name = rng.choice('IJLOSTZ')
+                game.board.fill_cells([(x, y)], shape_name)
+                batch.boards[index, y, x] = SHAPE_IDS[shape_name] + 1
+
+
+def check_against_scalar(n_games, n_steps):
+    """
+    Plays the same seeded games with the same actions through both engines and compares every step. The actions
+    are the bot's, with a random action instead at RANDOM_FRACTION of the steps, after which the bot plans afresh.
+    The bottom rows are filled first, each with one hole.
+    
+    Args:
+        n_games (int): The number of games.
+        n_steps (int): The number of steps.
+        
+    Returns:
+        tuple: A Counter of the random actions taken, by name, and a Counter of the clears by number of lines.
+    """
+    batch = BatchTetris(n_games)
+    games = [Tetris(seed=seed) for seed in range(n_games)]
+    for i, game in enumerate(games):
+        fill_rows(game, batch, i, 10, seed=i)
+    random_actions = get_actions(n_games, n_steps, seed=1)
+    is_random = np.random.default_rng(3).random((n_steps, n_games)) < RANDOM_FRACTION
+    bot = TetrisBot()
+    plans = [[] for _ in games]
+    taken = Counter()
+    clears = Counter()
+    for step in range(n_steps):
+        actions = random_actions[step].copy()
+        for i, game in enumerate(games):
+            if game.check_game_over():
+                continue
+            if is_random[step, i]:
+                plans[i] = []
+                taken[ACTIONS[actions[i]]] += 1
+                continue
+            if not plans[i]:
+                plans[i] = bot.choose_actions(game)
+            actions[i] = ACTION_IDS[plans[i].pop(0)]
+        cleared = step_both(batch, games, actions, step)
+        clears.update(cleared[cleared > 0].tolist())
+    return taken, clears
+
+
+def check_bot_against_scalar(n_games, n_steps):
+    """
+    Has the bot play the scalar games, on boards filled around a well, and plays its actions through both engines,
+    comparing every step. Each game's well is in a different column.
+
+    Args:
+        n_games (int): The number of games.
+        n_steps (int): The number of steps.
+
+    Returns:
+        tuple: A Counter of the clears by number of lines, and the longest back-to-back chain.
+    """
+    batch = BatchTetris(n_games)
+    games = [Tetris(seed=seed) for seed in range(n_games)]
+    for i, game in enumerate(games):
+        fill_rows(game, batch, i, WELL_DEPTH, seed=i, well=i % game.width)
+    bot = TetrisBot()
+    plans = [[] for _ in games]
+    clears = Counter()
+    longest_b2b = 0
+    for step in range(n_steps):
+        actions = np.full(n_games, ACTION_IDS['NOOP'])
+        for i, game in enumerate(games):
+            if not game.check_game_over():
+                if not plans[i]:
+                    plans[i] = bot.choose_actions(game)
+                actions[i] = ACTION_IDS[plans[i].pop(0)]
+        cleared = step_both(batch, games, actions, step)
+        clears.update(cleared[cleared > 0].tolist())
+        longest_b2b = max(longest_b2b, int(batch.prev_clears.max()) - 4)
+    return clears, longest_b2b
+
+
+def step_both(batch, games, actions, step):
+    """
+    Applies one step of actions to the batch and to each scalar game that is still running, checking they match.
+
+    Args:
+        batch (BatchTetris): The batch.
+        games (list): The scalar games, one per game in the batch.
+        actions (ndarray): One index into ACTIONS per game.
+        step (int): The number of the step, for the error messages.
+
+    Returns:
+        ndarray: The number of lines the batch cleared in each game.
+    """
+    cleared = batch.step(actions)
+    for i, game in enumerate(games):
+        if batch.game_over[i] and game.check_game_over():
+            continue
+        step_scalar(game, ACTIONS[actions[i]])
+        assert bool(batch.game_over[i]) == game.check_game_over(), f'game {i} step {step}: game over differs'
+        assert batch.get_game_state(i) == get_scalar_state(game), f'game {i} step {step}: state differs'
+    return cleared
+
+
+def time_batch(n_games, actions):
+    """
+    Times stepping a batch, restarting each game that tops out with the next unused seed. Restarts aren't timed.
+
+    Args:
+        n_games (int): The number of games.
+        actions (ndarray): Shape (n_steps, at least n_games), indices into ACTIONS.
+
+    Returns:
+        tuple: The time taken in seconds, and the number of games restarted.
+    """
+    batch = BatchTetris(n_games)
+    next_seed = n_games
+    elapsed = 0
+    for step_actions in actions[:, :n_games]:
+        start = perf_counter()
+        batch.step(step_actions)
+        elapsed += perf_counter() - start
+        finished = np.flatnonzero(batch.game_over)
+        if len(finished):
+            batch.reset(finished, range(next_seed, next_seed + len(finished)))
+            next_seed += len(finished)
+    return elapsed, next_seed - n_games
+
+
+def time_scalar(n_games, actions):
+    """
+    Times stepping scalar games, replacing each game that tops out with a new one with the next unused seed.
+    Replacing games isn't timed.
+
+    Args:
+        n_games (int): The number of games.
+        actions (ndarray): Shape (n_steps, at least n_games), indices into ACTIONS.
+
+    Returns:
+        tuple: The time taken in seconds, and the number of games restarted.
+    """
+    games = [Tetris(seed=seed) for seed in range(n_games)]
+    next_seed = n_games
+    elapsed = 0
+    for step_actions in actions[:, :n_games].tolist():
+        start = perf_counter()
+        for game, action in zip(games, step_actions):
+            step_scalar(game, ACTIONS[action])
+        elapsed += perf_counter() - start
+        for i, game in enumerate(games):
+            if game.check_game_over():
+                games[i] = Tetris(seed=next_seed)
+                next_seed += 1
+    return elapsed, next_seed - n_games
+
+
+def run(n_games, n_steps, n_check_games):
+    """
+    Runs the equivalence checks, then times the batch engine and the scalar engine on running games only.
+    
+    Args:
+        n_games (int): The number of games to time in the batch.
+        n_steps (int): The number of steps to time.
+        n_check_games (int): The number of games to check against the scalar engine.
+    """
+    taken, clears = check_against_scalar(n_check_games, n_steps)
+    print(f'{n_check_games} games x {n_steps} steps, {RANDOM_FRACTION:.0%} random, match the scalar engine '
+          f'({len(taken)} kinds of random action, clears by lines {dict(sorted(clears.items()))})')
+    clears, longest_b2b = check_bot_against_scalar(n_check_games, n_steps)
+    print(f'{n_check_games} bot games x {n_steps} steps match the scalar engine (clears by lines '
+          f'{dict(sorted(clears.items()))}, longest back-to-back chain {longest_b2b})')
+
+    actions = get_actions(n_games, n_steps, seed=2)
+    scalar_games = min(n_games, 256)
+    timings = [('BatchTetris', n_games, time_batch), ('BatchTetris', scalar_games, time_batch),
+               ('Tetris', scalar_games, time_scalar)]
+    for name, games, time_steps in timings:
+        elapsed, restarts = time_steps(games, actions)
+        print(f'{name} x{games}: {games*n_steps/elapsed:,.0f} game-steps/s of running games '
+              f'({restarts} games restarted)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', type=int, default=4096, help='games to time in one batch')
+    parser.add_argument('--steps', type=int, default=500, help='steps per game')
+    parser.add_argument('--check-games', type=int, default=64, help='games to check against the scalar engine')
+    args = parser.parse_args()
+    run(args.games, args.steps, args.check_games)
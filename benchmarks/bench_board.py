@@ -0,0 +1,56 @@
+"""
+Compares the list board against the bitboard on the checks that dominate headless play.
+
+    python -m benchmarks.bench_board [--number N]
+"""
+import argparse
+from timeit import Timer
+
+from tetris_logic import Board, BitBoard, Block, Tetris, SPAWN_X, SPAWN_Y
+from benchmarks.fixtures import make_game
+
+
+def get_cases(game):
+    """
+    Gets the operations to time for a game.
+    
+    Args:
+        game (Tetris): The game to time operations on.
+    
+    Returns:
+        dict: A mapping from operation name to a zero-argument callable.
+    """
+    block = Block('T', SPAWN_X, SPAWN_Y + 8)
+    return {
+        'check_x_collision': lambda: game.check_x_collision(True, block),
+        'check_y_collision': lambda: game.check_y_collision(block),
+        'get_cleared_lines': game.get_cleared_lines,
+        'check_game_over': game.check_game_over,
+    }
+
+
+def run(number):
+    """
+    Times each operation on both backends and prints ops/sec and the speedup.
+    
+    Args:
+        number (int): The number of calls per timing run.
+    """
+    results = {}
+    for board_type in (Board, BitBoard):
+        game = make_game('half_full', board_type=board_type, full_rows=2)
+        for name, case in get_cases(game).items():
+            best = min(Timer(case).repeat(repeat=5, number=number))
+            results[(board_type.__name__, name)] = number/best
+            
+    print(f'{"operation":<20}{"Board ops/s":>16}{"BitBoard ops/s":>18}{"speedup":>10}')
+    for name in get_cases(Tetris()):
+        list_ops = results[('Board', name)]
+        bit_ops = results[('BitBoard', name)]
+        print(f'{name:<20}{list_ops:>16,.0f}{bit_ops:>18,.0f}{bit_ops/list_ops:>9.2f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='calls per timing run')
+    run(parser.parse_args().number)
@@ -0,0 +1,58 @@
+"""
+Times the bot's decisions on every fixture board, and over whole headless games.
+
+    python -m benchmarks.bench_bot [--number N] [--repeat N] [--pieces N]
+"""
+import argparse
+from statistics import median
+from time import perf_counter
+
+from tetris_bot import TetrisBot, play_game
+from tetris_moves import search
+from benchmarks.fixtures import FIXTURES, make_game
+from benchmarks.bench_logic import time_operation, format_ns
+
+
+def clear_search_cache(game):
+    """
+    Empties the move generator's cache, so that every decision on a fixture searches the board again.
+
+    Args:
+        game (Tetris): The fixture game.
+
+    Returns:
+        Tetris: The same game.
+    """
+    search.cache_clear()
+    return game
+
+
+def run(number, repeat, pieces):
+    """
+    Prints the median time per decision and decisions per second on each fixture and over a game.
+
+    Args:
+        number (int): The number of decisions per repeat on the fixtures.
+        repeat (int): The number of repeats.
+        pieces (int): The maximum number of blocks to place in the game.
+    """
+    bot = TetrisBot()
+    print(f'{"benchmark":<24}{"decision":>12}{"decisions/s":>14}')
+    for fixture in FIXTURES:
+        game = make_game(fixture)
+        ns = median(time_operation(clear_search_cache, bot.choose_actions, game, number, repeat))
+        print(f'{fixture:<24}{format_ns(ns):>12}{1e9/ns:>14,.0f}')
+
+    start = perf_counter()
+    _, blocks = play_game(0, pieces, bot)
+    ns = (perf_counter() - start)/blocks*1e9
+    print(f'{"game":<24}{format_ns(ns):>12}{1e9/ns:>14,.0f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=50, help='decisions per repeat')
+    parser.add_argument('--repeat', type=int, default=5, help='repeats per benchmark')
+    parser.add_argument('--pieces', type=int, default=500, help='maximum blocks to place in the game')
+    args = parser.parse_args()
+    run(args.number, args.repeat, args.pieces)
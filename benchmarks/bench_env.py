@@ -0,0 +1,174 @@
+"""
+Checks the vector environment against the single game environment and reports the steps per second of each,
+against stepping Tetris directly.
+
+    python -m benchmarks.bench_env [--envs N] [--steps N] [--check-envs N]
+"""
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from tetris_logic import Tetris, BitBoard, ACTIONS
+from tetris_batch import step_scalar
+from tetris_env import TetrisEnv, VectorTetrisEnv
+from benchmarks.bench_batch import get_actions, fill_rows
+
+
+def check_against_single(n_envs, n_steps):
+    """
+    Plays the same seeded games with the same actions in both environments and compares every step, checking
+    that the observations are written into the same arrays each time. The bottom rows are filled first so that
+    random play clears lines, and halfway through every other game is reset with a new seed.
+
+    Args:
+        n_envs (int): The number of games.
+        n_steps (int): The number of steps.
+
+    Returns:
+        int: The total reward, to show the check covered line clears.
+    """
+    vector = VectorTetrisEnv(n_envs)
+    envs = [TetrisEnv() for _ in range(n_envs)]
+    for seed, env in enumerate(envs):
+        env.reset(seed)
+    vector.reset(range(n_envs))
+    for i, env in enumerate(envs):
+        fill_rows(env.game, vector.batch, i, 10, seed=i)
+    observations = [env.observe() for env in envs]
+    vector_observation = vector.observe()
+    arrays = [id(array) for array in vector_observation.values()]
+    actions = get_actions(n_envs, n_steps, seed=1)
+    total = 0
+    for step in range(n_steps):
+        if (step == n_steps//2):
+            restarted = np.arange(0, n_envs, 2)
+            vector.reset([n_envs + i for i in restarted.tolist()], restarted)
+            for i in restarted.tolist():
+                envs[i].reset(n_envs + i)
+        vector_observation, rewards, dones, _ = vector.step(actions[step])
+        assert [id(array) for array in vector_observation.values()] == arrays, f'step {step}: new arrays'
+        total += int(rewards.sum())
+        for i, env in enumerate(envs):
+            observation, reward, done, _ = env.step(actions[step, i])
+            assert observation is observations[i], f'env {i} step {step}: new observation'
+            assert (reward, done) == (rewards[i], dones[i]), f'env {i} step {step}: reward or done differs'
+            for name, array in observation.items():
+                assert np.array_equal(array, vector_observation[name][i]), f'env {i} step {step}: {name} differs'
+    return total
+
+
+def check_auto_reset(n_envs, n_steps):
+    """
+    Steps a vector environment with auto_reset, checking that each game that finishes is reported done and
+    replaced by a new game with the same observation as a TetrisEnv started with its seed.
+
+    Args:
+        n_envs (int): The number of games.
+        n_steps (int): The number of steps.
+
+    Returns:
+        int: The number of games that finished.
+    """
+    vector = VectorTetrisEnv(n_envs, auto_reset=True)
+    vector.reset()
+    actions = get_actions(n_envs, n_steps, seed=3)
+    finished = 0
+    for step in range(n_steps):
+        vector_observation, _, dones, _ = vector.step(actions[step])
+        for i in np.flatnonzero(dones).tolist():
+            env = TetrisEnv()
+            observation = env.reset(vector.batch.seeds[i])
+            for name, array in observation.items():
+                assert np.array_equal(array, vector_observation[name][i]), f'env {i} step {step}: {name} differs'
+            finished += 1
+    return finished
+
+
+def time_direct(n_envs, actions):
+    """
+    Times stepping Tetris games directly, the way the environments step them.
+
+    Args:
+        n_envs (int): The number of games.
+        actions (ndarray): Shape (n_steps, n_envs), indices into ACTIONS.
+
+    Returns:
+        float: The time taken, in seconds.
+    """
+    games = [Tetris(board_type=BitBoard, seed=seed) for seed in range(n_envs)]
+    start = perf_counter()
+    for step_actions in actions.tolist():
+        for game, action in zip(games, step_actions):
+            if not game.check_game_over():
+                step_scalar(game, ACTIONS[action])
+    return perf_counter() - start
+
+
+def time_single(n_envs, actions):
+    """
+    Times stepping TetrisEnv environments.
+
+    Args:
+        n_envs (int): The number of environments.
+        actions (ndarray): Shape (n_steps, n_envs), indices into ACTIONS.
+
+    Returns:
+        float: The time taken, in seconds.
+    """
+    envs = [TetrisEnv() for _ in range(n_envs)]
+    for seed, env in enumerate(envs):
+        env.reset(seed)
+    start = perf_counter()
+    for step_actions in actions.tolist():
+        for env, action in zip(envs, step_actions):
+            env.step(action)
+    return perf_counter() - start
+
+
+def time_vector(n_envs, actions):
+    """
+    Times stepping a VectorTetrisEnv.
+
+    Args:
+        n_envs (int): The number of environments.
+        actions (ndarray): Shape (n_steps, n_envs), indices into ACTIONS.
+
+    Returns:
+        float: The time taken, in seconds.
+    """
+    vector = VectorTetrisEnv(n_envs)
+    vector.reset(range(n_envs))
+    start = perf_counter()
+    for step_actions in actions:
+        vector.step(step_actions)
+    return perf_counter() - start
+
+
+def run(n_envs, n_steps, n_check_envs):
+    """
+    Runs the equivalence check, then times each way of stepping the games.
+
+    Args:
+        n_envs (int): The number of environments to time.
+        n_steps (int): The number of steps to time.
+        n_check_envs (int): The number of environments to check.
+    """
+    total = check_against_single(n_check_envs, n_steps)
+    print(f'{n_check_envs} envs x {n_steps} steps match between TetrisEnv and VectorTetrisEnv (total reward {total})')
+    finished = check_auto_reset(n_check_envs, n_steps)
+    print(f'{finished} games finished and restarted with auto_reset')
+
+    actions = get_actions(n_envs, n_steps, seed=2)
+    for name, time_steps in (('Tetris', time_direct), ('TetrisEnv', time_single), ('VectorTetrisEnv', time_vector)):
+        elapsed = time_steps(n_envs, actions)
+        print(f'{name + " x" + str(n_envs):<24}{n_envs*n_steps/elapsed:>12,.0f} steps/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--envs', type=int, default=256, help='environments to time')
+    parser.add_argument('--steps', type=int, default=500, help='steps per environment')
+    parser.add_argument('--check-envs', type=int, default=32, help='environments to check')
+    args = parser.parse_args()
+    run(args.envs, args.steps, args.check_envs)
@@ -0,0 +1,358 @@
+"""
+Times the hot paths of tetris_logic on every fixture board, plus a whole seeded game, and checks them against a stored baseline.
+
+    python -m benchmarks [--save] [--compare] [--baseline PATH] [--threshold 0.4]
+
+Every repeat of every benchmark also times a fixed pure Python reference workload, and results are compared with
+the baseline as ratios to it. That way a machine whose speed drifts, or a baseline saved on a faster or slower
+machine, doesn't read as a regression. It is only rough across machines, which differ in more than speed, so save a
+new baseline with --save before comparing on a different machine.
+
+The repeats are run round robin, one repeat of every benchmark at a time, so a burst of load from elsewhere on the
+machine lands in one repeat of many benchmarks rather than every repeat of one, and the median repeat is compared.
+A benchmark fails the comparison when its median slows by more than the threshold, or by more than NOISE_SIGMAS
+times the noise in the two medians, estimated from the spread of their repeats, if that is larger. On a shared
+virtual machine the medians of unchanged code still moved by up to 25% between runs, hence the default of 40%.
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+from copy import deepcopy
+from functools import partial
+from math import pi, sqrt
+from pathlib import Path
+from random import Random
+from statistics import median, stdev
+from time import perf_counter
+
+from tetris_logic import Board, BitBoard
+from benchmarks.fixtures import FIXTURES, make_game
+
+
+BASELINE_PATH = Path(__file__).parent/'baseline.json'
+BOARD_TYPES = {'Board': Board, 'BitBoard': BitBoard}
+REFERENCE_CALLS = 20    # Calls of the reference workload timed with each repeat
+NOISE_SIGMAS = 3        # Standard errors of the difference in medians that a change must exceed to fail
+# Converts a median absolute deviation into the standard error of a median for each repeat: the MAD times 1.4826 is
+# the standard deviation of normal samples, and the median's standard error is sqrt(pi/2) times that of the mean.
+MEDIAN_ERROR_SCALE = 1.4826*sqrt(pi/2)
+
+
+def uncache_ghost(game):
+    """
+    Drops the cached ghost block so that get_ghost_block has to recompute it.
+    
+    Args:
+        game (Tetris): The game.
+    
+    Returns:
+        Tetris: The same game.
+    """
+    game.ghost_key = None
+    return game
+
+
+# Operations timed on every fixture, as (setup, operation). Setup builds a fresh state from the
+# fixture game and isn't timed, so operations that change the game always start from the same place.
+OPERATIONS = {
+    'move_x': (deepcopy, lambda game: game.move_x(game.current_block, True)),
+    'move_down': (deepcopy, lambda game: game.move_down(game.current_block)),
+    'Tetris.rotate': (deepcopy, lambda game: game.rotate(game.current_block, True)),
+    'hard_drop': (deepcopy, lambda game: game.hard_drop()),
+    'get_cleared_lines': (lambda game: game, lambda game: game.get_cleared_lines()),
+    'clear_lines': (lambda game: (deepcopy(game), game.get_cleared_lines()), lambda state: state[0].clear_lines(state[1])),
+    'get_ghost_block': (uncache_ghost, lambda game: game.get_ghost_block()),
+}
+
+# Relative weights of the inputs in the scripted game.
+SCRIPT_WEIGHTS = {'LEFT': 3, 'RIGHT': 3, 'ROTATE_CW': 2, 'ROTATE_CCW': 1, 'SOFT_DROP': 3, 'HARD_DROP': 2, 'HOLD': 1}
+
+
+def reference_workload():
+    """
+    Does a fixed amount of plain Python work, of the same kinds as the engine does, to measure the machine by.
+
+    Returns:
+        int: A count, so that the work isn't optimised away.
+    """
+    rows = [[(x*y) % 7 for x in range(10)] for y in range(26)]
+    total = 0
+    for _ in range(20):
+        for row in rows:
+            total += sum(1 for cell in row if cell)
+    return total
+
+
+def time_reference():
+    """
+    Times the reference workload.
+
+    Returns:
+        float: The median time of REFERENCE_CALLS calls, in nanoseconds.
+    """
+    times = []
+    for _ in range(REFERENCE_CALLS):
+        start = perf_counter()
+        reference_workload()
+        times.append(perf_counter() - start)
+    return median(times)*1e9
+
+
+def time_operation(setup, operation, game, number, repeat, ratios=None):
+    """
+    Times an operation, with a fresh setup before every call.
+    Garbage collection is paused while timing, as in timeit, so that collections triggered by setup don't land in a sample.
+    Each repeat takes the median call rather than the mean, so that a call interrupted by the OS doesn't count.
+
+    Args:
+        setup (function): Builds the operation's argument from the fixture game.
+        operation (function): The operation to time.
+        game (Tetris): The fixture game.
+        number (int): The number of calls per repeat.
+        repeat (int): The number of repeats.
+        ratios (list): If given, the reference workload is timed straight after each repeat, and the ratio of the
+            repeat to it is appended.
+
+    Returns:
+        list: The median time per call of each repeat, in nanoseconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        times = []
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(number):
+                state = setup(game)
+                start = perf_counter()
+                operation(state)
+                times.append(perf_counter() - start)
+            samples.append(median(times)*1e9)
+            if ratios is not None:
+                ratios.append(samples[-1]/time_reference())
+        finally:
+            gc.enable()
+    return samples
+
+
+def play_scripted_game(seed, board_type, max_steps=5000):
+    """
+    Plays a game with inputs drawn from a seeded script, clearing lines after every input like the GUIs.
+
+    Args:
+        seed (int): The seed for the game and the script.
+        board_type (type): The board class to use.
+        max_steps (int): The maximum number of inputs.
+
+    Returns:
+        Tetris: The finished game.
+    """
+    game = make_game('empty', seed=seed, board_type=board_type)
+    rng = Random(seed)
+    actions = list(SCRIPT_WEIGHTS)
+    weights = list(SCRIPT_WEIGHTS.values())
+    for action in rng.choices(actions, weights, k=max_steps):
+        if game.check_game_over():
+            break
+        game.apply_action(action)
+        cleared_lines = game.get_cleared_lines()
+        if cleared_lines:
+            game.clear_lines(cleared_lines)
+    return game
+
+
+def time_scripted_game(board_type, ratios):
+    """
+    Times one scripted game, then the reference workload.
+
+    Args:
+        board_type (type): The board class to use.
+        ratios (list): The ratio of the game's time to the reference workload is appended.
+
+    Returns:
+        list: The time of the game, in nanoseconds.
+    """
+    start = perf_counter()
+    play_scripted_game(0, board_type)
+    sample = (perf_counter() - start)*1e9
+    ratios.append(sample/time_reference())
+    return [sample]
+
+
+def run(board_type_name, number, repeat):
+    """
+    Runs every benchmark, one repeat of each at a time.
+
+    Args:
+        board_type_name (str): The name of the board class to use.
+        number (int): The number of calls per repeat for single operations.
+        repeat (int): The number of repeats.
+
+    Returns:
+        dict: Maps each benchmark name to its statistics in nanoseconds.
+    """
+    board_type = BOARD_TYPES[board_type_name]
+    benchmarks = {}
+    for fixture in FIXTURES:
+        game = make_game(fixture, board_type=board_type, full_rows=2)
+        for name, (setup, operation) in OPERATIONS.items():
+            benchmarks[f'{name}[{fixture}]'] = partial(time_operation, setup, operation, game, number, 1)
+    benchmarks['scripted_game'] = partial(time_scripted_game, board_type)
+
+    samples = {name: [] for name in benchmarks}
+    ratios = {name: [] for name in benchmarks}
+    for _ in range(repeat):
+        for name, time_repeat in benchmarks.items():
+            samples[name] += time_repeat(ratios=ratios[name])
+    return {name: get_stats(samples[name], ratios[name]) for name in benchmarks}
+
+
+def get_stats(samples, ratios):
+    """
+    Summarises timing samples.
+
+    Args:
+        samples (list): The samples, in nanoseconds.
+        ratios (list): The ratio of each sample to the reference workload timed with it.
+
+    Returns:
+        dict: The median, minimum and standard deviation, the median ratio to the reference, its median absolute
+            deviation relative to the median, and the number of repeats.
+    """
+    median_ratio = median(ratios)
+    return {
+        'median_ns': median(samples),
+        'min_ns': min(samples),
+        'stdev_ns': stdev(samples) if len(samples) > 1 else 0.0,
+        'median_ratio': median_ratio,
+        'mad_ratio': median(abs(ratio - median_ratio) for ratio in ratios)/median_ratio,
+        'repeat': len(ratios)
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compares results against a baseline, as ratios to the reference workload.
+
+    Args:
+        results (dict): The results of this run.
+        baseline (dict): The stored results.
+        threshold (float): The smallest allowed relative slowdown of the median repeat, e.g. 0.4 for 40%.
+
+    Returns:
+        list: The names of the benchmarks that regressed.
+    """
+    regressions = []
+    for name in results:
+        if (name in baseline and get_change(results[name], baseline[name]) >
+                get_threshold(results[name], baseline[name], threshold)):
+            regressions.append(name)
+    return regressions
+
+
+def get_change(stats, baseline_stats):
+    """
+    Gets the relative change in a benchmark from the baseline, in its median ratio to the reference workload.
+
+    Args:
+        stats (dict): The benchmark's statistics from this run.
+        baseline_stats (dict): Its statistics in the baseline.
+
+    Returns:
+        float: The change, e.g. 0.1 for 10% slower.
+    """
+    return stats['median_ratio']/baseline_stats['median_ratio'] - 1
+
+
+def get_threshold(stats, baseline_stats, threshold):
+    """
+    Gets the slowdown a benchmark is allowed: the threshold, or NOISE_SIGMAS standard errors of the difference
+    between the two medians if that is larger.
+
+    Args:
+        stats (dict): The benchmark's statistics from this run.
+        baseline_stats (dict): Its statistics in the baseline.
+        threshold (float): The smallest allowed relative slowdown.
+
+    Returns:
+        float: The allowed slowdown, e.g. 0.4 for 40%.
+    """
+    error = MEDIAN_ERROR_SCALE*sqrt(stats['mad_ratio']**2/stats['repeat'] +
+                                    baseline_stats['mad_ratio']**2/baseline_stats['repeat'])
+    return max(threshold, NOISE_SIGMAS*error)
+
+
+def print_results(results, baseline=None, threshold=0.0):
+    """
+    Prints the results as a table, with the change from the baseline and the change allowed if there is one.
+
+    Args:
+        results (dict): The results of this run.
+        baseline (dict): The stored results, or None.
+        threshold (float): The smallest allowed relative slowdown.
+    """
+    print(f'{"benchmark":<36}{"median":>12}{"min":>12}{"stdev":>12}{"vs baseline":>14}{"allowed":>10}')
+    for name, stats in results.items():
+        change = allowed = ''
+        if (baseline and name in baseline and 'median_ratio' in baseline[name]):
+            change = f'{get_change(stats, baseline[name]):+.1%}'
+            allowed = f'{get_threshold(stats, baseline[name], threshold):.0%}'
+        print(f'{name:<36}{format_ns(stats["median_ns"]):>12}{format_ns(stats["min_ns"]):>12}'
+              f'{format_ns(stats["stdev_ns"]):>12}{change:>14}{allowed:>10}')
+
+
+def format_ns(ns):
+    """
+    Formats a time in nanoseconds with a readable unit.
+
+    Args:
+        ns (float): The time in nanoseconds.
+
+    Returns:
+        str: The formatted time.
+    """
+    for unit, scale in (('s', 1e9), ('ms', 1e6), ('µs', 1e3)):
+        if ns >= scale:
+            return f'{ns/scale:.2f} {unit}'
+    return f'{ns:.0f} ns'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--board', choices=BOARD_TYPES, default='Board', help='board class to benchmark')
+    parser.add_argument('--number', type=int, default=200, help='calls per repeat for single operations')
+    parser.add_argument('--repeat', type=int, default=15, help='repeats per benchmark')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH, help='baseline JSON file')
+    parser.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--compare', action='store_true', help='fail if any benchmark regresses past the threshold')
+    parser.add_argument('--threshold', type=float, default=0.4,
+                        help='allowed relative slowdown of the median, raised for noisy benchmarks')
+    args = parser.parse_args(argv)
+
+    results = run(args.board, args.number, args.repeat)
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    baseline = stored.get('boards', {}).get(args.board)
+    print_results(results, baseline, args.threshold)
+
+    if args.save:
+        stored.setdefault('boards', {})[args.board] = results
+        stored['machine'] = {'python': platform.python_version(), 'platform': platform.platform()}
+        args.baseline.write_text(json.dumps(stored, indent=2) + '\n')
+        print(f'Saved baseline for {args.board} to {args.baseline}')
+
+    if args.compare:
+        if (baseline is None or any('median_ratio' not in stats for stats in baseline.values())):
+            print(f'No baseline for {args.board} in {args.baseline} saved with median ratios, save one with --save')
+            return 1
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} benchmarks regressed by more than allowed: {", ".join(regressions)}')
+            return 1
+        print(f'No regressions past {args.threshold:.0%}, or the noise allowance of noisier benchmarks')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Times the move generator on every fixture board, for each shape at its spawn position.
+
+    python -m benchmarks.bench_moves [--number N] [--repeat N]
+
+Cold searches clear the cache before every call, and cached ones look up a board that was already searched.
+"""
+import argparse
+from statistics import median
+
+from tetris_logic import SHAPES, Block, SPAWN_X, SPAWN_Y
+from tetris_moves import get_move_map, search
+from tetris_bot import TetrisBot
+from benchmarks.fixtures import FIXTURES, make_game
+from benchmarks.bench_logic import time_operation, format_ns
+
+
+def get_spawn_block(game, shape_name):
+    """
+    Makes a block of a shape where it would spawn in a game, like Tetris.get_new_shape and Tetris.add_top_pad.
+
+    Args:
+        game (Tetris): The game.
+        shape_name (str): The name of the shape type.
+
+    Returns:
+        Block: The block.
+    """
+    block = Block(shape_name, SPAWN_X, SPAWN_Y - (shape_name == 'T'))
+    return TetrisBot().get_spawned_block(game, block)
+
+
+def search_cold(args):
+    """
+    Searches a board and block without the cache.
+
+    Args:
+        args (tuple): The board and block.
+
+    Returns:
+        MoveMap: The reachable lock positions.
+    """
+    search.cache_clear()
+    return get_move_map(*args)
+
+
+def run(number, repeat):
+    """
+    Prints the median cold and cached search times, and the number of distinct placements, on each fixture.
+    The times are the mean over the shapes, with the slowest shape's cold time alongside.
+
+    Args:
+        number (int): The number of searches per repeat.
+        repeat (int): The number of repeats.
+    """
+    print(f'{"benchmark":<16}{"cold":>12}{"slowest":>12}{"cached":>12}{"placements":>12}')
+    for fixture in FIXTURES:
+        game = make_game(fixture)
+        cold = []
+        cached = []
+        placements = 0
+        for shape_name in SHAPES:
+            block = get_spawn_block(game, shape_name)
+            setup = lambda game: (game.board, block)
+            cold.append(median(time_operation(setup, search_cold, game, number, repeat)))
+            cached.append(median(time_operation(setup, lambda args: get_move_map(*args), game, number, repeat)))
+            placements += len(get_move_map(game.board, block).get_distinct_locks())
+        print(f'{fixture:<16}{format_ns(sum(cold)/len(cold)):>12}{format_ns(max(cold)):>12}'
+              f'{format_ns(sum(cached)/len(cached)):>12}{placements/len(SHAPES):>12.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=50, help='searches per repeat')
+    parser.add_argument('--repeat', type=int, default=5, help='repeats per benchmark')
+    args = parser.parse_args()
+    run(args.number, args.repeat)
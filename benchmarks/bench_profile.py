@@ -0,0 +1,63 @@
+"""
+Measures the overhead of the profiler on scripted games: never enabled, enabled, and enabled then disabled.
+
+    python -m benchmarks.bench_profile [--games N] [--repeat N]
+"""
+import argparse
+from time import perf_counter
+
+from tetris_logic import Board
+from tetris_profile import Profiler
+from benchmarks.bench_logic import play_scripted_game
+
+
+def time_games(games, repeat):
+    """
+    Times playing some scripted games.
+
+    Args:
+        games (int): The number of games, seeded from 0.
+        repeat (int): The number of repeats.
+
+    Returns:
+        float: The best time for all the games, in seconds.
+    """
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        for seed in range(games):
+            play_scripted_game(seed, Board)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(games, repeat):
+    """
+    Prints the time for the games in each state of the profiler, relative to never enabling it.
+
+    Args:
+        games (int): The number of games.
+        repeat (int): The number of repeats.
+    """
+    profiler = Profiler()
+    baseline = time_games(games, repeat)
+    profiler.enable()
+    enabled = time_games(games, repeat)
+    profiler.disable()
+    disabled = time_games(games, repeat)
+
+    calls = sum(calls for calls, _, _ in profiler.stats.values())
+    print(f'{"profiler":<12}{"time":>12}{"overhead":>12}')
+    for name, seconds in (('off', baseline), ('enabled', enabled), ('disabled', disabled)):
+        print(f'{name:<12}{seconds*1000:>9.1f} ms{(seconds/baseline - 1)*100:>+11.1f}%')
+    print(f'{calls/repeat:,.0f} profiled calls per repeat, '
+          f'{(enabled - baseline)/(calls/repeat)*1e9:,.0f} ns each when enabled')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', type=int, default=5, help='scripted games per repeat')
+    parser.add_argument('--repeat', type=int, default=5, help='repeats per measurement')
+    args = parser.parse_args()
+    run(args.games, args.repeat)
@@ -0,0 +1,134 @@
+"""
+Checks the randomizers and times dealing pieces from them, one at a time and in bulk, and pulling the next piece
+from queues of different lengths.
+
+    python -m benchmarks.bench_randomizer [--pieces N]
+"""
+import argparse
+from random import Random
+from time import perf_counter
+
+from tetris_logic import SHAPES, Tetris, BagRandomizer, RandomRandomizer, HistoryRandomizer
+from benchmarks.bench_logic import format_ns
+
+
+RANDOMIZERS = [BagRandomizer, RandomRandomizer, HistoryRandomizer]
+QUEUE_LENGTHS = (1, 5, 50, 500)
+
+
+def deal_bags(seed, n):
+    """
+    Deals shapes the way Tetris did before randomizers, shuffling a bag of every shape and popping from its end.
+
+    Args:
+        seed (int): The seed.
+        n (int): The number of shapes.
+
+    Returns:
+        list: The shape names.
+    """
+    rng = Random(seed)
+    shapes = []
+    bag = []
+    while len(shapes) < n:
+        if not bag:
+            bag = list(SHAPES.keys())
+            rng.shuffle(bag)
+        shapes.append(bag.pop())
+    return shapes
+
+
+def check(seeds, n):
+    """
+    Checks that generate deals the same shapes as next_shape, in chunks of every size up to 20, and that the 7-bag
+    deals the same shapes as before.
+
+    Args:
+        seeds (int): The number of seeds to check.
+        n (int): The number of shapes per seed.
+    """
+    for randomizer_type in RANDOMIZERS:
+        for seed in range(seeds):
+            one_at_a_time = randomizer_type(seed)
+            expected = [one_at_a_time.next_shape() for _ in range(n)]
+            in_bulk = randomizer_type(seed)
+            dealt = []
+            chunk = 0
+            while len(dealt) < n:
+                dealt += in_bulk.generate(min(chunk, n - len(dealt)))
+                chunk = (chunk + 1) % 21
+            assert dealt == expected, f'{randomizer_type.__name__} seed {seed}: generate differs from next_shape'
+            if randomizer_type is BagRandomizer:
+                assert expected == deal_bags(seed, n), f'seed {seed}: bag differs from before'
+
+
+def get_longest_drought(shapes):
+    """
+    Gets the most shapes dealt between two of the same shape.
+
+    Args:
+        shapes (list): The shape names.
+
+    Returns:
+        int: The longest drought.
+    """
+    last = {}
+    longest = 0
+    for i, shape_name in enumerate(shapes):
+        longest = max(longest, i - last.get(shape_name, -1) - 1)
+        last[shape_name] = i
+    return longest
+
+
+def time_queue(queue_length, n):
+    """
+    Times pulling the next piece into play, from a queue of some length.
+
+    Args:
+        queue_length (int): The length of the queue.
+        n (int): The number of pieces to pull.
+
+    Returns:
+        float: The time per piece, in seconds.
+    """
+    game = Tetris(seed=0, queue_length=queue_length)
+    start = perf_counter()
+    for _ in range(n):
+        game.pop_from_queue()
+    return (perf_counter() - start)/n
+
+
+def run(n):
+    """
+    Prints the time per piece of each randomizer, and of pulling pieces from each queue length.
+
+    Args:
+        n (int): The number of pieces to time.
+    """
+    check(20, 1000)
+    print('generate matches next_shape for every randomizer, and the 7-bag deals the same shapes as before')
+
+    print(f'{"randomizer":<20}{"next_shape":>12}{"generate":>12}{"drought":>10}')
+    for randomizer_type in RANDOMIZERS:
+        randomizer = randomizer_type(0)
+        start = perf_counter()
+        for _ in range(n):
+            randomizer.next_shape()
+        one_at_a_time = (perf_counter() - start)/n
+        randomizer = randomizer_type(0)
+        start = perf_counter()
+        shapes = randomizer.generate(n)
+        in_bulk = (perf_counter() - start)/n
+        print(f'{randomizer_type.__name__:<20}{format_ns(one_at_a_time*1e9):>12}{format_ns(in_bulk*1e9):>12}'
+              f'{get_longest_drought(shapes):>10}')
+
+    print(f'{"queue length":<20}{"next piece":>12}')
+    for queue_length in QUEUE_LENGTHS:
+        print(f'{queue_length:<20}{format_ns(time_queue(queue_length, min(n, 100000))*1e9):>12}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pieces', type=int, default=1000000, help='pieces to deal from each randomizer')
+    args = parser.parse_args()
+    run(args.pieces)
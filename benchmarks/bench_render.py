@@ -0,0 +1,71 @@
+"""
+Times TetrisPyGameWindow.draw_game_screen on the fixture boards, for full redraws and for frames where only the piece moved.
+
+    python -m benchmarks.bench_render [--frames N] [--repeat N]
+
+Run from the directory holding Assets. Set SDL_VIDEODRIVER=dummy and SDL_AUDIODRIVER=dummy to run without a display or sound card.
+"""
+import argparse
+import gc
+from statistics import median
+from time import perf_counter
+
+import tetris_gui_pygame
+from benchmarks.fixtures import FIXTURES, make_game
+from benchmarks.bench_logic import format_ns
+
+
+def time_frames(window, game, frames, full_redraw):
+    """
+    Times drawing frames while the current block moves back and forth.
+
+    Args:
+        window (TetrisPyGameWindow): The window to draw to.
+        game (Tetris): The game to draw.
+        frames (int): The number of frames.
+        full_redraw (bool): Whether every frame redraws the whole window.
+
+    Returns:
+        float: The mean time per frame, in nanoseconds.
+    """
+    window.needs_redraw = True
+    window.draw_game_screen(game)
+    total = 0
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(frames):
+            game.move_x(game.current_block, i % 4 < 2)
+            window.needs_redraw = full_redraw
+            start = perf_counter()
+            window.draw_game_screen(game)
+            total += perf_counter() - start
+    finally:
+        gc.enable()
+    return total/frames*1e9
+
+
+def run(frames, repeat):
+    """
+    Times every fixture and prints the median time per frame.
+
+    Args:
+        frames (int): The number of frames per repeat.
+        repeat (int): The number of repeats.
+    """
+    window = tetris_gui_pygame.TetrisPyGame().window
+    print(f'{"benchmark":<36}{"median":>12}')
+    for full_redraw in (True, False):
+        for fixture in FIXTURES:
+            game = make_game(fixture)
+            samples = [time_frames(window, game, frames, full_redraw) for _ in range(repeat)]
+            name = f'{"full" if full_redraw else "incremental"}[{fixture}]'
+            print(f'{name:<36}{format_ns(median(samples)):>12}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--frames', type=int, default=100, help='frames per repeat')
+    parser.add_argument('--repeat', type=int, default=5, help='repeats per benchmark')
+    args = parser.parse_args()
+    run(args.frames, args.repeat)
@@ -0,0 +1,90 @@
+"""
+Times encoding and decoding game snapshots on the fixture boards and on games part way through, and measures their size.
+
+    python -m benchmarks.bench_snapshot [--number N] [--repeat N]
+"""
+import argparse
+from statistics import median
+
+from tetris_logic import Board, BitBoard
+from tetris_snapshot import encode_game, decode_game
+from benchmarks.fixtures import FIXTURES, make_game
+from benchmarks.bench_logic import time_operation, play_scripted_game, format_ns
+
+
+def get_full_state(game):
+    """
+    Gets everything a snapshot should restore, in a form that can be compared.
+
+    Args:
+        game (Tetris): The game.
+
+    Returns:
+        tuple: The board, blocks, bag, flags, score and random number generator state.
+    """
+    blocks = [game.current_block, game.held_block] + list(game.queue)
+    return (game.board.board, game.board.row_counts, game.board.full_lines,
+            game.board.get_column_tops(),
+            [(block.shape_name, block.orientation, block.base_coords, block.coords) if block else None for block in blocks],
+            type(game.randomizer), game.randomizer.get_shapes(), game.just_held, game.score, game.prev_clear,
+            game.randomizer.rng.getstate())
+
+
+def get_row_masks(board):
+    """
+    Gets the occupancy of each row of a board, in the form of BitBoard.rows.
+
+    Args:
+        board (Board): The board.
+
+    Returns:
+        list: The row masks.
+    """
+    return [sum(1 << x for x, cell in enumerate(row) if cell) for row in board.board]
+
+
+def get_games():
+    """
+    Gets the games to snapshot: every fixture, and seeded games stopped after different numbers of inputs.
+
+    Returns:
+        dict: Maps names to games.
+    """
+    games = {fixture: make_game(fixture) for fixture in FIXTURES}
+    for steps in (50, 500):
+        games[f'scripted_{steps}'] = play_scripted_game(steps, Board, max_steps=steps)
+    return games
+
+
+def run(number, repeat):
+    """
+    Checks that every game round-trips, then prints snapshot sizes and encode and decode times.
+
+    Args:
+        number (int): The number of calls per repeat.
+        repeat (int): The number of repeats.
+    """
+    print(f'{"game":<20}{"rng":>6}{"bytes":>8}{"encode":>12}{"decode":>12}')
+    for name, game in get_games().items():
+        for include_rng in (True, False):
+            data = encode_game(game, include_rng)
+            for board_type in (Board, BitBoard):
+                restored = decode_game(data, board_type)
+                if (include_rng and get_full_state(restored) != get_full_state(game)):
+                    raise AssertionError(f'{name} did not round-trip with {board_type.__name__}.')
+                if (encode_game(restored, include_rng) != data):
+                    raise AssertionError(f'{name} re-encoded differently with {board_type.__name__}.')
+                if (board_type is BitBoard and restored.board.rows != get_row_masks(game.board)):
+                    raise AssertionError(f'{name} restored the wrong row masks.')
+
+            encode = median(time_operation(lambda game: game, lambda game: encode_game(game, include_rng), game, number, repeat))
+            decode = median(time_operation(lambda game: data, decode_game, game, number, repeat))
+            print(f'{name:<20}{"yes" if include_rng else "no":>6}{len(data):>8}{format_ns(encode):>12}{format_ns(decode):>12}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=500, help='calls per repeat')
+    parser.add_argument('--repeat', type=int, default=5, help='repeats per benchmark')
+    args = parser.parse_args()
+    run(args.number, args.repeat)
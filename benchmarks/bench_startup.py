@@ -0,0 +1,63 @@
+"""
+Measures cold start of the pygame frontend: from a fresh interpreter to the first start-screen frame on the display.
+
+    python -m benchmarks.bench_startup [--runs N]
+
+Set SDL_VIDEODRIVER=dummy and SDL_AUDIODRIVER=dummy to run without a display or sound card.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from statistics import median
+
+
+# Runs in the child process. Time is measured from before importing pygame, so it includes loading assets.
+CHILD_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import pygame
+pygame_imported = time.perf_counter()
+import tetris_gui_pygame
+imported = time.perf_counter()
+gui = tetris_gui_pygame.TetrisPyGame()
+gui.draw_window()
+drawn = time.perf_counter()
+print(json.dumps({'pygame_import_s': pygame_imported - start, 'import_s': imported - pygame_imported,
+                  'first_frame_s': drawn - start}))
+'''
+
+TIMINGS = {
+    'pygame_import_s': 'importing pygame itself',
+    'import_s': 'importing tetris_gui_pygame',
+    'first_frame_s': 'start to first frame, in total',
+}
+
+
+def measure_once():
+    """
+    Starts the frontend in a new interpreter and times it.
+
+    Returns:
+        dict: Maps each of TIMINGS to its time, in seconds.
+    """
+    output = subprocess.run([sys.executable, '-c', CHILD_SCRIPT], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs):
+    """
+    Measures several cold starts and prints the medians.
+
+    Args:
+        runs (int): The number of starts to measure.
+    """
+    results = [measure_once() for _ in range(runs)]
+    for key, description in TIMINGS.items():
+        print(f'{key:<18}{median(result[key] for result in results)*1000:>10.1f} ms   {description}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='cold starts to measure')
+    run(parser.parse_args().runs)
@@ -0,0 +1,127 @@
+"""
+Measures the frames the terminal server sends, on games played by the bot: bytes per frame drawn as changed cells
+and as whole screens, and the CPU time to render and diff each frame.
+
+    python -m benchmarks.bench_terminal [--games N] [--blocks N] [--rate N]
+
+The CPU per session is the time per frame at --rate frames per second, one frame for each change a player sees.
+"""
+import argparse
+import gc
+from time import perf_counter
+
+from tetris_logic import Tetris
+from tetris_bot import TetrisBot
+from tetris_gui_cmd import render_rows
+from tetris_terminal_server import AnsiScreen
+from benchmarks.bench_logic import format_ns
+
+
+def render(game, frames):
+    """
+    Renders a frame of a game.
+
+    Args:
+        game (Tetris): The game.
+        frames (list): The frames so far, which the frame is added to.
+
+    Returns:
+        float: The time taken, in seconds.
+    """
+    start = perf_counter()
+    rows = render_rows(game)
+    elapsed = perf_counter() - start
+    frames.append(rows)
+    return elapsed
+
+
+def play_frames(seed, blocks):
+    """
+    Plays a game with the bot, keeping the frame after every action, like a session draws after every input.
+
+    Args:
+        seed (int): The seed for the game.
+        blocks (int): The maximum number of blocks to place.
+
+    Returns:
+        tuple: The game's frames, as the lines of each, and the total time to render them, in seconds.
+    """
+    game = Tetris(seed=seed)
+    bot = TetrisBot()
+    frames = []
+    elapsed = render(game, frames)
+    for _ in range(blocks):
+        if game.check_game_over():
+            break
+        for action in bot.choose_actions(game):
+            game.apply_action(action)
+            elapsed += render(game, frames)
+        if game.check_cleared_lines():
+            game.apply_action('CLEAR')
+            elapsed += render(game, frames)
+    return frames, elapsed
+
+
+def time_frames(frames):
+    """
+    Times diffing a game's frames.
+
+    Args:
+        frames (list): The frames.
+
+    Returns:
+        tuple: The total bytes of the diffs and the total time, in seconds.
+    """
+    screen = AnsiScreen()
+    sent = 0
+    gc.collect()
+    gc.disable()
+    try:
+        start = perf_counter()
+        for rows in frames:
+            sent += len(screen.draw(rows))
+        elapsed = perf_counter() - start
+    finally:
+        gc.enable()
+    return sent, elapsed
+
+
+def run(games, blocks, rate):
+    """
+    Prints the bytes and time per frame over some games, and the CPU per session they come to.
+
+    Args:
+        games (int): The number of games, seeded from 0.
+        blocks (int): The maximum number of blocks per game.
+        rate (float): The frames per second of a session.
+    """
+    n_frames = 0
+    diff_bytes = 0
+    full_bytes = 0
+    diff_time = 0
+    render_time = 0
+    for seed in range(games):
+        frames, rendered = play_frames(seed, blocks)
+        sent, elapsed = time_frames(frames)
+        n_frames += len(frames)
+        diff_bytes += sent
+        full_bytes += sum(len(AnsiScreen().draw(rows)) for rows in frames)
+        diff_time += elapsed
+        render_time += rendered
+
+    frame_time = (diff_time + render_time)/n_frames
+    print(f'{n_frames} frames from {games} games')
+    print(f'{"bytes/frame":<20}{"changes":>12}{diff_bytes/n_frames:>10.1f}{"whole":>12}{full_bytes/n_frames:>10.1f}')
+    print(f'{"time/frame":<20}{"render":>12}{format_ns(render_time/n_frames*1e9):>10}'
+          f'{"diff":>12}{format_ns(diff_time/n_frames*1e9):>10}')
+    print(f'at {rate:g} frames/s: {frame_time*rate*1000:.3f} ms CPU/s and {diff_bytes/n_frames*rate:,.0f} bytes/s '
+          f'per session, {1/(frame_time*rate):,.0f} sessions per core')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', type=int, default=5, help='games to play')
+    parser.add_argument('--blocks', type=int, default=100, help='maximum blocks per game')
+    parser.add_argument('--rate', type=float, default=10, help='frames per second of a session')
+    args = parser.parse_args()
+    run(args.games, args.blocks, args.rate)
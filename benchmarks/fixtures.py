@@ -0,0 +1,87 @@
+"""
+Repeatable games to benchmark against. Every fixture is built from a seed, so two runs time the same boards.
+"""
+from random import Random
+
+from tetris_logic import Tetris, Board
+
+
+FIXTURES = ['empty', 'half_full', 'near_top_out', 'holes']
+
+
+def fill_cell(board, x, y, shape_name):
+    """
+    Fills a single cell of a board.
+
+    Args:
+        board (Board): The board.
+        x (int): The column.
+        y (int): The row.
+        shape_name (str): The shape the cell is coloured as.
+    """
+    board.fill_cells([(x, y)], shape_name)
+
+
+def fill_rows(board, top, rng, density=0.7, holes_per_row=1):
+    """
+    Fills the rows of a board from a row down to the floor, leaving holes in every row.
+
+    Args:
+        board (Board): The board.
+        top (int): The highest row to fill.
+        rng (Random): The random number generator used to pick cells.
+        density (float): The chance that each cell outside the holes is filled.
+        holes_per_row (int): The number of cells guaranteed to be left empty in each row.
+    """
+    for y in range(top, board.height):
+        holes = rng.sample(range(board.width), holes_per_row)
+        for x in range(board.width):
+            if x not in holes and rng.random() < density:
+                fill_cell(board, x, y, rng.choice('IJLOSTZ'))
+
+
+def complete_rows(board, rows):
+    """
+    Fills every empty cell of the given rows, so that they can be cleared.
+
+    Args:
+        board (Board): The board.
+        rows (list): The rows to complete.
+    """
+    for y in rows:
+        for x in range(board.width):
+            if not board.board[y][x]:
+                fill_cell(board, x, y, 'I')
+
+
+def make_game(fixture, seed=0, board_type=Board, full_rows=0):
+    """
+    Makes a game whose board is in one of the FIXTURES states.
+
+    - empty: nothing on the board.
+    - half_full: the bottom half filled with one hole per row.
+    - near_top_out: filled up to two rows below the spawn area.
+    - holes: the bottom half filled at half density, so most cells have covered holes.
+
+    Args:
+        fixture (str): The name of the fixture.
+        seed (int): The seed for the board contents and the game's shape bags.
+        board_type (type): The board class to use.
+        full_rows (int): The number of the lowest rows to complete, for timing line clears.
+
+    Returns:
+        Tetris: The game.
+    """
+    rng = Random(seed)
+    game = Tetris(board_type=board_type, seed=seed)
+    board = game.board
+    if fixture == 'half_full':
+        fill_rows(board, board.height//2, rng)
+    elif fixture == 'near_top_out':
+        fill_rows(board, 8, rng, density=0.9)
+    elif fixture == 'holes':
+        fill_rows(board, board.height//2, rng, density=0.5, holes_per_row=2)
+    elif fixture != 'empty':
+        raise ValueError(f'Unknown fixture {fixture}.')
+    complete_rows(board, range(board.height - full_rows, board.height))
+    return game
@@ -0,0 +1,29 @@
+"""
+Checks that moving and rotating a block allocates no memory, with the tracing from benchmarks.bench_alloc.
+"""
+import tracemalloc
+from random import Random
+
+import pytest
+
+from tetris_logic import Board, BitBoard
+from benchmarks.bench_alloc import FIXTURES, MOVES, trace_moves
+from benchmarks.fixtures import make_game
+
+
+TRACED_MOVES = 2000
+
+
+@pytest.mark.parametrize('board_type', [Board, BitBoard], ids=lambda board_type: board_type.__name__)
+@pytest.mark.parametrize('fixture', FIXTURES)
+def test_moves_do_not_allocate(fixture, board_type):
+    game = make_game(fixture, board_type=board_type)
+    tracemalloc.start()
+    try:
+        counts = trace_moves(game, TRACED_MOVES, Random(0))
+    finally:
+        tracemalloc.stop()
+    for move in MOVES:
+        made, allocating, most = counts[move]
+        assert made > 0, f'{move} was never made'
+        assert allocating == 0, f'{allocating} of {made} {move} moves allocated, up to {most} bytes'
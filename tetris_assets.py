@@ -0,0 +1,280 @@
+"""
+Lazy loading of the pygame frontend's images, sounds and fonts, and the prebuilt image bundle.
+
+Build a bundle of every image already scaled for a given SCALE with:
+
+    python tetris_assets.py [--scale 1.5]
+"""
+import argparse
+import json
+import struct
+from pathlib import Path
+
+from pygame import mixer, font, image, display, Rect, Surface, SRCALPHA
+from pygame.transform import scale
+
+
+BUNDLE_MAGIC = b'TTRB'
+BUNDLE_VERSION = 1
+BUNDLE_HEADER = struct.Struct('<4sHI')  # Magic, version, index length
+BUNDLE_FORMAT = 'RGBA'
+
+
+def get_bundle_path(scale_factor):
+    """
+    Gets where the image bundle for a scale is stored.
+
+    Args:
+        scale_factor (float): The SCALE the images are sized for.
+
+    Returns:
+        Path: The bundle path.
+    """
+    return Path('Assets')/f'bundle_{scale_factor}.bin'
+
+
+def get_scaled_size(size, scale_factor):
+    """
+    Scales a base size, as the frontend does with its SCALE constant.
+
+    Args:
+        size (tuple): The base (width, height).
+        scale_factor (float): The scale.
+
+    Returns:
+        tuple: The scaled (width, height).
+    """
+    return (size[0]*scale_factor, size[1]*scale_factor)
+
+
+def load_scaled_image(path, size, scale_factor):
+    """
+    Loads an image from disk and scales it.
+
+    Args:
+        path (Path): The image file.
+        size (tuple): The base (width, height) the image is drawn at.
+        scale_factor (float): The scale.
+
+    Returns:
+        Surface: The scaled image.
+    """
+    return scale(image.load(path), get_scaled_size(size, scale_factor))
+
+
+def build_bundle(image_specs, scale_factor, path):
+    """
+    Loads and scales every image and writes the pixels into one bundle file.
+
+    The file is a header, a JSON index of name to (width, height, offset) and the raw RGBA pixels,
+    so that it can be read in a single pass without decoding or scaling anything.
+
+    Args:
+        image_specs (dict): Maps image names to (path, base size).
+        scale_factor (float): The scale to size the images for.
+        path (Path): Where to write the bundle.
+
+    Returns:
+        int: The size of the bundle in bytes.
+    """
+    index = {}
+    pixels = []
+    offset = 0
+    for name, (image_path, size) in image_specs.items():
+        surface = load_scaled_image(image_path, size, scale_factor)
+        data = image.tobytes(surface, BUNDLE_FORMAT)
+        index[name] = (surface.get_width(), surface.get_height(), offset)
+        pixels.append(data)
+        offset += len(data)
+
+    index_bytes = json.dumps({'scale': scale_factor, 'images': index}).encode()
+    with open(path, 'wb') as file:
+        file.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(index_bytes)))
+        file.write(index_bytes)
+        for data in pixels:
+            file.write(data)
+    return BUNDLE_HEADER.size + len(index_bytes) + offset
+
+
+def read_bundle(path, scale_factor):
+    """
+    Reads a bundle file in one pass. The pixels aren't copied: each image is wrapped as a surface on first use.
+
+    Args:
+        path (Path): The bundle file.
+        scale_factor (float): The scale the caller expects, checked against the bundle.
+
+    Returns:
+        dict: Maps image names to (size, pixels), or None if the bundle is missing, out of date or for another scale.
+    """
+    try:
+        data = memoryview(Path(path).read_bytes())
+    except FileNotFoundError:
+        return None
+
+    magic, version, index_length = BUNDLE_HEADER.unpack_from(data)
+    if (magic != BUNDLE_MAGIC or version != BUNDLE_VERSION):
+        return None
+    start = BUNDLE_HEADER.size + index_length
+    index = json.loads(bytes(data[BUNDLE_HEADER.size:start]))
+    if (index['scale'] != scale_factor):
+        return None
+
+    bundle = {}
+    for name, (width, height, offset) in index['images'].items():
+        pixels = data[start + offset:start + offset + width*height*4]
+        bundle[name] = ((width, height), pixels)
+    return bundle
+
+
+def pack_atlas(surfaces):
+    """
+    Packs surfaces into a single surface, in rows of surfaces with the same height.
+
+    Args:
+        surfaces (dict): Maps names to the surfaces to pack.
+
+    Returns:
+        tuple: The atlas surface, and a dict mapping each name to its rectangle in the atlas.
+    """
+    rows = {}
+    for name, surface in surfaces.items():
+        rows.setdefault(surface.get_height(), []).append(name)
+
+    rects = {}
+    y = 0
+    for height, names in rows.items():
+        x = 0
+        for name in names:
+            rects[name] = Rect((x, y), surfaces[name].get_size())
+            x += rects[name].width
+        y += height
+
+    atlas = Surface((max(rect.right for rect in rects.values()), y), SRCALPHA)
+    atlas.blits([(surfaces[name], rect) for name, rect in rects.items()])
+    return atlas, rects
+
+
+class AssetManager:
+    """
+    Loads images, sounds and fonts the first time they are used.
+
+    Images come from the prebuilt bundle for the scale if there is one, otherwise from the
+    individual files, loaded and scaled one at a time. The bundle is read on the first image.
+    Images loaded once a display mode is set are converted to the display's pixel format, so blits don't convert them.
+
+    Attributes:
+        image_specs (dict): Maps image names to (path, base size).
+        sound_specs (dict): Maps sound names to (path, volume).
+        font_specs (dict): Maps font names to (path, size).
+        scale_factor (float): The scale images are drawn at.
+        bundle_path (Path): The bundle to read images from, if it exists.
+        bundle (dict): The bundle's images, as returned by read_bundle, or None until it's read.
+        images (dict): The images loaded so far.
+        sounds (dict): The sounds loaded so far.
+        fonts (dict): The fonts opened so far.
+    """
+
+    def __init__(self, image_specs, sound_specs, font_specs, scale_factor, bundle_path=None):
+        self.image_specs = image_specs
+        self.sound_specs = sound_specs
+        self.font_specs = font_specs
+        self.scale_factor = scale_factor
+        self.bundle_path = get_bundle_path(scale_factor) if bundle_path is None else bundle_path
+        self.bundle = None
+        self.images = {}
+        self.sounds = {}
+        self.fonts = {}
+
+
+    def image(self, name):
+        """
+        Gets an image, reading the bundle on first use.
+
+        Args:
+            name (str): The image name.
+
+        Returns:
+            Surface: The scaled image.
+        """
+        if name not in self.images:
+            if self.bundle is None:
+                self.bundle = read_bundle(self.bundle_path, self.scale_factor) or {}
+            if name in self.bundle:
+                size, pixels = self.bundle[name]
+                self.images[name] = image.frombuffer(pixels, size, BUNDLE_FORMAT)
+            else:
+                path, size = self.image_specs[name]
+                self.images[name] = load_scaled_image(path, size, self.scale_factor)
+            if (display.get_surface() is not None):
+                self.images[name] = self.images[name].convert_alpha()
+        return self.images[name]
+
+
+    def atlas(self, names):
+        """
+        Packs images into one atlas in the display's pixel format. A display mode must be set.
+
+        Args:
+            names (list): The image names.
+
+        Returns:
+            tuple: The atlas surface, and a dict mapping each name to its rectangle in the atlas.
+        """
+        atlas, rects = pack_atlas({name: self.image(name) for name in names})
+        return atlas.convert_alpha(), rects
+
+
+    def sound(self, name):
+        """
+        Gets a sound, decoding it on first use.
+
+        Args:
+            name (str): The sound name.
+
+        Returns:
+            Sound: The sound.
+        """
+        if name not in self.sounds:
+            if not mixer.get_init():
+                mixer.init()
+            path, volume = self.sound_specs[name]
+            sound = mixer.Sound(str(path))
+            sound.set_volume(volume)
+            self.sounds[name] = sound
+        return self.sounds[name]
+
+
+    def font(self, name):
+        """
+        Gets a font, opening it on first use.
+
+        Args:
+            name (str): The font name.
+
+        Returns:
+            Font: The font.
+        """
+        if name not in self.fonts:
+            if not font.get_init():
+                font.init()
+            path, size = self.font_specs[name]
+            self.fonts[name] = font.Font(path, size)
+        return self.fonts[name]
+
+
+def main():
+    import tetris_gui_pygame
+
+    parser = argparse.ArgumentParser(description='Build the prebuilt image bundle for the pygame frontend.')
+    parser.add_argument('--scale', type=float, default=tetris_gui_pygame.SCALE, help='the SCALE to size images for')
+    parser.add_argument('--output', type=Path, help='where to write the bundle (default: Assets/bundle_<scale>.bin)')
+    args = parser.parse_args()
+
+    path = args.output or get_bundle_path(args.scale)
+    size = build_bundle(tetris_gui_pygame.IMAGE_SPECS, args.scale, path)
+    print(f'Wrote {len(tetris_gui_pygame.IMAGE_SPECS)} images ({size/1e6:.1f} MB) to {path}')
+
+
+if __name__ == '__main__':
+    main()
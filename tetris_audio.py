@@ -0,0 +1,265 @@
+"""
+Sound effects and music for the pygame frontend.
+
+Sound effects play on a fixed pool of mixer channels. Each sound has a priority and a minimum time between plays:
+a sound played again sooner than that is dropped, and when every channel is busy a new sound takes the channel of
+the lowest priority sound playing, oldest first, unless that sound outranks it. Held keys repeat every few frames,
+so without these the move sounds would take every channel and cut off line clears.
+
+Music tracks are decoded in full ahead of time, so changing track on the main thread only starts a channel
+playing. Two channels are kept for music, so one track can fade out while the next fades in. A new track takes a
+music channel that is free, or if the music changes again before a fade has finished, the channel of the track
+that started longest ago. A track that is still decoding starts on the first update after it's ready, and one
+that can't be loaded is left silent.
+
+SDL_mixer holds the audio device's lock while it decodes an Ogg file, which stalls every other mixer call, on any
+thread, for the half a second or so a whole track takes. So each track is decoded by running this module in a new
+process, with a mixer of its own, which writes the samples out as a WAV file. A thread in the game then loads the
+WAV file, which takes no lock:
+
+    python tetris_audio.py TRACK WAV [--frequency 44100] [--channels 2]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import mkstemp
+from time import perf_counter
+
+import pygame
+from pygame import mixer
+
+
+SOUND_CHANNELS = 8          # Channels in the pool for sound effects
+MUSIC_CHANNELS = 2          # Channels for music, so that two tracks can crossfade
+MUSIC_VOLUME = 0.1
+MUSIC_LOOPS = 3             # Times a track repeats after the first play
+CROSSFADE_MS = 5000
+DEFAULT_RULE = (0, 0.0)     # The priority and minimum seconds between plays of sounds without a rule
+# The decoding process has no sound card, and no need to greet anyone
+DECODER_ENVIRONMENT = {'SDL_AUDIODRIVER': 'dummy', 'PYGAME_HIDE_SUPPORT_PROMPT': '1'}
+DECODER_NICENESS = 10       # Added to the decoding process's niceness, so the game keeps the CPU it needs
+
+
+def decode_track(path, wav_path, frequency, channels):
+    """
+    Decodes a music track into a 16 bit WAV file. The mixer must be initialised to the same frequency and channels.
+
+    Args:
+        path (Path): The track file.
+        wav_path (Path): Where to write the WAV file.
+        frequency (int): The sample rate to decode to.
+        channels (int): The number of channels to decode to.
+    """
+    samples = mixer.Sound(str(path)).get_raw()
+    with wave.open(str(wav_path), 'wb') as file:
+        file.setnchannels(channels)
+        file.setsampwidth(2)
+        file.setframerate(frequency)
+        file.writeframes(samples)
+
+
+def load_track(path, volume):
+    """
+    Decodes a music track in a new process and loads the result. Runs on the loader thread.
+
+    Args:
+        path (Path): The track file.
+        volume (float): The volume to play it at.
+
+    Returns:
+        Sound: The decoded track.
+
+    Raises:
+        CalledProcessError: If the track couldn't be decoded.
+    """
+    frequency, _, channels = mixer.get_init()
+    handle, wav_path = mkstemp(suffix='.wav')
+    os.close(handle)
+    try:
+        subprocess.run([sys.executable, __file__, str(path), wav_path, '--frequency', str(frequency),
+                        '--channels', str(channels)], env=os.environ | DECODER_ENVIRONMENT, capture_output=True,
+                       check=True)
+        track = mixer.Sound(wav_path)
+    finally:
+        os.remove(wav_path)
+    track.set_volume(volume)
+    return track
+
+
+class AudioEngine:
+    """
+    Plays sound effects on a pool of channels, and music on channels of its own. The mixer must be initialised.
+
+    Every channel is reserved, so sounds played with Sound.play rather than through the engine find no free channel.
+
+    Attributes:
+        sounds (AssetManager): Where sound effects are loaded from, by name.
+        rules (dict): Maps sound names to (priority, minimum seconds between plays). Higher priorities win channels.
+        channels (list): The channels for sound effects.
+        priorities (list): The priority of the sound last played on each channel.
+        started (list): When the sound last played on each channel started.
+        last_played (dict): When each sound was last played.
+        music_channels (list): The channels for music.
+        music_volume (float): The volume music is played at.
+        loader (ThreadPoolExecutor): The thread that runs the decoding processes and loads what they decode.
+        tracks (dict): Maps track paths to futures of their decoded sounds. Tracks are kept once decoded.
+        music (Path): The track playing, or waiting to play, or None.
+        music_index (int): The music channel the track is on.
+        music_started (list): When the track last played on each music channel started.
+        pending (tuple): (loops, fade in ms) of a track waiting to finish decoding, or None.
+    """
+
+    def __init__(self, sounds, rules=None, n_channels=SOUND_CHANNELS, music_volume=MUSIC_VOLUME):
+        self.sounds = sounds
+        self.rules = {} if rules is None else rules
+        mixer.set_num_channels(MUSIC_CHANNELS + n_channels)
+        mixer.set_reserved(MUSIC_CHANNELS + n_channels)
+        self.music_channels = [mixer.Channel(i) for i in range(MUSIC_CHANNELS)]
+        self.channels = [mixer.Channel(MUSIC_CHANNELS + i) for i in range(n_channels)]
+        self.priorities = [0]*n_channels
+        self.started = [0.0]*n_channels
+        self.last_played = {}
+        self.music_volume = music_volume
+        self.loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='music')
+        self.tracks = {}
+        self.music = None
+        self.music_index = 0
+        self.music_started = [0.0]*MUSIC_CHANNELS
+        self.pending = None
+
+
+    def play(self, name, now=None):
+        """
+        Plays a sound effect, unless it played too recently or every channel is playing something more important.
+
+        Args:
+            name (str): The sound name.
+            now (float): The current time, in seconds. Defaults to perf_counter().
+
+        Returns:
+            Channel: The channel the sound is playing on, or None if it was dropped.
+        """
+        now = perf_counter() if now is None else now
+        priority, min_interval = self.rules.get(name, DEFAULT_RULE)
+        last = self.last_played.get(name)
+        if (last is not None and now - last < min_interval):
+            return None
+
+        index = None
+        for i, channel in enumerate(self.channels):
+            if (not channel.get_busy()):
+                index = i
+                break
+            if (index is None or (self.priorities[i], self.started[i]) < (self.priorities[index], self.started[index])):
+                index = i
+        else:
+            if (self.priorities[index] > priority):
+                return None
+
+        channel = self.channels[index]
+        channel.play(self.sounds.sound(name))
+        self.priorities[index] = priority
+        self.started[index] = now
+        self.last_played[name] = now
+        return channel
+
+
+    def prefetch(self, *tracks):
+        """
+        Starts decoding music tracks on the loader thread, if they aren't already.
+
+        Args:
+            *tracks (Path): The track files.
+        """
+        for track in tracks:
+            if track not in self.tracks:
+                self.tracks[track] = self.loader.submit(load_track, track, self.music_volume)
+
+
+    def play_music(self, track, fade_ms=CROSSFADE_MS, loops=MUSIC_LOOPS):
+        """
+        Changes the music, fading out the track playing while the new one fades in. The new track starts now if it
+        has been decoded, otherwise on the first update after it is. It goes on a free music channel, or if every
+        one is still fading out, the one that started longest ago, which is stopped.
+
+        Args:
+            track (Path): The track file.
+            fade_ms (int): The length of the crossfade, in milliseconds, or 0 to cut straight to the new track.
+            loops (int): Times to repeat the track after the first play, or -1 to repeat it forever.
+        """
+        if (track == self.music):
+            return
+        self.stop_music(fade_ms)
+        self.prefetch(track)
+        self.music = track
+        index = None
+        for i, channel in enumerate(self.music_channels):
+            if (not channel.get_busy()):
+                index = i
+                break
+            if (index is None or self.music_started[i] < self.music_started[index]):
+                index = i
+        else:
+            self.music_channels[index].stop()
+        self.music_index = index
+        self.pending = (loops, fade_ms)
+        self.update()
+
+
+    def stop_music(self, fade_ms=0):
+        """
+        Stops the music, including a track still fading out from the last change.
+
+        Args:
+            fade_ms (int): How long to fade out over, in milliseconds, or 0 to stop at once.
+        """
+        for channel in self.music_channels:
+            if (fade_ms):
+                channel.fadeout(fade_ms)
+            else:
+                channel.stop()
+        self.music = None
+        self.pending = None
+
+
+    def update(self):
+        """
+        Starts the track waiting to play, if it has finished decoding. Call once a frame.
+        """
+        if (self.pending is None or not self.tracks[self.music].done()):
+            return
+        loops, fade_ms = self.pending
+        self.pending = None
+        try:
+            track = self.tracks[self.music].result()
+        except (pygame.error, OSError, subprocess.CalledProcessError):
+            return
+        self.music_channels[self.music_index].play(track, loops, fade_ms=fade_ms)
+        self.music_started[self.music_index] = perf_counter()
+
+
+    def close(self):
+        """
+        Stops decoding tracks, waiting for the one being decoded. Call before quitting pygame.
+        """
+        self.loader.shutdown(cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode a music track into a WAV file, for AudioEngine.')
+    parser.add_argument('track', help='the track to decode')
+    parser.add_argument('wav', help='where to write the WAV file')
+    parser.add_argument('--frequency', type=int, default=44100, help='the sample rate to decode to (default 44100)')
+    parser.add_argument('--channels', type=int, default=2, help='the number of channels to decode to (default 2)')
+    args = parser.parse_args()
+    if (hasattr(os, 'nice')):
+        os.nice(DECODER_NICENESS)
+    mixer.init(args.frequency, -16, args.channels)
+    decode_track(args.track, args.wav, args.frequency, args.channels)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,445 @@
+import numpy as np
+
+from tetris_logic import (SHAPES, SCORES, ACTIONS, ROTATIONS, JLSTZ_KICKS, I_KICKS, BagRandomizer,
+                          GAME_WIDTH, GAME_HEIGHT, QUEUE_LENGTH, STARTING_PAD)
+
+
+SHAPE_NAMES = list(SHAPES.keys())
+SHAPE_IDS = {shape_name: i for i, shape_name in enumerate(SHAPE_NAMES)}
+ACTION_IDS = {action: i for i, action in enumerate(ACTIONS)}
+
+
+# Base coordinates of each shape in each orientation, shape (shapes, orientations, cells, xy).
+CELLS = np.array([[list(coords) for coords in ROTATIONS[shape_name]] for shape_name in SHAPE_NAMES], dtype=np.int64)
+
+
+def get_kick_offsets():
+    """
+    Gets the wall kick offsets for each shape, orientation and direction.
+    The offset is the change in the block's position, as the rotation itself is in CELLS.
+
+    Returns:
+        tuple: The offsets, shape (shapes, orientations, directions, kicks, xy), with direction 0 being clockwise,
+            and the number of kicks for each shape (0 for shapes that don't rotate).
+    """
+    offsets = np.zeros((len(SHAPE_NAMES), 4, 2, 5, 2), dtype=np.int64)
+    kick_counts = np.zeros(len(SHAPE_NAMES), dtype=np.int64)
+    for shape_name, shape_id in SHAPE_IDS.items():
+        if shape_name == 'O':
+            continue
+        kicks = I_KICKS if shape_name == 'I' else JLSTZ_KICKS
+        for (start, end), shifts in kicks.items():
+            direction = 0 if end == (start+1) % 4 else 1
+            offsets[shape_id, start, direction] = shifts
+        kick_counts[shape_id] = 5
+    return offsets, kick_counts
+
+
+KICK_OFFSETS, KICK_COUNTS = get_kick_offsets()
+
+# Score for clearing 0-4 lines at once, without back-to-back.
+LINE_SCORES = np.array([0, SCORES['SINGLE'], SCORES['DOUBLE'], SCORES['TRIPLE'], SCORES['TETRIS']], dtype=np.int64)
+
+# Spawn positions, matching Tetris.get_new_shape (T spawns a row higher) and Tetris.hold_block (everything at the pad).
+SPAWN_X = STARTING_PAD[0][0]
+SPAWN_Y = np.array([STARTING_PAD[0][1] - (shape_name == 'T') for shape_name in SHAPE_NAMES], dtype=np.int64)
+HOLD_SPAWN_Y = STARTING_PAD[0][1]
+
+# Number of shapes generated per game each time the piece sequences run low, 16 7-bags.
+SHAPES_PER_REFILL = 16 * len(SHAPES)
+
+
+
+
+class BatchTetris:
+    """
+    Runs many games of Tetris in lockstep, with all boards held in one array.
+
+    Each game follows the same rules as Tetris, and a game seeded with seed s plays exactly like Tetris(seed=s)
+    driven by the same actions, when every action is followed by clearing any full lines as both GUIs do.
+    The pieces of each game are drawn in bulk from its own randomizer, so they match the scalar game's.
+
+    Attributes:
+        n_games (int): The number of games.
+        width (int): The width of each board.
+        height (int): The height of each board, including the 6 hidden rows at the top.
+        boards (ndarray): Shape (n_games, height, width). 0 is empty, otherwise 1 + the shape id.
+        shapes (ndarray): The shape id of each current block.
+        orientations (ndarray): The orientation of each current block.
+        xs (ndarray): The x position of each current block.
+        ys (ndarray): The y position of each current block.
+        queues (ndarray): Shape (n_games, queue length), the shape ids of the upcoming blocks.
+        held (ndarray): The shape id of each held block, or -1 if none.
+        just_held (ndarray): Whether each game has held since the last placement.
+        scores (ndarray): The score of each game.
+        prev_clears (ndarray): The previous clear of each game, as in Tetris.prev_clear.
+        game_over (ndarray): Whether each game has topped out. Actions on finished games are ignored.
+    """
+
+    def __init__(self, n_games, seeds=None, width=GAME_WIDTH, height=GAME_HEIGHT, randomizer_type=BagRandomizer,
+                 queue_length=QUEUE_LENGTH):
+        self.n_games = n_games
+        self.width = width
+        self.height = height+6
+        self.seeds = list(range(n_games)) if seeds is None else list(seeds)
+        self.randomizer_type = randomizer_type
+        self.queue_length = queue_length
+
+        n = n_games
+        self.randomizers = [None]*n
+        self.sequences = np.zeros((n, SHAPES_PER_REFILL), dtype=np.int64)
+        self.sequence_index = np.zeros(n, dtype=np.int64)
+        self.boards = np.zeros((n, self.height, self.width), dtype=np.uint8)
+        self.shapes = np.zeros(n, dtype=np.int64)
+        self.orientations = np.zeros(n, dtype=np.int64)
+        self.xs = np.zeros(n, dtype=np.int64)
+        self.ys = np.zeros(n, dtype=np.int64)
+        self.queues = np.zeros((n, queue_length), dtype=np.int64)
+        self.held = np.zeros(n, dtype=np.int64)
+        self.just_held = np.zeros(n, dtype=bool)
+        self.scores = np.zeros(n, dtype=np.int64)
+        self.prev_clears = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.reset()
+
+
+    def reset(self, games=None, seeds=None):
+        """
+        Resets games to their starting state, overwriting their rows of the arrays rather than making new ones.
+
+        Args:
+            games (ndarray): The indices of the games to reset. Defaults to all games.
+            seeds (list): A new seed for each game reset. Defaults to the seeds they were last started with.
+        """
+        if games is None:
+            games = np.arange(self.n_games)
+        if seeds is not None:
+            for game, seed in zip(games.tolist(), seeds):
+                self.seeds[game] = seed
+        for game in games.tolist():
+            self.randomizers[game] = self.randomizer_type(self.seeds[game])
+        self.sequence_index[games] = SHAPES_PER_REFILL
+
+        self.boards[games] = 0
+        shapes = self.next_shapes(games)
+        self.shapes[games] = shapes
+        self.orientations[games] = 0
+        self.xs[games] = SPAWN_X
+        self.ys[games] = SPAWN_Y[shapes]
+        for i in range(self.queue_length):
+            self.queues[games, i] = self.next_shapes(games)
+        self.held[games] = -1
+        self.just_held[games] = False
+        self.scores[games] = 0
+        self.prev_clears[games] = 0
+        self.game_over[games] = False
+
+
+    def refill_sequences(self, games):
+        """
+        Overwrites the piece sequences of games that have drawn every shape in theirs with the next shapes from
+        their randomizers. Each game's sequence is a fixed window of SHAPES_PER_REFILL shapes, so memory stays the
+        same however long the games run, and games refill independently of each other.
+
+        Args:
+            games (ndarray): The indices of the games.
+        """
+        for game in games.tolist():
+            self.sequences[game] = [SHAPE_IDS[shape_name]
+                                    for shape_name in self.randomizers[game].generate(SHAPES_PER_REFILL)]
+        self.sequence_index[games] = 0
+
+
+    def next_shapes(self, games=None):
+        """
+        Draws the next shape from the sequence of each game.
+
+        Args:
+            games (ndarray): The indices of the games to draw for. Defaults to all games.
+
+        Returns:
+            ndarray: The drawn shape ids.
+        """
+        if games is None:
+            games = np.arange(self.n_games)
+        used_up = games[self.sequence_index[games] >= SHAPES_PER_REFILL]
+        if len(used_up):
+            self.refill_sequences(used_up)
+        shapes = self.sequences[games, self.sequence_index[games]]
+        self.sequence_index[games] += 1
+        return shapes
+
+
+    def check_collision(self, games, shapes, orientations, xs, ys):
+        """
+        Checks blocks against the walls, the floor and the filled cells of their boards, like Board.check_collision.
+
+        Args:
+            games (ndarray): The indices of the games.
+            shapes, orientations, xs, ys (ndarray): The blocks to check, one per game.
+
+        Returns:
+            ndarray: True for each block that collides.
+        """
+        cells = CELLS[shapes, orientations]
+        cell_xs = xs[:, None] + cells[:, :, 0]
+        cell_ys = ys[:, None] + cells[:, :, 1]
+        outside = (cell_xs < 0) | (cell_xs >= self.width) | (cell_ys >= self.height)
+        filled = self.boards[games[:, None],
+                             np.clip(cell_ys, 0, self.height-1),
+                             np.clip(cell_xs, 0, self.width-1)] != 0
+        return (outside | (filled & (cell_ys >= 0))).any(axis=1)
+
+
+    def try_move(self, games, dx, dy):
+        """
+        Moves the current blocks of the games by an offset where it doesn't collide.
+
+        Args:
+            games (ndarray): The indices of the games.
+            dx (int): The x offset.
+            dy (int): The y offset.
+        """
+        blocked = self.check_collision(games, self.shapes[games], self.orientations[games],
+                                       self.xs[games] + dx, self.ys[games] + dy)
+        moved = games[~blocked]
+        self.xs[moved] += dx
+        self.ys[moved] += dy
+
+
+    def rotate(self, games, direction):
+        """
+        Rotates the current blocks of the games, trying each wall kick in turn like Tetris.rotate.
+
+        Args:
+            games (ndarray): The indices of the games.
+            direction (int): 0 for clockwise, 1 for counterclockwise.
+        """
+        shapes = self.shapes[games]
+        start = self.orientations[games]
+        end = (start + (1 if direction == 0 else 3)) % 4
+        pending = KICK_COUNTS[shapes] > 0
+        for kick in range(KICK_OFFSETS.shape[3]):
+            if not pending.any():
+                break
+            offsets = KICK_OFFSETS[shapes, start, direction, kick]
+            xs = self.xs[games] + offsets[:, 0]
+            ys = self.ys[games] + offsets[:, 1]
+            fits = pending & ~self.check_collision(games, shapes, end, xs, ys)
+            rotated = games[fits]
+            self.orientations[rotated] = end[fits]
+            self.xs[rotated] = xs[fits]
+            self.ys[rotated] = ys[fits]
+            pending &= ~fits
+
+
+    def get_drop_distances(self, games):
+        """
+        Gets how many rows each current block can fall before it lands.
+
+        Args:
+            games (ndarray): The indices of the games.
+
+        Returns:
+            ndarray: The drop distance of each block.
+        """
+        distances = np.zeros(len(games), dtype=np.int64)
+        falling = np.ones(len(games), dtype=bool)
+        shapes, orientations, xs, ys = self.shapes[games], self.orientations[games], self.xs[games], self.ys[games]
+        while falling.any():
+            idx = np.flatnonzero(falling)
+            blocked = self.check_collision(games[idx], shapes[idx], orientations[idx], xs[idx], ys[idx] + distances[idx] + 1)
+            distances[idx[~blocked]] += 1
+            falling[idx[blocked]] = False
+        return distances
+
+
+    def get_top_pads(self, games):
+        """
+        Gets how far new blocks are moved up, matching Tetris.add_top_pad.
+
+        Args:
+            games (ndarray): The indices of the games.
+
+        Returns:
+            ndarray: The number of non-empty rows among the top 6 of each board.
+        """
+        return (self.boards[games, :6] != 0).any(axis=2).sum(axis=1)
+
+
+    def pop_from_queues(self, games):
+        """
+        Makes the first queued block current and refills the queue, like Tetris.pop_from_queue.
+
+        Args:
+            games (ndarray): The indices of the games.
+        """
+        shapes = self.queues[games, 0]
+        self.queues[games, :-1] = self.queues[games, 1:]
+        self.queues[games, -1] = self.next_shapes(games)
+        self.shapes[games] = shapes
+        self.orientations[games] = 0
+        self.xs[games] = SPAWN_X
+        self.ys[games] = SPAWN_Y[shapes] - self.get_top_pads(games)
+
+
+    def place(self, games):
+        """
+        Locks the current blocks onto their boards and moves on to the next blocks, like Tetris.place_block.
+        A block that overlaps filled cells or sticks out of the top of the board ends its game.
+
+        Args:
+            games (ndarray): The indices of the games.
+        """
+        cells = CELLS[self.shapes[games], self.orientations[games]]
+        cell_xs = self.xs[games][:, None] + cells[:, :, 0]
+        cell_ys = self.ys[games][:, None] + cells[:, :, 1]
+        invalid = (cell_ys < 0).any(axis=1)
+        cell_ys = np.maximum(cell_ys, 0)
+        invalid |= (self.boards[games[:, None], cell_ys, cell_xs] != 0).any(axis=1)
+        self.game_over[games[invalid]] = True
+
+        valid = ~invalid
+        games = games[valid]
+        self.boards[games[:, None], cell_ys[valid], cell_xs[valid]] = (self.shapes[games] + 1)[:, None]
+        self.pop_from_queues(games)
+        self.just_held[games] = False
+
+
+    def hold(self, games):
+        """
+        Holds the current blocks, swapping with any held block, like Tetris.hold_block.
+
+        Args:
+            games (ndarray): The indices of the games.
+        """
+        games = games[~self.just_held[games]]
+        held = self.held[games]
+        self.held[games] = self.shapes[games]
+
+        empty = held < 0
+        self.pop_from_queues(games[empty])
+
+        swapped = games[~empty]
+        self.shapes[swapped] = held[~empty]
+        self.orientations[swapped] = 0
+        self.xs[swapped] = SPAWN_X
+        self.ys[swapped] = HOLD_SPAWN_Y - self.get_top_pads(swapped)
+        self.just_held[games] = True
+
+
+    def clear_lines(self):
+        """
+        Clears full lines on every board in one compaction and scores them like Tetris.clear_lines.
+
+        Returns:
+            ndarray: The number of lines cleared in each game.
+        """
+        full = (self.boards != 0).all(axis=2)
+        counts = full.sum(axis=1)
+        games = np.flatnonzero(counts)
+        if len(games) == 0:
+            return counts
+
+        # Stable sort puts the full rows first and keeps the order of the others, then the full rows are emptied
+        order = np.argsort(~full[games], axis=1, kind='stable')
+        boards = np.take_along_axis(self.boards[games], order[:, :, None], axis=1)
+        boards[np.arange(self.height)[None, :] < counts[games, None]] = 0
+        self.boards[games] = boards
+
+        cleared = counts[games]
+        b2b = (cleared == 4) & (self.prev_clears[games] >= 4)
+        self.scores[games] += np.where(b2b, SCORES['TETRIS B2B'], LINE_SCORES[cleared])
+        self.prev_clears[games] = np.where(b2b, self.prev_clears[games] + 1, cleared)
+        return counts
+
+
+    def step(self, actions):
+        """
+        Applies one action to every game that is still running, then clears full lines and checks for game over.
+        As lines are cleared on every step, CLEAR does nothing more than NOOP.
+
+        Args:
+            actions (ndarray): One index into ACTIONS per game.
+
+        Returns:
+            ndarray: The number of lines cleared in each game.
+        """
+        actions = np.asarray(actions)
+        running = ~self.game_over
+
+        def select(action):
+            return np.flatnonzero(running & (actions == ACTION_IDS[action]))
+
+        self.try_move(select('LEFT'), -1, 0)
+        self.try_move(select('RIGHT'), 1, 0)
+        self.rotate(select('ROTATE_CW'), 0)
+        self.rotate(select('ROTATE_CCW'), 1)
+        self.try_move(select('SOFT_DROP'), 0, 1)
+        games = select('HARD_DROP')
+        self.ys[games] += self.get_drop_distances(games)
+        self.place(games)
+        self.hold(select('HOLD'))
+        self.place(select('LOCK'))
+
+        cleared = self.clear_lines()
+        self.game_over |= (self.boards[:, :4] != 0).any(axis=(1, 2))
+        return cleared
+
+
+    def get_game_state(self, game):
+        """
+        Gets the state of one game in the same form as the attributes of Tetris, for comparing the two.
+
+        Args:
+            game (int): The index of the game.
+
+        Returns:
+            dict: The board (as shape names), current block, queue, held block, score and previous clear.
+        """
+        board = [[SHAPE_NAMES[cell-1] if cell else 0 for cell in row] for row in self.boards[game].tolist()]
+        cells = CELLS[self.shapes[game], self.orientations[game]] + [self.xs[game], self.ys[game]]
+        return {
+            'board': board,
+            'current_block': (SHAPE_NAMES[self.shapes[game]], [tuple(cell) for cell in cells.tolist()]),
+            'queue': [SHAPE_NAMES[shape] for shape in self.queues[game]],
+            'held_block': SHAPE_NAMES[self.held[game]] if self.held[game] >= 0 else None,
+            'just_held': bool(self.just_held[game]),
+            'score': int(self.scores[game]),
+            'prev_clear': int(self.prev_clears[game])
+        }
+
+
+def get_scalar_state(game):
+    """
+    Gets the state of a Tetris game in the form returned by BatchTetris.get_game_state.
+
+    Args:
+        game (Tetris): The game.
+
+    Returns:
+        dict: The board, current block, queue, held block, score and previous clear.
+    """
+    return {
+        'board': game.board.board,
+        'current_block': (game.current_block.shape_name, list(game.current_block.coords)),
+        'queue': [block.shape_name for block in game.queue],
+        'held_block': game.held_block.shape_name if game.held_block is not None else None,
+        'just_held': game.just_held,
+        'score': game.score,
+        'prev_clear': game.prev_clear
+    }
+
+
+def step_scalar(game, action):
+    """
+    Applies an action to a Tetris game and clears any full lines, which is one step of BatchTetris.
+
+    Args:
+        game (Tetris): The game.
+        action (str): The name of the action.
+    """
+    game.apply_action(action)
+    cleared_lines = game.get_cleared_lines()
+    if cleared_lines:
+        game.clear_lines(cleared_lines)
@@ -0,0 +1,209 @@
+"""
+A bot that plays Tetris by searching every placement of the current and held blocks that can be reached,
+including tucks and spins, using the move generator in tetris_moves.
+
+Each placement is scored by a weighted sum of features of the board it leaves. The bot plays through the
+same actions as a person would, so it can drive the GUIs, or run headless as a load generator:
+
+    python tetris_bot.py [--games N] [--pieces N] [--seed N] [--board BitBoard]
+"""
+import argparse
+from time import perf_counter
+
+from tetris_logic import Tetris, Board, BitBoard, Block
+from tetris_moves import get_move_map, get_row_masks
+
+
+BOARD_TYPES = {'Board': Board, 'BitBoard': BitBoard}
+
+# Weights of the features of the board left by a placement. Higher scores are better.
+DEFAULT_WEIGHTS = {
+    'height': -0.51,     # Sum of the column heights
+    'lines': 0.76,       # Lines cleared by the placement
+    'holes': -0.36,      # Empty cells with a filled cell somewhere above them
+    'bumpiness': -0.18   # Sum of the height differences between neighbouring columns
+}
+
+
+def get_features(rows, width, coords):
+    """
+    Gets the features of the board left by placing a block and clearing any full lines.
+
+    Args:
+        rows (list): The row masks of the board before the placement.
+        width (int): The width of the board.
+        coords (Coord): The cells of the placed block.
+
+    Returns:
+        dict: The value of each feature in DEFAULT_WEIGHTS.
+    """
+    rows = list(rows)
+    for x, y in coords:
+        rows[y] |= 1 << x
+    full_mask = (1 << width) - 1
+    lines = 0
+    for y in {y for _, y in coords}:
+        if rows[y] == full_mask:
+            lines += 1
+            rows[y] = None
+    if lines:
+        rows = [row for row in rows if row is not None]
+
+    height = len(rows) + lines
+    heights = [0] * width
+    above = 0
+    holes = 0
+    for y, row in enumerate(rows):
+        holes += (above & ~row).bit_count()
+        new = row & ~above
+        while new:
+            low_bit = new & -new
+            heights[low_bit.bit_length() - 1] = height - lines - y
+            new ^= low_bit
+        above |= row
+
+    return {
+        'height': sum(heights),
+        'lines': lines,
+        'holes': holes,
+        'bumpiness': sum(abs(heights[x] - heights[x+1]) for x in range(width - 1))
+    }
+
+
+class TetrisBot:
+    """
+    Chooses where to place each block by trying every reachable placement of the current and held blocks.
+
+    Attributes:
+        weights (dict): The weight of each feature, as in DEFAULT_WEIGHTS.
+    """
+
+    def __init__(self, weights=None):
+        self.weights = DEFAULT_WEIGHTS | (weights or {})
+
+
+    def get_spawned_block(self, game, block):
+        """
+        Copies a block as it would appear if it became the current block.
+
+        Args:
+            game (Tetris): The game.
+            block (Block): The held or queued block.
+
+        Returns:
+            Block: The copy, moved up above any filled lines like Tetris.add_top_pad does.
+        """
+        spawned = Block(block.shape_name)
+        spawned.set_position(block.orientation, block.x, block.y - game.board.count_filled_lines(6))
+        return spawned
+
+
+    def evaluate(self, rows, width, coords):
+        """
+        Scores the board left by a placement.
+
+        Args:
+            rows (list): The row masks of the board before the placement.
+            width (int): The width of the board.
+            coords (Coord): The cells of the placed block.
+
+        Returns:
+            float: The score. Higher is better.
+        """
+        features = get_features(rows, width, coords)
+        return sum(self.weights[name]*value for name, value in features.items())
+
+
+    def choose_actions(self, game):
+        """
+        Finds the best placement of the current block, or of the held block if holding is allowed.
+
+        Args:
+            game (Tetris): The game.
+
+        Returns:
+            list: The actions to play, ending in HARD_DROP.
+        """
+        rows = get_row_masks(game.board)
+        candidates = [([], game.current_block)]
+        if (not game.just_held):
+            swapped = game.held_block if game.held_block != None else game.queue[0]
+            candidates.append((['HOLD'], self.get_spawned_block(game, swapped)))
+
+        best_score = None
+        best = None
+        for prefix, block in candidates:
+            move_map = get_move_map(game.board, block)
+            for lock, coords in move_map.get_distinct_locks():
+                score = self.evaluate(rows, game.width, coords)
+                if (best_score is None or score > best_score):
+                    best_score = score
+                    best = (prefix, move_map, lock)
+        if best is None:
+            return ['HARD_DROP']
+        # Only the chosen placement's inputs are worked out
+        prefix, move_map, lock = best
+        return prefix + move_map.get_actions(lock)
+
+
+    def play_block(self, game):
+        """
+        Places the current block where the bot chooses, then clears any full lines.
+
+        Args:
+            game (Tetris): The game.
+
+        Returns:
+            list: The actions that were played.
+        """
+        actions = self.choose_actions(game) + ['CLEAR']
+        for action in actions:
+            game.apply_action(action)
+        return actions
+
+
+def play_game(seed, max_blocks, bot=None, board_type=Board):
+    """
+    Plays a game with the bot until it tops out or has placed enough blocks.
+
+    Args:
+        seed (int): The seed for the game.
+        max_blocks (int): The maximum number of blocks to place.
+        bot (TetrisBot): The bot, or None for one with the default weights.
+        board_type (type): The board class to use.
+
+    Returns:
+        tuple: The finished game, and the number of blocks placed.
+    """
+    bot = TetrisBot() if bot is None else bot
+    game = Tetris(board_type=board_type, seed=seed)
+    blocks = 0
+    while (blocks < max_blocks and not game.check_game_over()):
+        bot.play_block(game)
+        blocks += 1
+    return game, blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play games with the bot and report how fast it decides.')
+    parser.add_argument('--games', type=int, default=5, help='games to play')
+    parser.add_argument('--pieces', type=int, default=500, help='maximum blocks to place per game')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game, incremented for each game')
+    parser.add_argument('--board', choices=BOARD_TYPES, default='Board', help='board class to play on')
+    args = parser.parse_args()
+
+    bot = TetrisBot()
+    total_blocks = 0
+    total_time = 0
+    for i in range(args.games):
+        start = perf_counter()
+        game, blocks = play_game(args.seed + i, args.pieces, bot, BOARD_TYPES[args.board])
+        total_time += perf_counter() - start
+        total_blocks += blocks
+        print(f'game {i}: seed {args.seed + i}, {blocks} blocks, score {game.score}, '
+              f'{"topped out" if game.check_game_over() else "still going"}')
+    print(f'{total_blocks/total_time:,.0f} decisions/s ({total_time/total_blocks*1000:.2f} ms per decision)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""
+Reinforcement learning environments over Tetris, in the style of Gym.
+
+TetrisEnv plays one game, and VectorTetrisEnv plays many at once on BatchTetris. Both take actions as indices into
+ACTIONS, and each step applies the action and then clears any full lines, like BatchTetris.step, so the two play
+seeded games identically. The reward is the change in score, and a game is done once it tops out.
+
+Observations are NumPy arrays allocated when the environment is made and overwritten by every reset and step, so
+copy them to keep them past the next step:
+
+    board   (height, width) uint8, 0 for empty, otherwise 1 + the shape id, or GARBAGE_VALUE for garbage
+    piece   (4,) int64, the current block's shape id, orientation, x and y, as in Block
+    queue   (queue length,) int64, the shape ids of the upcoming blocks
+    hold    () int64, the shape id of the held block, or -1 if none
+
+The vector environment's arrays have an extra leading dimension for the environment.
+"""
+import numpy as np
+
+from tetris_logic import Tetris, BitBoard, BagRandomizer, ACTIONS, GARBAGE, GAME_WIDTH, GAME_HEIGHT, QUEUE_LENGTH
+from tetris_batch import BatchTetris, SHAPE_NAMES, SHAPE_IDS
+from tetris_replay import get_random_seed
+
+
+GARBAGE_VALUE = len(SHAPE_NAMES) + 1
+# The value of each cell of a Board in the board observation
+CELL_VALUES = {0: 0, GARBAGE: GARBAGE_VALUE, **{shape_name: shape_id + 1 for shape_name, shape_id in SHAPE_IDS.items()}}
+
+
+
+
+class TetrisEnv:
+    """
+    A single game of Tetris as an environment.
+
+    Each part of the observation is only copied when it can have changed: the board, and whether the game is over,
+    when the board's version changes, the piece when the game's version changes, and the queue and held block
+    when a new block appears.
+
+    Attributes:
+        width (int): The width of the board.
+        height (int): The height of the board, without the 6 hidden rows at the top.
+        board_type (type): The Board class the games use.
+        randomizer_type (type): The Randomizer class the games use.
+        queue_length (int): The number of upcoming blocks shown.
+        game (Tetris): The current game, or None before the first reset.
+        observation (dict): The board, piece, queue and hold arrays, by name.
+        info (dict): Extra details of the last step: the lines it cleared.
+        done (bool): Whether the game is over.
+        version (int): The version of the game last copied into the observation.
+        board_version (int): The version of the board last copied into the observation.
+        block (Block): The current block when the queue and held block were last copied.
+    """
+
+    def __init__(self, width=GAME_WIDTH, height=GAME_HEIGHT, board_type=BitBoard, randomizer_type=BagRandomizer,
+                 queue_length=QUEUE_LENGTH):
+        self.width = width
+        self.height = height
+        self.board_type = board_type
+        self.randomizer_type = randomizer_type
+        self.queue_length = queue_length
+        self.game = None
+        self.observation = {
+            'board': np.zeros((height + 6, width), dtype=np.uint8),
+            'piece': np.zeros(4, dtype=np.int64),
+            'queue': np.zeros(queue_length, dtype=np.int64),
+            'hold': np.full((), -1, dtype=np.int64)
+        }
+        self.info = {'lines': 0}
+        self.done = False
+        self.version = None
+        self.board_version = None
+        self.block = None
+
+
+    def reset(self, seed=None):
+        """
+        Starts a new game.
+
+        Args:
+            seed (int): The seed for the game's pieces, or None for a random one.
+
+        Returns:
+            dict: The observation.
+        """
+        self.game = Tetris(self.width, self.height, board_type=self.board_type,
+                           randomizer=self.randomizer_type(seed), queue_length=self.queue_length)
+        self.version = None
+        self.board_version = None
+        self.block = None
+        self.info['lines'] = 0
+        return self.observe()
+
+
+    def step(self, action):
+        """
+        Applies an action, then clears any full lines. Actions on a finished game are ignored.
+
+        Args:
+            action (int): An index into ACTIONS.
+
+        Returns:
+            tuple: The observation, the reward, whether the game is over, and the info.
+
+        Raises:
+            RuntimeError: If reset hasn't been called.
+        """
+        game = self.game
+        if game is None:
+            raise RuntimeError('Call reset before step.')
+        lines = 0
+        score = game.score
+        if not self.done:
+            game.apply_action(ACTIONS[action])
+            cleared_lines = game.get_cleared_lines()
+            if cleared_lines:
+                lines = len(cleared_lines)
+                game.clear_lines(cleared_lines)
+        self.info['lines'] = lines
+        return self.observe(), game.score - score, self.done, self.info
+
+
+    def observe(self):
+        """
+        Copies the parts of the game that have changed into the observation.
+
+        Returns:
+            dict: The observation.
+        """
+        game = self.game
+        observation = self.observation
+        board = game.board
+        if board.version != self.board_version:
+            observation['board'][:] = [[CELL_VALUES[cell] for cell in row] for row in board.board]
+            self.done = game.check_game_over()
+            self.board_version = board.version
+        if game.version == self.version:
+            return observation
+
+        block = game.current_block
+        piece = observation['piece']
+        piece[0] = SHAPE_IDS[block.shape_name]
+        piece[1] = block.orientation
+        piece[2] = block.x
+        piece[3] = block.y
+        if block is not self.block:
+            queue = observation['queue']
+            for i, queued in enumerate(game.queue):
+                queue[i] = SHAPE_IDS[queued.shape_name]
+            observation['hold'][()] = -1 if game.held_block is None else SHAPE_IDS[game.held_block.shape_name]
+            self.block = block
+        self.version = game.version
+        return observation
+
+
+
+
+class VectorTetrisEnv:
+    """
+    Many games of Tetris as one environment, stepped together on BatchTetris.
+
+    Games that finish stay finished, ignoring their actions and returning no reward, until they are reset, either
+    all together or a few at a time. With auto_reset, a game that finishes on a step is restarted with a random
+    seed straight away: the step returns done for it, with the reward and lines of its last move, and the
+    observation of the new game.
+
+    Attributes:
+        n_envs (int): The number of games.
+        width (int): The width of each board.
+        height (int): The height of each board, without the 6 hidden rows at the top.
+        randomizer_type (type): The Randomizer class the games use.
+        queue_length (int): The number of upcoming blocks shown.
+        auto_reset (bool): Whether games that finish are restarted on the same step.
+        batch (BatchTetris): The games, or None before the first reset.
+        observation (dict): The board, piece, queue and hold arrays, by name, each with a row per game.
+        rewards (ndarray): The reward of each game on the last step.
+        dones (ndarray): Whether each game is over.
+        info (dict): Extra details of the last step: the lines each game cleared.
+        scores (ndarray): The score of each game before the last step.
+    """
+
+    def __init__(self, n_envs, width=GAME_WIDTH, height=GAME_HEIGHT, randomizer_type=BagRandomizer,
+                 queue_length=QUEUE_LENGTH, auto_reset=False):
+        self.n_envs = n_envs
+        self.width = width
+        self.height = height
+        self.randomizer_type = randomizer_type
+        self.queue_length = queue_length
+        self.auto_reset = auto_reset
+        self.batch = None
+        self.observation = {
+            'board': np.zeros((n_envs, height + 6, width), dtype=np.uint8),
+            'piece': np.zeros((n_envs, 4), dtype=np.int64),
+            'queue': np.zeros((n_envs, queue_length), dtype=np.int64),
+            'hold': np.full(n_envs, -1, dtype=np.int64)
+        }
+        self.rewards = np.zeros(n_envs, dtype=np.int64)
+        self.dones = np.zeros(n_envs, dtype=bool)
+        self.info = {'lines': np.zeros(n_envs, dtype=np.int64)}
+        self.scores = np.zeros(n_envs, dtype=np.int64)
+
+
+    def reset(self, seeds=None, envs=None):
+        """
+        Starts new games, reusing the arrays of the games they replace.
+
+        Args:
+            seeds (list): The seed for each game started, or None for random ones.
+            envs (ndarray): The indices of the environments to restart. Defaults to all of them.
+
+        Returns:
+            dict: The observation.
+        """
+        if self.batch is None:
+            self.batch = BatchTetris(self.n_envs, None, self.width, self.height, self.randomizer_type,
+                                     self.queue_length)
+        envs = np.arange(self.n_envs) if envs is None else np.asarray(envs, dtype=np.int64)
+        self.restart(envs, seeds)
+        self.info['lines'][envs] = 0
+        return self.observe()
+
+
+    def restart(self, envs, seeds=None):
+        """
+        Starts new games in some environments, without updating the observation.
+
+        Args:
+            envs (ndarray): The indices of the environments.
+            seeds (list): The seed for each game, or None for random ones.
+        """
+        if seeds is None:
+            seeds = [get_random_seed() for _ in range(len(envs))]
+        self.batch.reset(envs, seeds)
+        self.scores[envs] = 0
+
+
+    def step(self, actions):
+        """
+        Applies one action to every game that is still running, then clears full lines.
+
+        Args:
+            actions (ndarray): One index into ACTIONS per game.
+
+        Returns:
+            tuple: The observation, the reward of each game, whether each game is over, and the info.
+
+        Raises:
+            RuntimeError: If reset hasn't been called.
+        """
+        batch = self.batch
+        if batch is None:
+            raise RuntimeError('Call reset before step.')
+        np.copyto(self.info['lines'], batch.step(actions))
+        np.subtract(batch.scores, self.scores, out=self.rewards)
+        np.copyto(self.scores, batch.scores)
+        if not (self.auto_reset and batch.game_over.any()):
+            return self.observe(), self.rewards, self.dones, self.info
+        finished = np.flatnonzero(batch.game_over)
+        self.restart(finished)
+        observation = self.observe()
+        self.dones[finished] = True
+        return observation, self.rewards, self.dones, self.info
+
+
+    def observe(self):
+        """
+        Copies the state of every game into the observation.
+
+        Returns:
+            dict: The observation.
+        """
+        batch = self.batch
+        observation = self.observation
+        np.copyto(observation['board'], batch.boards)
+        piece = observation['piece']
+        piece[:, 0] = batch.shapes
+        piece[:, 1] = batch.orientations
+        piece[:, 2] = batch.xs
+        piece[:, 3] = batch.ys
+        np.copyto(observation['queue'], batch.queues)
+        np.copyto(observation['hold'], batch.held)
+        np.copyto(self.dones, batch.game_over)
+        return observation
@@ -1,7 +1,11 @@
 import curses
-from time import time
-from itertools import product
+import argparse
+from time import time, perf_counter
+from math import ceil
+from functools import lru_cache
 from tetris_logic import Tetris
+from tetris_replay import Recorder, get_random_seed
+from tetris_profile import start_profiling
 
 
 UP = 450
@@ -13,108 +17,219 @@ KEYS = [UP, DOWN, LEFT, RIGHT, 'z', 'x']
 
 BORDER = '■'
 BLOCK = '□'
+ROW_CACHE_SIZE = 1024
+
+# Actions for keys from getch, both the curses key codes and the codes some terminals send instead
+KEY_ACTIONS = {
+    curses.KEY_LEFT: 'LEFT', LEFT: 'LEFT',
+    curses.KEY_RIGHT: 'RIGHT', RIGHT: 'RIGHT',
+    curses.KEY_UP: 'HARD_DROP', UP: 'HARD_DROP',
+    curses.KEY_DOWN: 'SOFT_DROP', DOWN: 'SOFT_DROP',
+    ord('z'): 'ROTATE_CCW',
+    ord('x'): 'ROTATE_CW'
+}
+
+
+@lru_cache(maxsize=ROW_CACHE_SIZE)
+def render_board_row(cells):
+    """
+    Draws a row of the board between the side borders. Boards have few distinct rows, so these are cached.
+    
+    Args:
+        cells (tuple): The cells of the row.
+        
+    Returns:
+        str: The line.
+    """
+    return BORDER + ''.join([BLOCK if cell else ' ' for cell in cells]) + BORDER
+
+
+def render_rows(game):
+    """
+    Draws a game as lines of text: the board inside a border, with the current block and its ghost.
+    
+    Args:
+        game (Tetris): The game.
+        
+    Returns:
+        list: The lines, top first.
+    """
+    border = BORDER * (game.width + 2)
+    rows = [render_board_row(tuple(row)) for row in game.board.board]
+    
+    # Only the rows under the block and its ghost are split into cells
+    cells = {}
+    for x, y in game.current_block.coords:
+        if (x >= 0) and (y >= 0):
+            if y not in cells:
+                cells[y] = list(rows[y])
+            cells[y][x+1] = BLOCK
+    
+    # Ghost cells above the board would land on the top border, which is drawn with the same character
+    for x, y in game.get_ghost_block().coords:
+        if (y >= 0):
+            if y not in cells:
+                cells[y] = list(rows[y])
+            cells[y][x+1] = BORDER
+    
+    for y, row in cells.items():
+        rows[y] = ''.join(row)
+    return [border] + rows + [border]
+
 
 class TetrisTerminalGui:
     
-    def __init__(self, screen):
-        self.game = Tetris()
+    def __init__(self, screen, seed=None, profiler=None, profile_path=None):
+        self.seed = get_random_seed() if seed is None else seed
+        self.profiler = profiler
+        self.profile_path = profile_path
+        self.game = Tetris(seed=self.seed)
+        self.game.add_listener(self.handle_game_event)
+        self.recorder = Recorder(self.game, self.seed, time())
         self.screen = screen
+        self.move_time = None
+        self.lock_time = None
+        self.lines_to_clear = False
+        self.drawn_version = None
+        
+        
+    def handle_game_event(self, event):
+        """
+        Notes when a locked block leaves full lines, to be cleared once the action that locked it is done, and
+        writes the profiling report when the game is over.
+        
+        Args:
+            event (GameEvent): The event.
+        """
+        if (event.type == 'PIECE_LOCKED'):
+            self.lines_to_clear = event.full_lines > 0
+        elif (event.type == 'GAME_OVER'):
+            self.save_profile()
+        
+        
+    def save_profile(self):
+        """
+        Writes the profiling report to the profile path, if profiling.
+        """
+        if (self.profiler is not None):
+            self.profiler.write_report(self.profile_path)
         
         
     def handle_keyboard_input(self, ch):
-        if (ch == curses.KEY_LEFT or ch == LEFT):
-            self.game.move_x(self.game.current_block, True)
-        if (ch == curses.KEY_RIGHT or ch == RIGHT):
-            self.game.move_x(self.game.current_block, False)
-        if (ch == curses.KEY_UP or ch == UP):
-            self.game.hard_drop()
-        if (ch == curses.KEY_DOWN or ch == DOWN):
-            self.game.move_down(self.game.current_block)
-        if (ch == ord('z')):
-            self.game.current_block.rotate(self.game.width, self.game.height, self.game.board.board, False)
-        if (ch == ord('x')):
-            self.game.current_block.rotate(self.game.width, self.game.height, self.game.board.board, True)
+        action = KEY_ACTIONS.get(ch)
+        if (action is not None):
+            self.recorder.apply_action(action, time())
             
         
             
     def render(self, screen):
+        for i, row in enumerate(render_rows(self.game)):
+            screen.addstr(i, 0, row)
+    
+    
+    def reset_move_timer(self, now):
+        """
+        Schedules the next gravity step, using the interval for the current level.
         
-        width = self.game.width + 2
-        height = self.game.height + 2
-        board = self.game.board.board
+        Args:
+            now (float): The current time.
+        """
+        self.move_time = now + self.game.get_move_time_interval()
         
-        rows = [[BORDER if ((i == 0) or (i == width-1)) else ' ' for i in range(width)] for _ in range(height)]
-        for x, y in self.game.current_block.coords:
-            if (x >= 0) and (y >= 0):
-                rows[y+1][x+1] = BLOCK
-        rows[0] = [BORDER] * width
-        rows[-1] = [BORDER] * width
         
+    def handle_timers(self, now):
+        """
+        Runs gravity and locking for any deadlines that have passed.
         
-        for x, y in product(range(1, width-1), range(1, height-1)):
-            if (board[y-1][x-1]):
-                rows[y][x] = BLOCK
-                
-        for x, y in self.game.get_ghost_block().coords:
-            rows[y+1][x+1] = BORDER
-                
+        Args:
+            now (float): The current time.
+        """
+        if self.lock_time is not None and now >= self.lock_time:
+            # Place and lock block
+            self.recorder.apply_action('LOCK', now)
+            self.lock_time = None
+            self.reset_move_timer(now)
+            return
         
-        for i, row in enumerate(rows):
-            screen.addstr(i, 0, ''.join(row))
+        if now >= self.move_time:
+            self.reset_move_timer(now)
+            if not self.game.check_y_collision(self.game.current_block):
+                # Just move block down by one
+                self.recorder.apply_action('SOFT_DROP', now)
+                return
+            if self.lock_time is None:
+                # Block is touching floor or another block
+                self.lock_time = now + self.game.get_lock_time_interval()
     
     
-    def game_loop(self):
+    def get_timeout(self, now):
+        """
+        Gets how long to wait for input before the next gravity or lock deadline.
         
-        
-        self.screen.timeout(0)
-        prev_time = time()
-        at_bottom = False
+        Args:
+            now (float): The current time.
+            
+        Returns:
+            int: The timeout in milliseconds.
+        """
+        deadline = self.move_time if self.lock_time is None else min(self.move_time, self.lock_time)
+        return max(0, ceil((deadline - now)*1000))
+    
+    
+    def game_loop(self):
+        """
+        Runs the game, sleeping in getch until either a key is pressed or the next deadline is due,
+        and only redrawing when the game's version shows it changed.
+        """
+        self.reset_move_timer(time())
         
         while True:
-                
-            t = self.game.get_move_time_interval()
             
-            current_time = time()
-            if current_time - prev_time > t:
-                prev_time = current_time
-                
-                if at_bottom:
-                    # Place and lock block
-                    self.game.place_block()
-                    at_bottom = False
-                    
-                elif self.game.check_y_collision(self.game.current_block):
-                    # Block is touching floor or another block
-                    at_bottom = True
-                    
-                else:
-                    # Just move block down by one
-                    self.game.move_down(self.game.current_block)
+            frame_start = perf_counter()
+            self.handle_timers(time())
+            
+            if self.lines_to_clear:
+                self.lines_to_clear = False
+                self.recorder.apply_action('CLEAR', time())
             
+            if self.game.version != self.drawn_version:
+                self.render(self.screen)
+                self.screen.refresh()
+                self.drawn_version = self.game.version
+            
+            # Frames are timed up to the wait for input
+            if (self.profiler is not None):
+                self.profiler.add_frame('curses', perf_counter() - frame_start)
+            
+            self.screen.timeout(self.get_timeout(time()))
             ch = self.screen.getch()
             if ((ch != -1)):
                 self.handle_keyboard_input(ch)
-                at_bottom = False
+                self.lock_time = None
                 if (ch == DOWN):
-                    prev_time = time()
-                    
-            cleared_lines = self.game.get_cleared_lines()
-            
-            if len(cleared_lines) > 0:
-                self.game.clear_lines(cleared_lines)
-            
-            self.render(self.screen)
-            self.screen.refresh()
+                    self.reset_move_timer(time())
                 
                 
         
 
             
-def main(screen):
+def main(screen, seed=None, record_path=None, profile_path=None):
     
-    gui = TetrisTerminalGui(screen)
-    gui.game_loop()
+    profiler = None if profile_path is None else start_profiling(profile_path)
+    gui = TetrisTerminalGui(screen, seed, profiler, profile_path)
+    try:
+        gui.game_loop()
+    finally:
+        if (record_path is not None):
+            gui.recorder.save(record_path)
+        gui.save_profile()
     
     
 if __name__ == '__main__':
-    curses.wrapper(main)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Play Tetris in the terminal.')
+    parser.add_argument('--seed', type=int, help='seed for the shape bags, random if not given')
+    parser.add_argument('--record', metavar='PATH', help='write a replay of the game to PATH on exit, for tetris_replay.py')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='profile the game logic and frames, writing a report to PATH at game over, on exit and on SIGUSR1')
+    args = parser.parse_args()
+    curses.wrapper(main, args.seed, args.record, args.profile)
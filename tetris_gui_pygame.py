@@ -1,13 +1,20 @@
 import pygame
-from pygame import mixer, font, image, USEREVENT
-from pygame.transform import scale
+from pygame import mixer, USEREVENT
 
 
+import argparse
 from pathlib import Path
 from itertools import product
-from time import time
+from functools import lru_cache
+from time import perf_counter
 
 from tetris_logic import Tetris
+from tetris_assets import AssetManager
+from tetris_audio import AudioEngine, CROSSFADE_MS
+from tetris_replay import Recorder, get_random_seed
+from tetris_bot import TetrisBot
+from tetris_profile import start_profiling
+from tetris_scheduler import FixedTimestep
 
 ################## POSITIONS AND SCALING ##################
 
@@ -26,48 +33,55 @@ CORE_WIDTH, CORE_HEIGHT = 400*SCALE, 800*SCALE
 BOARD_WIDTH, BOARD_HEIGHT = 300*SCALE, 600*SCALE
 SIDE_WIDTH = 200*SCALE
 BOARD_TOP_LEFT = (50*SCALE+SIDE_WIDTH, 100*SCALE)
+CORE_RECT = pygame.Rect(SIDE_WIDTH, 0, CORE_WIDTH, CORE_HEIGHT)
+SIDE_RECTS = [pygame.Rect(0, 0, SIDE_WIDTH, HEIGHT), pygame.Rect(SIDE_WIDTH + CORE_WIDTH, 0, SIDE_WIDTH, HEIGHT)]
 
 
 ################## MISC SETTINGS ##################
 
 BLINK_EVENT = USEREVENT + 1
-MOVE_DOWN_EVENT = USEREVENT + 2
-CLEAR_LINES_EVENT = USEREVENT + 3
-LEVEL_UP_EVENT = USEREVENT + 4
-MUSIC_EVENT = USEREVENT + 5
 
 WHITE = (255, 255, 255)
 RED = (255, 0, 0)
 GOLD = (255, 223, 0)
-FPS = 60
+FPS = 60                    # Default cap on frames drawn per second, 0 for no cap
+TICK_RATE = 120             # Game logic ticks per second, whatever the frame rate
+TICK_TIME = 1/TICK_RATE
+MAX_TICKS_PER_FRAME = 12    # Ticks beyond this in one frame, after a stall, are dropped
+SOFT_DROP_INTERVAL = 0.035  # Seconds between soft drops while the down key is held
 MUSIC_CHANGE_LEVEL_1 = 5
 MUSIC_CHANGE_LEVEL_2 = 11
-mixer.init()
-font.init()
+TEXT_CACHE_SIZE = 64
+SOUND_VOLUME = 0.2
 
 SOFT_DELAY_TIMES = {}
 
 
 ################## ASSET LOADING ##################
 
+# Everything is loaded the first time it's used, through ASSETS. Images are read from the bundle
+# built by `python tetris_assets.py` if there is one for this SCALE, so they needn't be scaled at launch.
 
-# Graphics
-LOGO = scale(image.load(Path('Assets')/'pyTetris.png'), LOGO_SIZE)
 
+# Graphics, as name: (path, size before scaling)
 BACKGROUNDS_PATH = Path("Assets/Backgrounds")
-START_BACKGROUND = scale(image.load(BACKGROUNDS_PATH/'Start.png'), (WIDTH, HEIGHT))
-GAME_OVER_BACKGROUND = scale(image.load(BACKGROUNDS_PATH/'Game_Over.png'), (WIDTH, HEIGHT))
-BOARD_BACKGROUND = scale(image.load(BACKGROUNDS_PATH/'Background.png'), BACKGROUND_SCALE)
-BORDER = scale(image.load(BACKGROUNDS_PATH/'Border_transparent.png'), BACKGROUND_SCALE)
-SIDE_BACKGROUND = scale(image.load(BACKGROUNDS_PATH/'Pattern01.png'), SIDE_BACKGROUND_SCALE)
-
-
 GRAPHICS_PATH = Path("Assets/Graphics")
 SHAPE_NAMES = ["I", "J", "L", "O", "S", "Z", "T"]
-BLOCK_GRAPHICS = {shape: scale(image.load(GRAPHICS_PATH/"Block"/f'{shape}_Block.png'), BLOCK_SCALE) for shape in SHAPE_NAMES}
-PIECE_GRAPHICS = {shape: scale(image.load(GRAPHICS_PATH/"Piece"/f'{shape}_Piece.png'), PIECE_SCALE) for shape in SHAPE_NAMES}
-PIECE_GRAPHICS_GREY = {shape: scale(image.load(GRAPHICS_PATH/"Grey"/f'{shape}_Piece_Grey.png'), PIECE_SCALE) for shape in SHAPE_NAMES}
-GHOST = scale(image.load(GRAPHICS_PATH/"Block"/'ghost.png'), BLOCK_SCALE)
+IMAGE_SPECS = {
+    'LOGO': (Path('Assets')/'pyTetris.png', (510, 209)),
+    'START_BACKGROUND': (BACKGROUNDS_PATH/'start.png', (800, 800)),
+    'GAME_OVER_BACKGROUND': (BACKGROUNDS_PATH/'game_over.png', (800, 800)),
+    'BOARD_BACKGROUND': (BACKGROUNDS_PATH/'background.png', (400, 800)),
+    'BORDER': (BACKGROUNDS_PATH/'border_transparent.png', (400, 800)),
+    'SIDE_BACKGROUND': (BACKGROUNDS_PATH/'Pattern01.png', (200, 200)),
+    'GHOST': (GRAPHICS_PATH/"Block"/'ghost.png', (30, 30)),
+}
+IMAGE_SPECS |= {f'BLOCK_{shape}': (GRAPHICS_PATH/"Block"/f'{shape}_Block.png', (30, 30)) for shape in SHAPE_NAMES}
+IMAGE_SPECS |= {f'PIECE_{shape}': (GRAPHICS_PATH/"Piece"/f'{shape}_Piece.png', (120, 120)) for shape in SHAPE_NAMES}
+IMAGE_SPECS |= {f'PIECE_GREY_{shape}': (GRAPHICS_PATH/"Grey"/f'{shape}_Piece_Grey.png', (120, 120)) for shape in SHAPE_NAMES}
+
+# Block and piece graphics are drawn from one atlas, by the rectangles in TetrisPyGameWindow.sprites
+ATLAS_IMAGES = ['GHOST'] + [f'{kind}_{shape}' for kind in ('BLOCK', 'PIECE', 'PIECE_GREY') for shape in SHAPE_NAMES]
 
 
 # Music
@@ -75,40 +89,88 @@ MUSIC_PATH = Path("Assets/Music")
 TETRIS_A = MUSIC_PATH/'tetris_a.ogg'
 TETRIS_B = MUSIC_PATH/'tetris_b.ogg'
 GOD_SHATTERING_STAR = MUSIC_PATH/'GOD_SHATTERING_STAR.ogg'
+MUSIC_TRACKS = [TETRIS_A, TETRIS_B, GOD_SHATTERING_STAR]   # Indexed by music level
 
 
-# Sounds
+# Sounds, as name: (path, volume). Line clears are CLEAR_1 to CLEAR_7, indexed like prev_clear.
 SOUNDS_PATH = Path("Assets/Sounds")
 SOUND_NAMES = ["MOVE_X_SOUND", "MOVE_Y_SOUND", "ROTATE_SOUND", "HOLD_SOUND", 
                "HARD_DROP_SOUND", "SOFT_DROP_SOUND", "LEVEL_UP_SOUND", "B2B_BREAK_SOUND", 
                "GAME_OVER_SOUND", "SELECT_SOUND"]
-SOUNDS = {sound: mixer.Sound(str(SOUNDS_PATH/f'{sound[:-6].lower()}.ogg')) for sound in SOUND_NAMES}
+SOUND_SPECS = {sound: (SOUNDS_PATH/f'{sound[:-6].lower()}.ogg', SOUND_VOLUME) for sound in SOUND_NAMES}
+SOUND_SPECS |= {f'CLEAR_{i}': (SOUNDS_PATH/f'clear_{i}.ogg', SOUND_VOLUME) for i in range(1, 4)}
+SOUND_SPECS |= {f'CLEAR_{i+3}': (SOUNDS_PATH/f'clear_b2b_{i}.ogg', SOUND_VOLUME) for i in range(1, 5)}
+
+# Sounds, as name: (priority, minimum seconds between plays). Key repeats and soft drops come every 35 ms,
+# so their sounds are spaced out and give way to everything else when the channels are full.
+SOUND_RULES = {
+    'MOVE_X_SOUND': (0, 0.07),
+    'MOVE_Y_SOUND': (0, 0.07),
+    'ROTATE_SOUND': (1, 0.05),
+    'SOFT_DROP_SOUND': (2, 0.0),
+    'HOLD_SOUND': (2, 0.0),
+    'HARD_DROP_SOUND': (2, 0.0),
+    'SELECT_SOUND': (3, 0.0),
+    'LEVEL_UP_SOUND': (3, 0.0),
+    'B2B_BREAK_SOUND': (3, 0.0),
+    'GAME_OVER_SOUND': (4, 0.0),
+}
+SOUND_RULES |= {f'CLEAR_{i}': (3, 0.0) for i in range(1, 8)}
+
+
+# Fonts, as name: (path, size)
+FONT_PATH = Path("Assets/Fonts")
+FONT_SPECS = {
+    'FONT_BIG': (FONT_PATH/'Viga-Regular.ttf', 60),
+    'FONT_SMALL': (FONT_PATH/'Viga-Regular.ttf', 40),
+    'FONT_BIG_ITALIC': (FONT_PATH/'Lora-VariableFont_wght.ttf', 60),
+    'FONT_SMALL_ITALIC': (FONT_PATH/'PlayfairDisplay-Italic-VariableFont_wght.ttf', 40),
+}
 
-SINGLE_CLEAR_SOUNDS = {i: mixer.Sound(str(Path("Assets/Sounds")/f'clear_{i}.ogg')) for i in range(1, 4)}
-TETRIS_SOUNDS = {i+3 :mixer.Sound(str(Path("Assets/Sounds")/f'clear_b2b_{i}.ogg')) for i in range(1, 5)}
-CLEAR_SOUNDS = SINGLE_CLEAR_SOUNDS | TETRIS_SOUNDS
+ASSETS = AssetManager(IMAGE_SPECS, SOUND_SPECS, FONT_SPECS, SCALE)
 
-for sound in SOUNDS.values():
-    sound.set_volume(0.2)
-for sound in CLEAR_SOUNDS.values():
-    sound.set_volume(0.2)
 
-# Fonts
-FONT_PATH = Path("Assets/Fonts")
-FONT_BIG = font.Font(FONT_PATH/'Viga-Regular.ttf', 60)
-FONT_SMALL = font.Font(FONT_PATH/'Viga-Regular.ttf', 40)
-FONT_BIG_ITALIC = font.Font(FONT_PATH/'Lora-VariableFont_wght.ttf', 60)
-FONT_SMALL_ITALIC = font.Font(FONT_PATH/'PlayfairDisplay-Italic-VariableFont_wght.ttf', 40)
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text(text_font, text, color):
+    """
+    Renders antialiased text, reusing the surface if the same font, text and colour were rendered recently.
+    The least recently used surfaces are evicted once TEXT_CACHE_SIZE is reached.
+    
+    Args:
+        text_font (Font): The font to render with.
+        text (str): The text.
+        color (tuple): The RGB colour.
+        
+    Returns:
+        Surface: The rendered text. Shared between callers, so it shouldn't be modified.
+    """
+    return text_font.render(text, True, color)
 
 
 # aseteroid.move_ip(random.randint(-1, 1), random.randint(-1, 1)) Screen shake?
 
 class TetrisPyGameWindow:
     
-    def __init__(self):
-        self.window = pygame.display.set_mode((WIDTH, HEIGHT))
+    def __init__(self, vsync=False):
+        self.window = None
+        if (vsync):
+            # Vsync needs a renderer, which not every display driver can give
+            try:
+                self.window = pygame.display.set_mode((WIDTH, HEIGHT), pygame.SCALED, vsync=1)
+            except pygame.error:
+                pass
+        if (self.window is None):
+            self.window = pygame.display.set_mode((WIDTH, HEIGHT))
         self.is_visible = True
         self.fade_in_stage = 255
+        self.needs_redraw = True
+        self.board_layer = pygame.Surface(BACKGROUND_SCALE)
+        self.board_layer_version = None
+        self.piece_key = None
+        self.piece_rects = []
+        self.side_modules_key = None
+        self.drawn_key = None
+        self.atlas, self.sprites = ASSETS.atlas(ATLAS_IMAGES)
         
         
     def get_render_block(self, shape):
@@ -130,25 +192,27 @@ class TetrisPyGameWindow:
         """
         Draws the start screen.
         """
-        self.window.blit(START_BACKGROUND, (0, 0))
-        LOGO.set_alpha(255 - self.fade_in_stage)
+        self.window.blit(ASSETS.image('START_BACKGROUND'), (0, 0))
+        ASSETS.image('LOGO').set_alpha(255 - self.fade_in_stage)
         if self.fade_in_stage > 0:
             self.fade_in_stage -= 5
-        self.window.blit(LOGO, (WIDTH//2 - LOGO_SIZE[0]//2, 200))
-        start_text = FONT_SMALL.render("PRESS ANY BUTTON TO START", True, WHITE)
+        self.window.blit(ASSETS.image('LOGO'), (WIDTH//2 - LOGO_SIZE[0]//2, 200))
+        start_text = render_text(ASSETS.font('FONT_SMALL'), "PRESS ANY BUTTON TO START", WHITE)
         if (self.is_visible and self.fade_in_stage == 0):
             self.window.blit(start_text, (WIDTH//2 - start_text.get_width()//2, 800))
+        self.needs_redraw = True
             
             
     def draw_game_over_screen(self, show_score, game):
-        GAME_OVER_BACKGROUND.set_alpha(max(0, 255 - self.fade_in_stage))
+        self.needs_redraw = True
+        ASSETS.image('GAME_OVER_BACKGROUND').set_alpha(max(0, 255 - self.fade_in_stage))
         if self.fade_in_stage > 0:
             self.fade_in_stage -= 10
-        self.window.blit(GAME_OVER_BACKGROUND, (0, 0))
+        self.window.blit(ASSETS.image('GAME_OVER_BACKGROUND'), (0, 0))
         if (show_score):
-            game_over_text = FONT_BIG.render('GAME OVER', True, WHITE)
-            level_text = FONT_SMALL_ITALIC.render(f'LEVEL {game.get_current_level()}', True, WHITE)
-            score_text = FONT_SMALL_ITALIC.render(f'Score: {game.score}', True, WHITE)
+            game_over_text = render_text(ASSETS.font('FONT_BIG'), 'GAME OVER', WHITE)
+            level_text = render_text(ASSETS.font('FONT_SMALL_ITALIC'), f'LEVEL {game.get_current_level()}', WHITE)
+            score_text = render_text(ASSETS.font('FONT_SMALL_ITALIC'), f'Score: {game.score}', WHITE)
             self.window.blit(game_over_text, (WIDTH//2 - game_over_text.get_width()//2, 300))
             self.window.blit(level_text, (WIDTH//2 - level_text.get_width()//2, 400))
             self.window.blit(score_text, (WIDTH//2 - score_text.get_width()//2, 450))
@@ -156,40 +220,81 @@ class TetrisPyGameWindow:
         
     def draw_backgrounds(self):
         """
-        Draws the backgrounds of the game (main background, side panels).
+        Draws the backgrounds of the side panels. The main background is part of the board layer.
         """
-        self.window.blit(BOARD_BACKGROUND, (SIDE_WIDTH, 0))
         for y in range((int(CORE_HEIGHT/SIDE_WIDTH))):
-            self.window.blit(SIDE_BACKGROUND, (0, SIDE_WIDTH*y))
-            self.window.blit(SIDE_BACKGROUND, (SIDE_WIDTH + CORE_WIDTH, SIDE_WIDTH*y))
+            self.window.blit(ASSETS.image('SIDE_BACKGROUND'), (0, SIDE_WIDTH*y))
+            self.window.blit(ASSETS.image('SIDE_BACKGROUND'), (SIDE_WIDTH + CORE_WIDTH, SIDE_WIDTH*y))
+            
+            
+    def render_board_layer(self, board, width, height):
+        """
+        Renders the main background and the locked cells to the offscreen board layer.
+        
+        Args:
+            board (list): A 2D list representing the Tetris board.
+            width (int): The width of the board.
+            height (int): The height of the board.
+        """
+        top_left_x, top_left_y = BOARD_TOP_LEFT
+        self.board_layer.blit(ASSETS.image('BOARD_BACKGROUND'), (0, 0))
+        self.board_layer.blits([(self.atlas, 
+                                 (top_left_x - SIDE_WIDTH + x*BLOCK_SIZE, top_left_y + (y-6)*BLOCK_SIZE), 
+                                 self.sprites[f'BLOCK_{board[y][x]}'])
+                                for x, y in product(range(width), range(height)) if board[y][x]], False)
         
     
-    def draw_board(self, current_block, ghost_block, board, width, height):
+    def draw_board(self, current_block, ghost_block, board, width, height, board_version=None):
         """
         Draws the Tetris game board on the screen.
         
+        The locked cells come from the board layer, which is only re-rendered when the board version changes.
+        Otherwise only the cells under the previous and current piece and ghost are restored and redrawn.
+        
         Args:
             current_block (TetrisBlock): The current block being played.
             ghost_block (TetrisBlock): The ghost block that shows where the current block will land.
             board (list): A 2D list representing the Tetris board.
             width (int): The width of the board.
             height (int): The height of the board.
+            board_version (int): The version of the board, or None to always re-render it.
+            
+        Returns:
+            list: The rectangles of the window that changed.
         """
         shape_name, coords = current_block
         top_left_x, top_left_y = BOARD_TOP_LEFT
+        piece_rects = [block.move(top_left_x, top_left_y) for block in coords]
+        ghost_rects = [pygame.Rect(top_left_x + x*BLOCK_SIZE, top_left_y + (y-6)*BLOCK_SIZE, BLOCK_SIZE, BLOCK_SIZE)
+                       for x, y in ghost_block.coords]
+        piece_key = (shape_name, [tuple(rect) for rect in piece_rects], [tuple(rect) for rect in ghost_rects])
+        
+        if (self.needs_redraw or board_version is None or board_version != self.board_layer_version):
+            self.render_board_layer(board, width, height)
+            self.board_layer_version = board_version
+            dirty_rects = [CORE_RECT]
+        elif (piece_key == self.piece_key):
+            return []
+        else:
+            # Bounding boxes of where the piece and ghost were and are now
+            bounds = [rects[0].unionall(rects[1:]).clip(CORE_RECT) for rects in (piece_rects, ghost_rects)]
+            dirty_rects = self.piece_rects + bounds
+        
+        for rect in dirty_rects:
+            self.window.blit(self.board_layer, rect, rect.move(-SIDE_WIDTH, 0))
         
         # Blocks
-        for block in coords:
-            self.window.blit(BLOCK_GRAPHICS[shape_name], (block.x + top_left_x, block.y + top_left_y))
-        for x, y in product(range(width), range(height)):
-            if board[y][x]:
-                self.window.blit(BLOCK_GRAPHICS[board[y][x]], 
-                                 (top_left_x + x*BLOCK_SIZE, top_left_y + (y-6)*BLOCK_SIZE))
-        for x, y in ghost_block.coords:
-            self.window.blit(GHOST, (top_left_x + x*BLOCK_SIZE, top_left_y + (y-6)*BLOCK_SIZE))
+        block_sprite, ghost_sprite = self.sprites[f'BLOCK_{shape_name}'], self.sprites['GHOST']
+        self.window.blits([(self.atlas, rect, block_sprite) for rect in piece_rects] + 
+                          [(self.atlas, rect, ghost_sprite) for rect in ghost_rects], False)
             
         # Border to go over shapes
-        self.window.blit(BORDER, (SIDE_WIDTH, 0))
+        for rect in dirty_rects:
+            self.window.blit(ASSETS.image('BORDER'), rect, rect.move(-SIDE_WIDTH, 0))
+            
+        self.piece_key = piece_key
+        self.piece_rects = [rects[0].unionall(rects[1:]).clip(CORE_RECT) for rects in (piece_rects, ghost_rects)]
+        return dirty_rects
         
         
     def draw_side_modules(self, held_block, just_held, queue, level, score, prev_clear):
@@ -206,13 +311,13 @@ class TetrisPyGameWindow:
         """
         
         # Queue blocks
-        for i, piece in enumerate(queue):
-            self.window.blit(PIECE_GRAPHICS[piece.shape_name], (SIDE_WIDTH + CORE_WIDTH + 65, (BLOCK_SIZE+QUEUE_SPACING)*i + 120))
+        self.window.blits([(self.atlas, (SIDE_WIDTH + CORE_WIDTH + 65, (BLOCK_SIZE+QUEUE_SPACING)*i + 120), self.sprites[f'PIECE_{piece.shape_name}'])
+                           for i, piece in enumerate(queue)], False)
         
         # Text
-        level_text = FONT_BIG.render(f'LEVEL {level}', True, WHITE)
-        score_text = FONT_SMALL_ITALIC.render(f'score: {score}', True, WHITE)
-        queue_text = FONT_BIG.render('NEXT:', True, WHITE)
+        level_text = render_text(ASSETS.font('FONT_BIG'), f'LEVEL {level}', WHITE)
+        score_text = render_text(ASSETS.font('FONT_SMALL_ITALIC'), f'score: {score}', WHITE)
+        queue_text = render_text(ASSETS.font('FONT_BIG'), 'NEXT:', WHITE)
         self.window.blit(level_text, (30, 40))
         self.window.blit(score_text, (SIDE_WIDTH + CORE_WIDTH + 40, 20))
         self.window.blit(queue_text, (SIDE_WIDTH + CORE_WIDTH + 40, 70))
@@ -220,39 +325,59 @@ class TetrisPyGameWindow:
         # Hold
         if (held_block != None):
             if just_held:
-                self.window.blit(PIECE_GRAPHICS_GREY[held_block.shape_name], (50, 120))
+                self.window.blit(self.atlas, (50, 120), self.sprites[f'PIECE_GREY_{held_block.shape_name}'])
             else:
-                self.window.blit(PIECE_GRAPHICS[held_block.shape_name], (50, 120))
-        hold_text = FONT_SMALL_ITALIC.render('on hold', True, WHITE)
+                self.window.blit(self.atlas, (50, 120), self.sprites[f'PIECE_{held_block.shape_name}'])
+        hold_text = render_text(ASSETS.font('FONT_SMALL_ITALIC'), 'on hold', WHITE)
         if (held_block != None and self.is_visible):
             self.window.blit(hold_text, (60, 100))
             pygame.draw.circle(self.window, RED, (40, 125), 8*SCALE)
             
         # B2B text
-        b2b_text = FONT_BIG_ITALIC.render(F'B2B ×{prev_clear - 4}', True, GOLD)
         if (prev_clear > 4):
+            b2b_text = render_text(ASSETS.font('FONT_BIG_ITALIC'), F'B2B ×{prev_clear - 4}', GOLD)
             self.window.blit(b2b_text, (40, 260))
         
         
     def draw_game_screen(self, game):
         """
-        Draws the entire game.
+        Draws the entire game, redrawing only the parts that changed since the last call.
+        Nothing is drawn if the game's version and the blink are the same as last time.
         
         Args:
             game (TetrisGame): The Tetris game object.
-        """
-        self.draw_backgrounds()
-        self.draw_board(self.get_render_block(game.current_block), 
-                        game.get_ghost_block(), 
-                        game.board.board, 
-                        game.width, 
-                        game.height)
-        self.draw_side_modules(game.held_block,
-                               game.just_held,
-                               game.queue, 
-                               game.get_current_level(),
-                               game.score,
-                               game.prev_clear)
+            
+        Returns:
+            list: The rectangles of the window that changed, or None if the whole window was redrawn.
+        """
+        drawn_key = (game.version, self.is_visible)
+        if (not self.needs_redraw and drawn_key == self.drawn_key):
+            return []
+        self.drawn_key = drawn_key
+        is_full_redraw = self.needs_redraw
+        dirty_rects = self.draw_board(self.get_render_block(game.current_block), 
+                                      game.get_ghost_block(), 
+                                      game.board.board, 
+                                      game.width, 
+                                      game.height,
+                                      game.board.version)
+        
+        held_shape = game.held_block.shape_name if game.held_block != None else None
+        side_modules_key = (held_shape, game.just_held, [block.shape_name for block in game.queue], 
+                            game.get_current_level(), game.score, game.prev_clear, self.is_visible)
+        if (is_full_redraw or side_modules_key != self.side_modules_key):
+            self.draw_backgrounds()
+            self.draw_side_modules(game.held_block,
+                                   game.just_held,
+                                   game.queue, 
+                                   game.get_current_level(),
+                                   game.score,
+                                   game.prev_clear)
+            self.side_modules_key = side_modules_key
+            dirty_rects += SIDE_RECTS
+            
+        self.needs_redraw = False
+        return None if is_full_redraw else dirty_rects
     
 
 class TetrisPyGame:
@@ -260,7 +385,17 @@ class TetrisPyGame:
     # TODO:  main menu, pause menu, refactor global, error handling, t spins. Screen shake? Check window class?
     # Options: Starting speed, progression speed, different soft drop lock speed, sprint mode. Credits, Keybinds extc.
     
-    def __init__(self):
+    def __init__(self, seed=None, record_path=None, bot=None, profile_path=None, fps=FPS, vsync=False):
+        self.seed = seed
+        self.record_path = record_path
+        self.bot = bot
+        self.fps = fps
+        self.vsync = vsync
+        self.profile_path = profile_path
+        self.profiler = None if profile_path is None else start_profiling(profile_path)
+        mixer.init()
+        self.audio = AudioEngine(ASSETS, SOUND_RULES)
+        self.audio.prefetch(MUSIC_TRACKS[0])
         self.reset()
         
 
@@ -268,16 +403,27 @@ class TetrisPyGame:
         """
         Initializes global variables for the game.
         """
-        self.game = Tetris()
-        self.window = TetrisPyGameWindow()
+        seed = get_random_seed() if self.seed is None else self.seed
+        self.game = Tetris(seed=seed)
+        self.game.add_listener(self.handle_game_event)
+        self.recorder = Recorder(self.game, seed, pygame.time.get_ticks()/1000)
+        self.window = TetrisPyGameWindow(self.vsync)
         self.clock = pygame.time.Clock()
+        self.scheduler = FixedTimestep(TICK_RATE, MAX_TICKS_PER_FRAME)
         self.run = True
         self.game_started = False
         self.game_ended = False
         self.show_score = False
-        self.prev_level = 1
+        self.is_game_over = False
+        self.lines_to_clear = False
         self.timer = 0
+        self.gravity_time = 0
+        self.lock_time = 0
+        self.soft_drop_time = None
         self.music_level = 0
+        self.bot_actions = []
+        self.bot_block = None
+        self.bot_coords = None
         
         
     def init_settings(self):
@@ -285,7 +431,6 @@ class TetrisPyGame:
         Initializes settings for the game.
         """
         self.reset_move_down_interval()
-        self.clock.tick(FPS)
         pygame.display.set_caption("TETRIS, BABY")
         pygame.key.set_repeat(135, 35)
         
@@ -294,6 +439,32 @@ class TetrisPyGame:
         self.init_globals()
         self.init_settings()
         
+        
+    def apply_action(self, action):
+        """
+        Applies an action to the game, recording it.
+        
+        Args:
+            action (str): One of the ACTIONS in tetris_logic.
+        """
+        self.recorder.apply_action(action, pygame.time.get_ticks()/1000)
+        
+        
+    def save_recording(self):
+        """
+        Writes the recording of the game to the record path, if there is one.
+        """
+        if (self.record_path is not None):
+            self.recorder.save(self.record_path)
+            
+            
+    def save_profile(self):
+        """
+        Writes the profiling report to the profile path, if profiling.
+        """
+        if (self.profiler is not None):
+            self.profiler.write_report(self.profile_path)
+        
     
 
     def draw_window(self):
@@ -302,62 +473,63 @@ class TetrisPyGame:
         """
         if (not self.game_started):
             self.window.draw_start_screen()
-        else:                            
+            pygame.display.update()
+        elif (self.is_game_over):
             self.window.draw_game_screen(self.game)
-            if (self.game.check_game_over()):
-                self.window.draw_game_over_screen(self.show_score, self.game)
-            
-        pygame.display.update()
+            self.window.draw_game_over_screen(self.show_score, self.game)
+            pygame.display.update()
+        else:                            
+            dirty_rects = self.window.draw_game_screen(self.game)
+            if (dirty_rects is None):
+                pygame.display.update()
+            elif (dirty_rects):
+                pygame.display.update(dirty_rects)
         
         
-    def play_music(self, song):
+    def play_music(self, fade_ms=CROSSFADE_MS):
         """
-        Plays music in the game.
+        Plays the track for the music level, and starts decoding the track for the next one.
         
         Args:
-            song (str): The path to the music file.
+            fade_ms (int): The length of the crossfade from the track playing, in milliseconds.
         """
-        mixer.music.load(song)
-        mixer.music.play(3)
+        self.audio.play_music(MUSIC_TRACKS[self.music_level], fade_ms)
+        self.audio.prefetch(*MUSIC_TRACKS[self.music_level + 1:self.music_level + 2])
         
     
     def reset_move_down_interval(self):
         """
-        Resets the move down interval. Interval changes based on level, according to the function in the Tetris class.
+        Restarts the wait for the next gravity step. The interval changes based on level, according to the function in the Tetris class.
         """
-        t = int(self.game.get_move_time_interval()*1000)
-        pygame.time.set_timer(MOVE_DOWN_EVENT, t)
+        self.gravity_time = 0
         
         
-    def check_level_change(self):
-        """
-        Checks if the level has changed.
-        
-        Returns:
-            bool: True if the level has changed, False otherwise.
-        """
-        return self.prev_level != self.game.get_current_level()
-    
-    
-    def check_music_event(self, change_level):
+    def handle_game_event(self, event):
         """
-        Checks if a music event has occurred.
+        Listens to the game's events, playing their sounds and noting what needs handling after the action.
+        Actions aren't applied here, since the game is still changing.
         
         Args:
-            change_level (int): The level at which the music changes.
-            
-        Returns:
-            bool: True if a music event has occurred, False otherwise.
+            event (GameEvent): The event.
         """
-        current_level = self.game.get_current_level()
-        return self.check_level_change() and (current_level == change_level or (current_level == change_level+1 and self.prev_level == change_level-1))
+        if (event.type == 'PIECE_LOCKED'):
+            self.lines_to_clear = event.full_lines > 0
+        elif (event.type == 'LINES_CLEARED'):
+            if (event.b2b_broken):
+                self.audio.play('B2B_BREAK_SOUND')
+            else:
+                self.audio.play(f'CLEAR_{min(self.game.prev_clear, 7)}')
+        elif (event.type == 'LEVEL_CHANGED'):
+            self.handle_level_up_event(event)
+        elif (event.type == 'GAME_OVER'):
+            self.is_game_over = True
     
 
     def start_game(self):
         self.game_started = True
-        self.play_music(TETRIS_A)
-        mixer.music.set_volume(0.1)
+        self.play_music(fade_ms=0)
         self.reset_move_down_interval()
+        self.scheduler.reset(perf_counter())
         self.window.fade_in_stage = 510
         
         
@@ -386,11 +558,13 @@ class TetrisPyGame:
         if (not self.game_ended):
             self.timer = pygame.time.get_ticks()
             self.game_ended = True
-            mixer.music.stop()
-            SOUNDS["GAME_OVER_SOUND"].play()
+            self.save_recording()
+            self.save_profile()
+            self.audio.stop_music()
+            self.audio.play('GAME_OVER_SOUND')
         if ((pygame.time.get_ticks() - self.timer > 4000) and (not self.show_score)):
             self.show_score = True
-            SOUNDS["SELECT_SOUND"].play()
+            self.audio.play('SELECT_SOUND')
         for event in events:
             if (event.type == pygame.KEYDOWN):
                 if (event.key == pygame.K_ESCAPE):
@@ -400,28 +574,71 @@ class TetrisPyGame:
                     self.start_game()
                     
                     
+    def tick(self):
+        """
+        Runs one tick of game logic: the bot, soft drops while the down key is held, gravity and locking.
+        Everything timed is counted in ticks, so it runs at the same speed whatever the frame rate.
+        """
+        if (self.bot is not None):
+            self.handle_bot()
+        
+        if (pygame.key.get_pressed()[pygame.K_DOWN]):
+            # The first soft drop happens as soon as the key is down
+            self.soft_drop_time = SOFT_DROP_INTERVAL if self.soft_drop_time is None else self.soft_drop_time + TICK_TIME
+            while (self.soft_drop_time >= SOFT_DROP_INTERVAL):
+                self.soft_drop_time -= SOFT_DROP_INTERVAL
+                self.apply_action('SOFT_DROP')
+                self.reset_move_down_interval()
+                self.audio.play('MOVE_Y_SOUND')
+        else:
+            self.soft_drop_time = None
+        
+        self.gravity_time += TICK_TIME
+        if (self.gravity_time >= self.game.get_move_time_interval()):
+            self.gravity_time = 0
+            self.handle_move_down_event()
+        
+        if (self.game.check_y_collision(self.game.current_block)):
+            self.lock_time += TICK_TIME
+            if (self.lock_time >= self.game.get_lock_time_interval()):
+                # Place and lock block
+                self.apply_action('LOCK')
+                self.audio.play('SOFT_DROP_SOUND')
+                self.lock_time = 0
+        else:
+            self.lock_time = 0
+        
+        self.handle_line_clear_event()
+    
+    
+    def run_ticks(self, now):
+        """
+        Runs the ticks of game logic that are due, stopping early if the game ends.
+        
+        Args:
+            now (float): The current time, in seconds.
+        """
+        for _ in range(self.scheduler.advance(now)):
+            if (self.is_game_over):
+                break
+            self.tick()
+        
+    
     def handle_move_down_event(self):  
         """
-        Handles the move down event. Moves the current block down and checks for collisions.
+        Handles a gravity step. Moves the current block down unless it has landed.
         """      
-        if (self.game.check_y_collision(self.game.current_block) and (pygame.time.get_ticks() - self.timer) >= self.game.get_lock_time_interval()):
-            # Place and lock block
-            self.game.place_block()
-            SOUNDS["SOFT_DROP_SOUND"].play()
-            self.timer = pygame.time.get_ticks()
-        elif (not self.game.check_y_collision(self.game.current_block)):
+        if (not self.game.check_y_collision(self.game.current_block)):
             # Just move block down by one
-            self.game.move_down(self.game.current_block)
-            self.timer = pygame.time.get_ticks()
+            self.apply_action('SOFT_DROP')
         
     
-    def handle_game_state_events(self, events, keys_pressed):
+    def handle_game_state_events(self, events):
         """
         Handles game state events - key presses and line clears.
         
         Args:
             events (list): A list of Pygame events.
-            keys_pressed (list): A list of pressed keys.
         """
         for event in events:
             if (event.type == pygame.KEYDOWN):
@@ -430,116 +647,107 @@ class TetrisPyGame:
                     pygame.event.post(pygame.event.Event(pygame.QUIT))
                     
                 if (event.key == pygame.K_LEFT):
-                    self.game.move_x(self.game.current_block, True)
-                    SOUNDS["MOVE_X_SOUND"].play()
+                    self.apply_action('LEFT')
+                    self.audio.play('MOVE_X_SOUND')
 
                 if (event.key == pygame.K_RIGHT):
-                    self.game.move_x(self.game.current_block, False)
-                    SOUNDS["MOVE_X_SOUND"].play()
+                    self.apply_action('RIGHT')
+                    self.audio.play('MOVE_X_SOUND')
 
                 if (event.key == pygame.K_UP):
-                    self.game.hard_drop()
+                    self.apply_action('HARD_DROP')
                     self.reset_move_down_interval()
-                    SOUNDS["HARD_DROP_SOUND"].play()
+                    self.audio.play('HARD_DROP_SOUND')
 
                 if (event.key == pygame.K_z):
-                    self.game.current_block.rotate(self.game.width, self.game.height, self.game.board.board, False)
-                    SOUNDS["ROTATE_SOUND"].play()
+                    self.apply_action('ROTATE_CCW')
+                    self.audio.play('ROTATE_SOUND')
 
                 if (event.key == pygame.K_x):
-                    self.game.current_block.rotate(self.game.width, self.game.height, self.game.board.board, True)
-                    SOUNDS["ROTATE_SOUND"].play()
+                    self.apply_action('ROTATE_CW')
+                    self.audio.play('ROTATE_SOUND')
 
                 if (event.key in [pygame.K_LSHIFT, pygame.K_RSHIFT] and not self.game.just_held):
-                    self.game.hold_block()
-                    SOUNDS["HOLD_SOUND"].play()
+                    self.apply_action('HOLD')
+                    self.audio.play('HOLD_SOUND')
                     
-                self.timer = pygame.time.get_ticks()
-        
-        if (keys_pressed[pygame.K_DOWN]):
-            self.game.move_down(self.game.current_block)  
-            self.reset_move_down_interval()
-            SOUNDS["MOVE_Y_SOUND"].play()
-            
-        if (self.game.check_cleared_lines()):
-            self.handle_line_clear_event()
+                # Moving or rotating a block that has landed gives it the whole lock delay again
+                if (event.key in [pygame.K_LEFT, pygame.K_RIGHT, pygame.K_z, pygame.K_x]):
+                    self.lock_time = 0
+
+        self.handle_line_clear_event()
             
                 
     def handle_line_clear_event(self):
         """
-        Handles line clear events, clearing full lines and updating the score.
+        Clears the full lines left by the last locked block, if there are any. The sound is played by the
+        LINES_CLEARED event.
         """
-        cleared_lines = self.game.get_cleared_lines()
-        if (self.game.prev_clear > 4 and len(cleared_lines) < 4):
-            SOUNDS["B2B_BREAK_SOUND"].play()
-            self.game.clear_lines(cleared_lines)
-        else:
-            self.game.clear_lines(cleared_lines)
-            CLEAR_SOUNDS[min(self.game.prev_clear, 8)].play()
+        if (self.lines_to_clear):
+            self.lines_to_clear = False
+            self.apply_action('CLEAR')
             
             
-    def handle_level_up_event(self):
+    def handle_level_up_event(self, event):
         """
-        Handles the level up event, increasing the level and updating the game speed.
+        Handles the level up event, updating the game speed, and changing the music if a music level was reached.
+        
+        Args:
+            event (GameEvent): The LEVEL_CHANGED event.
         """
-        SOUNDS["LEVEL_UP_SOUND"].play()
+        self.audio.play('LEVEL_UP_SOUND')
         self.reset_move_down_interval()
-        self.prev_level = self.game.get_current_level()
+        for change_level in (MUSIC_CHANGE_LEVEL_1, MUSIC_CHANGE_LEVEL_2):
+            if (event.previous_level < change_level <= event.level):
+                self.handle_music_event()
             
     
     def handle_music_event(self):
         """
-        Handles the music event, changing the music based on the current level.
+        Handles the music event, crossfading into the next track.
         """
         self.music_level += 1
-        mixer.music.fadeout(5000)
+        self.play_music()
         
                 
-    def check_game_events(self):
-        """
-        Checks for new game events.
-        """
-        if self.check_level_change():
-            pygame.event.post(pygame.event.Event(LEVEL_UP_EVENT))
-        if (self.check_music_event(MUSIC_CHANGE_LEVEL_1) or self.check_music_event(MUSIC_CHANGE_LEVEL_2)):
-            pygame.event.post(pygame.event.Event(MUSIC_EVENT))
-    
-            
-    def handle_game_events(self, events, keys_pressed):
+    def handle_game_events(self, events):
         """
-        Handles main game events: key presses, level ups, music changes.
+        Handles main game events: key presses.
         
         Args:
             events (list): A list of Pygame events.
-            keys_pressed (list): A list of pressed keys.
         """
-        event_types = [event.type for event in events]
-        if (MOVE_DOWN_EVENT in event_types):
-            self.handle_move_down_event()
-        if (pygame.KEYDOWN in event_types or keys_pressed != []):
-            self.handle_game_state_events(events, keys_pressed)
-        if (LEVEL_UP_EVENT in event_types):
-            self.handle_level_up_event()
-        if (MUSIC_EVENT in event_types):
-            self.handle_music_event()
-            
-        if (self.music_level == 1 and not mixer.music.get_busy()):
-            self.play_music(TETRIS_B)
-        if (self.music_level == 2 and not mixer.music.get_busy()):
-            self.play_music(GOD_SHATTERING_STAR)
+        self.handle_game_state_events(events)
         
     
      
     def game_loop(self, events):
         """
-        Runs the main game loop.
+        Runs the main game loop: input as it arrives, then the ticks of game logic that are due.
         
         Args:
             events (list): A list of Pygame events.
         """
         
-        self.handle_game_events(events, pygame.key.get_pressed())
-        self.check_game_events()
+        self.handle_game_events(events)
+        self.run_ticks(perf_counter())
+        
+        
+    def handle_bot(self):
+        """
+        Plays the bot's next action, one per tick. The bot chooses its actions whenever a new block appears,
+        or if gravity moved or locked the block it was moving before it finished.
+        """
+        block = self.game.current_block
+        if (not self.bot_actions or block is not self.bot_block or block.coords != self.bot_coords):
+            self.bot_actions = self.bot.choose_actions(self.game)
+        action = self.bot_actions.pop(0)
+        self.apply_action(action)
+        if (action == 'HARD_DROP'):
+            self.reset_move_down_interval()
+            self.audio.play('HARD_DROP_SOUND')
+        self.bot_block = self.game.current_block
+        self.bot_coords = self.game.current_block.coords
     
     
     def handle_global_events(self, events):
@@ -568,6 +776,7 @@ class TetrisPyGame:
         
         while self.run:
             
+            frame_start = perf_counter()
             self.draw_window()
             events = pygame.event.get()
             
@@ -575,17 +784,37 @@ class TetrisPyGame:
             
             if (not self.game_started):
                 self.start_screen_loop(events)
-            elif (self.game.check_game_over()):
+            elif (self.is_game_over):
                 self.game_over_loop(events)
             else:
                 self.game_loop(events)
+            self.audio.update()
+            
+            if (self.profiler is not None):
+                self.profiler.add_frame('pygame', perf_counter() - frame_start)
+            
+            # Sleeps off the rest of the frame, so drawing doesn't take more CPU than the frame cap allows
+            self.clock.tick(self.fps)
                 
                     
+        if (self.game_started and not self.game_ended):
+            self.save_recording()
+        self.save_profile()
+        self.audio.close()
         pygame.quit()
 
 
 def main():
-    gui = TetrisPyGame()
+    parser = argparse.ArgumentParser(description='Play Tetris.')
+    parser.add_argument('--seed', type=int, help='seed for the shape bags, random if not given')
+    parser.add_argument('--record', metavar='PATH', help='write a replay of each game to PATH, for tetris_replay.py')
+    parser.add_argument('--bot', action='store_true', help='let the bot play')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='profile the game logic and frames, writing a report to PATH at game over and on SIGUSR1')
+    parser.add_argument('--fps', type=int, default=FPS, help=f'cap on frames drawn per second, 0 for none (default {FPS})')
+    parser.add_argument('--vsync', action='store_true', help='wait for the display\'s vertical sync when drawing')
+    args = parser.parse_args()
+    gui = TetrisPyGame(args.seed, args.record, TetrisBot() if args.bot else None, args.profile, args.fps, args.vsync)
     gui.main_loop()
     
     
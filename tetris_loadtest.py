@@ -0,0 +1,307 @@
+"""
+Load tests the versus server with many simulated players, measuring how long inputs take to be acknowledged.
+
+    python tetris_loadtest.py --players 500 [--duration 30] [--player bot|random] [--rate 4] [--serve]
+
+Every player keeps a copy of its game, applying what the server sends, and checks that the versions match. Bot
+players choose their inputs with TetrisBot, which costs a few ms of CPU per block, while random players press random
+keys and top out often, which exercises matchmaking and is cheap enough to run thousands. With --serve the server
+is started in its own process, printing its load as it goes.
+"""
+import argparse
+import asyncio
+import subprocess
+import sys
+from functools import partial
+from pathlib import Path
+from random import Random
+from time import perf_counter
+
+from tetris_logic import Tetris, ACTIONS
+from tetris_bot import TetrisBot
+from tetris_profile import get_percentile
+from tetris_server import (HOST, PORT, MESSAGES, ACTION_IDS, PLAYER_ACTIONS,
+                           INPUT, START, ACK, REJECT, APPLIED, GARBAGE, END)
+
+
+# Random players press each key this often, relative to the others
+RANDOM_WEIGHTS = {'LEFT': 4, 'RIGHT': 4, 'ROTATE_CW': 2, 'ROTATE_CCW': 2, 'SOFT_DROP': 2, 'HARD_DROP': 2, 'HOLD': 1}
+LATENCY_PERCENTILES = (50, 95, 99)
+CONNECT_ATTEMPTS = 50
+
+
+class LoadStats:
+    """
+    The counts and latencies of every player.
+
+    Attributes:
+        latencies (list): The time from sending each input to receiving its reply, in seconds.
+        inputs (int): The number of inputs acknowledged.
+        rejected (int): The number of inputs rejected.
+        desyncs (int): The number of messages whose version didn't match the player's copy of the game.
+        games (int): The number of games finished.
+        wins (int): The number of games won.
+    """
+
+    def __init__(self):
+        self.latencies = []
+        self.inputs = 0
+        self.rejected = 0
+        self.desyncs = 0
+        self.games = 0
+        self.wins = 0
+
+
+class Player(asyncio.Protocol):
+    """
+    A simulated player, sending one input at a time and waiting for its reply before choosing the next.
+
+    Attributes:
+        stats (LoadStats): The shared statistics.
+        bot (TetrisBot): The bot that chooses inputs, or None to press random keys.
+        interval (float): The mean time between an input's reply and the next input, in seconds.
+        rng (Random): The random number generator for keys and timing.
+        transport (Transport): The connection.
+        buffer (bytes): Received bytes that don't make up a whole message yet.
+        game (Tetris): The player's copy of the game, or None between games.
+        sequence (int): The sequence number of the last input sent.
+        sent_time (float): When the input waiting for a reply was sent, or None if there isn't one.
+        actions (list): The bot's remaining actions for the current block.
+        planned_block (Block): The block the actions were chosen for.
+        planned_coords (Coord): Where that block was after the bot's last action.
+    """
+
+    def __init__(self, stats, bot, interval, seed):
+        self.stats = stats
+        self.bot = bot
+        self.interval = interval
+        self.rng = Random(seed)
+        self.transport = None
+        self.buffer = b''
+        self.game = None
+        self.sequence = 0
+        self.sent_time = None
+        self.actions = []
+        self.planned_block = None
+        self.planned_coords = None
+
+
+    def connection_made(self, transport):
+        """
+        Keeps the connection. The server starts a game once there is an opponent.
+
+        Args:
+            transport (Transport): The connection.
+        """
+        self.transport = transport
+
+
+    def data_received(self, data):
+        """
+        Handles every whole message that has arrived.
+
+        Args:
+            data (bytes): The bytes received.
+        """
+        buffer = self.buffer + data if self.buffer else data
+        offset = 0
+        while offset < len(buffer):
+            message = MESSAGES[buffer[offset]]
+            if offset + message.size > len(buffer):
+                break
+            self.handle_message(message.unpack_from(buffer, offset))
+            offset += message.size
+        self.buffer = buffer[offset:]
+
+
+    def handle_message(self, fields):
+        """
+        Applies a message to the player's copy of the game.
+
+        Args:
+            fields (tuple): The message type and its fields.
+        """
+        message_type = fields[0]
+        if (message_type == START):
+            self.game = Tetris(seed=fields[1])
+            self.actions = []
+            self.schedule_input()
+        elif (message_type == ACK):
+            _, action_id, sequence, version = fields
+            self.stats.latencies.append(perf_counter() - self.sent_time)
+            self.stats.inputs += 1
+            self.sent_time = None
+            self.apply(ACTIONS[action_id], version)
+            self.planned_block = self.game.current_block
+            self.planned_coords = self.game.current_block.coords
+            self.schedule_input()
+        elif (message_type == REJECT):
+            self.stats.latencies.append(perf_counter() - self.sent_time)
+            self.stats.rejected += 1
+            self.sent_time = None
+            self.schedule_input()
+        elif (message_type == APPLIED):
+            self.apply(ACTIONS[fields[1]], fields[2])
+        elif (message_type == GARBAGE):
+            _, count, hole, version = fields
+            self.game.add_garbage(count, hole)
+            self.check_version(version)
+        elif (message_type == END):
+            self.stats.games += 1
+            self.stats.wins += fields[1]
+            self.game = None
+
+
+    def apply(self, action, version):
+        """
+        Applies an action to the player's copy of the game.
+
+        Args:
+            action (str): One of ACTIONS.
+            version (int): The server's version of the game afterwards.
+        """
+        self.game.apply_action(action)
+        self.check_version(version)
+
+
+    def check_version(self, version):
+        """
+        Counts a desync if the player's copy of the game doesn't have the server's version.
+
+        Args:
+            version (int): The server's version of the game.
+        """
+        if (self.game.version != version):
+            self.stats.desyncs += 1
+            self.game.version = version
+
+
+    def schedule_input(self):
+        """
+        Sends the next input after a random wait averaging the interval.
+        """
+        asyncio.get_running_loop().call_later(self.rng.expovariate(1/self.interval), self.send_input)
+
+
+    def choose_action(self):
+        """
+        Chooses the next input. Bots choose their actions again whenever a new block appears, or gravity moved
+        the block they were moving.
+
+        Returns:
+            str: One of PLAYER_ACTIONS.
+        """
+        if self.bot is None:
+            return self.rng.choices(PLAYER_ACTIONS, [RANDOM_WEIGHTS[action] for action in PLAYER_ACTIONS])[0]
+        block = self.game.current_block
+        if (not self.actions or block is not self.planned_block or block.coords != self.planned_coords):
+            self.actions = self.bot.choose_actions(self.game)
+        return self.actions.pop(0)
+
+
+    def send_input(self):
+        """
+        Sends an input, unless one is already waiting for a reply or there is no game.
+        """
+        if (self.game is None or self.sent_time is not None or self.transport.is_closing()):
+            return
+        action = self.choose_action()
+        self.sequence = (self.sequence + 1) & 0xFFFF
+        self.sent_time = perf_counter()
+        self.transport.write(MESSAGES[INPUT].pack(INPUT, ACTION_IDS[action], self.sequence))
+
+
+async def connect(host, port, protocol_factory):
+    """
+    Connects to the server, retrying while it starts up.
+
+    Args:
+        host (str): The server's address.
+        port (int): The server's port.
+        protocol_factory (function): Makes the protocol for the connection.
+
+    Returns:
+        Protocol: The connected protocol.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(CONNECT_ATTEMPTS):
+        try:
+            _, protocol = await loop.create_connection(protocol_factory, host, port)
+            return protocol
+        except OSError:
+            if attempt == CONNECT_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def summarise(stats, players, elapsed):
+    """
+    Prints the throughput and latency of the load test.
+
+    Args:
+        stats (LoadStats): The statistics.
+        players (int): The number of players.
+        elapsed (float): The length of the test, in seconds.
+    """
+    print(f'{players} players for {elapsed:.1f} s: {stats.inputs} inputs acknowledged ({stats.inputs/elapsed:,.0f}/s), '
+          f'{stats.rejected} rejected, {stats.games} games finished, {stats.desyncs} desyncs')
+    if stats.latencies:
+        latencies = sorted(stats.latencies)
+        print('latency ' + '  '.join(f'p{percentile} {get_percentile(latencies, percentile)*1000:.2f} ms'
+                                     for percentile in LATENCY_PERCENTILES) +
+              f'  max {latencies[-1]*1000:.2f} ms')
+
+
+async def run(host, port, players, duration, use_bot, rate, seed):
+    """
+    Connects the players, lets them play for a while, then disconnects them and prints the results.
+
+    Args:
+        host (str): The server's address.
+        port (int): The server's port.
+        players (int): The number of players.
+        duration (float): How long to play for, in seconds.
+        use_bot (bool): Whether the players are bots, rather than pressing random keys.
+        rate (float): Inputs each player sends per second, at most.
+        seed (int): The seed of the first player's random number generator, incremented for each player.
+    """
+    stats = LoadStats()
+    bot = TetrisBot() if use_bot else None
+    connected = []
+    for i in range(players):
+        connected.append(await connect(host, port, partial(Player, stats, bot, 1/rate, seed + i)))
+    start = perf_counter()
+    await asyncio.sleep(duration)
+    elapsed = perf_counter() - start
+    for player in connected:
+        player.transport.close()
+    summarise(stats, players, elapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=HOST, help=f'server address (default {HOST})')
+    parser.add_argument('--port', type=int, default=PORT, help=f'server port (default {PORT})')
+    parser.add_argument('--players', type=int, default=100, help='number of simulated players')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to play for')
+    parser.add_argument('--player', choices=('bot', 'random'), default='bot', help='how the players choose inputs')
+    parser.add_argument('--rate', type=float, default=4, help='inputs per second per player')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first player, incremented for each player')
+    parser.add_argument('--serve', action='store_true', help='start a server in another process for the test')
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.serve:
+        server = subprocess.Popen([sys.executable, Path(__file__).with_name('tetris_server.py'), '--host', args.host, '--port', str(args.port),
+                                   '--seed', str(args.seed), '--report', '5'])
+    try:
+        asyncio.run(run(args.host, args.port, args.players, args.duration, args.player == 'bot', args.rate, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
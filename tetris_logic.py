@@ -1,5 +1,7 @@
-from random import shuffle
-from copy import deepcopy
+import warnings
+from random import Random
+from bisect import insort, bisect_right
+from collections import deque
 from math import log10
 
 
@@ -29,11 +31,60 @@ BASE_TIME_INTERVAL = 0.8
 MOVE_INTERVAL_DECREASE_RATE = 0.01
 QUEUE_LENGTH = 5
 
-X_LEFT = [(-1, 0)]*4
-X_RIGHT = [(1, 0)]*4
-Y_UP = [(0, -1)]*4
-Y_DOWN = [(0, 1)]*4
+# HistoryRandomizer starts with this history, as in TGM2, so that the first pieces are rarely S or Z
+HISTORY_START = ('Z', 'S', 'S', 'Z')
+HISTORY_ROLLS = 6
+
+# The cell value of garbage lines sent by an opponent, in place of a shape name
+GARBAGE = 'G'
+
+# Inputs that can be applied to a game with Tetris.apply_action. CLEAR clears any full lines.
+ACTIONS = ('NOOP', 'LEFT', 'RIGHT', 'ROTATE_CW', 'ROTATE_CCW', 'SOFT_DROP', 'HARD_DROP', 'HOLD', 'LOCK', 'CLEAR')
+
+# Events published to a game's listeners, with the details each one carries:
+#   PIECE_MOVED    action, the action that moved the current block
+#   PIECE_LOCKED   coords, where the block locked, and full_lines, the number of full lines it left
+#   LINES_CLEARED  count, b2b, the back to back chain after the clear, b2b_broken, whether it ended a chain, and score
+#   LEVEL_CHANGED  level and previous_level
+#   HOLD_USED      shape_name, the shape that was put on hold
+#   GARBAGE_ADDED  count, the number of garbage lines, and hole, their empty column
+#   GAME_OVER      score
+EVENTS = ('PIECE_MOVED', 'PIECE_LOCKED', 'LINES_CLEARED', 'LEVEL_CHANGED', 'HOLD_USED', 'GARBAGE_ADDED', 'GAME_OVER')
+
 STARTING_PAD = [(5, 5)] * 4
+SPAWN_X, SPAWN_Y = STARTING_PAD[0]
+
+
+# Pieces rotate about the centre of their bounding box, as in SRS. All other shapes rotate about (0, 0).
+ROTATION_CENTRES = {
+    'I': (-0.5, 0.5),
+    'O': (-0.5, -0.5)
+}
+
+
+# SRS wall kicks for (from, to) orientations, where 0 is spawn, 1 is clockwise, 2 is 180 and 3 is counterclockwise.
+# Offsets are (x, y) with y pointing down the board, so they are the SRS tables with y negated.
+JLSTZ_KICKS = {
+    (0, 1): [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)],
+    (1, 0): [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],
+    (1, 2): [(0, 0), (1, 0), (1, 1), (0, -2), (1, -2)],
+    (2, 1): [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)],
+    (2, 3): [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],
+    (3, 2): [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],
+    (3, 0): [(0, 0), (-1, 0), (-1, 1), (0, -2), (-1, -2)],
+    (0, 3): [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)]
+}
+
+I_KICKS = {
+    (0, 1): [(0, 0), (-2, 0), (1, 0), (-2, 1), (1, -2)],
+    (1, 0): [(0, 0), (2, 0), (-1, 0), (2, -1), (-1, 2)],
+    (1, 2): [(0, 0), (-1, 0), (2, 0), (-1, -2), (2, 1)],
+    (2, 1): [(0, 0), (1, 0), (-2, 0), (1, 2), (-2, -1)],
+    (2, 3): [(0, 0), (2, 0), (-1, 0), (2, -1), (-1, 2)],
+    (3, 2): [(0, 0), (-2, 0), (1, 0), (-2, 1), (1, -2)],
+    (3, 0): [(0, 0), (1, 0), (-2, 0), (1, 2), (-2, -1)],
+    (0, 3): [(0, 0), (-1, 0), (2, 0), (-1, -2), (2, 1)]
+}
 
 
 class CollisionError(Exception):
@@ -77,45 +128,200 @@ class Coord(tuple):
 
 
 
+def get_rotation_table(shape_name):
+    """
+    Gets the base coordinates of a shape in each of its four orientations.
+    
+    Args:
+        shape_name (str): The name of the shape type.
+        
+    Returns:
+        list: The base coordinates (Coord) for orientations 0 to 3, each a clockwise turn of the last.
+    """
+    cx, cy = ROTATION_CENTRES.get(shape_name, (0, 0))
+    orientations = [Coord(SHAPES[shape_name])]
+    for _ in range(3):
+        orientations.append(Coord([(int(cx - (y - cy)), int(cy + (x - cx))) for x, y in orientations[-1]]))
+    return orientations
+
+
+def get_kick_table(shape_name):
+    """
+    Gets the positions to try, in order, when rotating a shape.
+    As a block's position is its offset from the base coordinates of its orientation, each kick is the change in
+    orientation and the wall kick's offset.
+    
+    Args:
+        shape_name (str): The name of the shape type.
+        
+    Returns:
+        dict: Maps (orientation, is_clockwise) to a tuple of (new orientation, x offset, y offset).
+    """
+    if shape_name == 'O':
+        return {(orientation, is_clockwise): () for orientation in range(4) for is_clockwise in (True, False)}
+    
+    kicks = I_KICKS if shape_name == 'I' else JLSTZ_KICKS
+    return {(start, end == (start+1) % 4): tuple((end, dx, dy) for dx, dy in offsets)
+            for (start, end), offsets in kicks.items()}
+
+
+ROTATIONS = {shape_name: get_rotation_table(shape_name) for shape_name in SHAPES}
+# The same base coordinates as plain tuples, which unpack without allocating an iterator
+CELLS = {shape_name: [tuple(coords) for coords in orientations] for shape_name, orientations in ROTATIONS.items()}
+KICKS = {shape_name: get_kick_table(shape_name) for shape_name in SHAPES}
+
+
+
+
 class Block:
     """
     Represents a block in Tetris.
     
+    A block's position is a few integers: its orientation, and its offset from the base coordinates of that
+    orientation in ROTATIONS. Moving and rotating only change these, and the cells it covers are only worked out
+    when something reads coords.
+    
     Attributes:
         shape_name (str): The name of the shape type.
-        base_coords (Coord): The base coordinates defining the shape.
-        coords (Coord): The actual location on the board.
+        orientation (int): The rotation state, from 0 (spawn) clockwise to 3.
+        x (int): The column offset from the base coordinates.
+        y (int): The row offset from the base coordinates.
+        cached_coords (Coord): The coordinates at the current position, or None until they are next read.
     """
     
-    def __init__(self, shape_name):
+    def __init__(self, shape_name, x=0, y=0):
         self.shape_name = shape_name
-        self.base_coords = Coord(SHAPES[shape_name])
-        self.coords = self.base_coords
+        self.orientation = 0
+        self.x = x
+        self.y = y
+        self.cached_coords = None
+        
         
+    @property
+    def base_coords(self):
+        """
+        Coord: The base coordinates defining the shape in its current orientation.
+        """
+        return ROTATIONS[self.shape_name][self.orientation]
     
-    def rotate(self, max_x, max_y, board, is_clockwise):
+    
+    @property
+    def cells(self):
+        """
+        tuple: The base coordinates of the current orientation as plain tuples, from CELLS.
+        """
+        return CELLS[self.shape_name][self.orientation]
+    
+    
+    @property
+    def coords(self):
+        """
+        Coord: The actual location on the board.
+        """
+        if self.cached_coords is None:
+            x, y = self.x, self.y
+            self.cached_coords = Coord([(cx + x, cy + y) for cx, cy in ROTATIONS[self.shape_name][self.orientation]])
+        return self.cached_coords
+    
+    
+    def move(self, dx, dy):
+        """
+        Moves the block, without checking for collisions.
+        
+        Args:
+            dx (int): The number of columns to move right.
+            dy (int): The number of rows to move down.
+        """
+        self.x += dx
+        self.y += dy
+        self.cached_coords = None
+        
+        
+    def set_position(self, orientation, x, y):
         """
-        Rotates the block clockwise.
+        Puts the block in an orientation at an offset.
+        
+        Args:
+            orientation (int): The orientation.
+            x (int): The column offset from the base coordinates of the orientation.
+            y (int): The row offset from the base coordinates of the orientation.
         """
-        if self.shape_name != 'O':
-            base_coords = self.base_coords
-            rotated_coords = [(-y, x) for x, y in base_coords] if is_clockwise else [(y, -x) for x, y in base_coords]
-            self.base_coords = rotated_coords
-            self.coords += Coord(rotated_coords) - Coord(base_coords)
+        self.orientation = orientation
+        self.x = x
+        self.y = y
+        self.cached_coords = None
+        
+        
+    def get_kicks(self, is_clockwise):
+        """
+        Gets the candidate positions for a rotation, in the order they should be tried.
+        
+        Args:
+            is_clockwise (bool): Whether to rotate clockwise.
             
-            while any([x < 0 for x, _ in self.coords]):
-                self.coords += Coord(X_RIGHT)
-            while any([x >= max_x for x, _ in self.coords]):
-                self.coords += Coord(X_LEFT)
-            while any([y < 0 for _, y in self.coords]):
-                self.coords += Coord(Y_DOWN)
-            while any([(y >= max_y or board[y][x]) for x, y in self.coords]): # Causes crashes, index error
-                self.coords += Coord(Y_UP)
+        Returns:
+            tuple: (orientation, x offset, y offset) for each kick, the first being the unkicked rotation. The offsets
+                are added to the block's position.
+        """
+        return KICKS[self.shape_name][(self.orientation, is_clockwise)]
+        
+    
+    def rotate(self, max_x, max_y, board, is_clockwise):
+        """
+        Rotates the block, trying each wall kick in turn. The block is left unchanged if every kick collides.
+
+        Deprecated: this doesn't bump the game's version or notify its listeners, so redraws and the cached ghost
+        block go stale. Use Tetris.rotate.
+        
+        Args:
+            max_x (int): The width of the board.
+            max_y (int): The height of the board.
+            board (list): A 2D list representing the board.
+            is_clockwise (bool): Whether to rotate clockwise.
+            
+        Returns:
+            bool: True if the block was rotated, False otherwise.
+        """
+        warnings.warn('Block.rotate is deprecated, use Tetris.rotate', DeprecationWarning, stacklevel=2)
+        cells = ROTATIONS[self.shape_name]
+        for orientation, dx, dy in self.get_kicks(is_clockwise):
+            x, y = self.x + dx, self.y + dy
+            for cx, cy in cells[orientation]:
+                cx += x
+                cy += y
+                if (cx < 0 or cx >= max_x or cy >= max_y or (cy >= 0 and board[cy][cx])):
+                    break
+            else:
+                self.set_position(orientation, x, y)
+                return True
+        return False
     
     
     def __repr__(self):
         return str((self.shape_name, self.coords))
-        
+
+
+
+
+def remove_rows(rows, lines):
+    """
+    Removes rows from a list in one pass, copying the runs between them with slices.
+
+    Args:
+        rows (list): The rows.
+        lines (list): The sorted numbers of the rows to remove.
+
+    Returns:
+        list: The remaining rows, in order.
+    """
+    kept = []
+    start = 0
+    for line in lines:
+        kept += rows[start:line]
+        start = line + 1
+    kept += rows[start:]
+    return kept
+
 
 
 
@@ -127,12 +333,21 @@ class Board:
         width (int): The width of the board.
         height (int): The height of the board.
         board (list): A 2D list representing the board.
+        column_tops (list): The row of the highest filled cell in each column, or the height if the column is empty.
+            None when it has to be rebuilt.
+        row_counts (list): The number of filled cells in each row.
+        full_lines (list): The sorted numbers of the rows that are completely filled, kept up to date by add_block.
+        version (int): A counter that increases every time the board changes.
     """
     
     def __init__(self, width=GAME_WIDTH, height=GAME_HEIGHT):
         self.width = width
         self.height = height
         self.board = [[0 for _ in range(width)] for _ in range(height)]
+        self.column_tops = [height] * width
+        self.row_counts = [0] * height
+        self.full_lines = []
+        self.version = 0
         
         
     def add_block(self, block):
@@ -141,11 +356,34 @@ class Board:
         
         Args:
             block (Block): The block to place.
+            
+        Raises:
+            CollisionError: If the block overlaps a filled cell.
         """
         for x, y in block.coords:
             if self.board[y][x] != 0:
                 raise CollisionError(block, (x, y))
-            self.board[y][x] = block.shape_name
+        self.fill_cells(block.coords, block.shape_name)
+        
+        
+    def fill_cells(self, coords, shape_name):
+        """
+        Fills cells with a shape, without checking whether they are already filled.
+        
+        Args:
+            coords (list): The (x, y) coordinates of the cells.
+            shape_name (str): The shape to fill them with.
+        """
+        column_tops = self.column_tops
+        row_counts = self.row_counts
+        for x, y in coords:
+            self.board[y][x] = shape_name
+            if column_tops is not None and y < column_tops[x]:
+                column_tops[x] = y
+            row_counts[y] += 1
+            if row_counts[y] == self.width:
+                insort(self.full_lines, y)
+        self.version += 1
         
         
     def clear(self):
@@ -153,16 +391,68 @@ class Board:
         Clears the board.
         """
         self.board = [[0 for _ in range(self.width)] for _ in range(self.height)]
-    
-    
+        self.column_tops = [self.height] * self.width
+        self.row_counts = [0] * self.height
+        self.full_lines = []
+        self.version += 1
+        
+        
+    def set_cells(self, board):
+        """
+        Replaces the contents of the board, rebuilding the row counts, full lines and column tops.
+        
+        Args:
+            board (list): A 2D list of shape names, or 0 for empty cells, with the board's dimensions.
+        """
+        self.board = [list(row) for row in board]
+        self.row_counts = [self.width - row.count(0) for row in self.board]
+        self.full_lines = [i for i, count in enumerate(self.row_counts) if count == self.width]
+        self.column_tops = None
+        self.version += 1
+        
+        
+    def add_garbage_lines(self, count, hole):
+        """
+        Pushes the board up and fills the bottom lines with garbage, except for one column. Lines pushed off the top
+        are lost.
+        
+        Args:
+            count (int): The number of garbage lines.
+            hole (int): The column left empty in every garbage line.
+        """
+        if count <= 0:
+            return
+        row = [GARBAGE] * self.width
+        row[hole] = 0
+        pushed_off = any(self.row_counts[:count])
+        self.board = self.board[count:] + [list(row) for _ in range(count)]
+        self.row_counts = self.row_counts[count:] + [self.width - 1] * count
+        self.full_lines = [i - count for i in self.full_lines if i >= count]
+        self.version += 1
+        
+        column_tops = self.column_tops
+        if (column_tops is None or pushed_off):
+            self.column_tops = None
+            return
+        for x, top in enumerate(column_tops):
+            if top < self.height:
+                column_tops[x] = top - count
+            elif x != hole:
+                column_tops[x] = self.height - count
+        
+        
     def clear_line(self, line_number):
         """
-        Clears a line from the board.
+        Clears a line from the board. Use clear_lines to clear several lines at once.
 
         Args:
             line_number (int): The number of the line to clear.
         """
         self.board.pop(line_number)
+        self.row_counts.pop(line_number)
+        self.full_lines = [i for i, count in enumerate(self.row_counts) if count == self.width]
+        self.column_tops = None
+        self.version += 1
     
     
     def pad_line(self):
@@ -170,7 +460,593 @@ class Board:
         Pads the board with an empty line at the top.
         """
         self.board.insert(0, [0 for _ in range(self.width)])
+        self.row_counts.insert(0, 0)
+        self.full_lines = [i+1 for i in self.full_lines]
+        self.column_tops = None
+        self.version += 1
+        
+        
+    def clear_lines(self, line_numbers):
+        """
+        Clears lines from the board in a single pass, dropping the rows above them and padding the top.
+
+        Args:
+            line_numbers (list): The numbers of the lines to clear.
+        """
+        lines = sorted(set(line_numbers))
+        if not lines:
+            return
+        
+        n_lines = len(lines)
+        self.board = [[0] * self.width for _ in lines] + remove_rows(self.board, lines)
+        self.row_counts = [0] * n_lines + remove_rows(self.row_counts, lines)
+        if self.full_lines == lines:
+            self.full_lines = []
+        else:
+            self.full_lines = [i + n_lines - bisect_right(lines, i) for i in self.full_lines if i not in lines]
+        self.version += 1
+            
+        column_tops = self.column_tops
+        if column_tops is None:
+            return
+        for x, top in enumerate(column_tops):
+            if top in lines:
+                # Every cell above the old top was empty, so the new top can't be any higher
+                column_tops[x] = self.scan_column(x, top)
+            else:
+                column_tops[x] = top + n_lines - bisect_right(lines, top)
+        
+        
+    def scan_column(self, x, y):
+        """
+        Finds the first filled cell in a column, starting from a row and going down.
+
+        Args:
+            x (int): The column to scan.
+            y (int): The row to start from.
+
+        Returns:
+            int: The row of the first filled cell, or the height if there is none.
+        """
+        board = self.board
+        while y < self.height and not board[y][x]:
+            y += 1
+        return y
+    
+    
+    def get_column_tops(self):
+        """
+        Gets the row of the highest filled cell in each column, rebuilding the index if needed.
+
+        Returns:
+            list: The top row of each column, or the height for empty columns.
+        """
+        if self.column_tops is None:
+            self.column_tops = [self.scan_column(x, 0) for x in range(self.width)]
+        return self.column_tops
+        
         
+    def get_drop_distance(self, coords):
+        """
+        Gets how many rows the coordinates can move down before colliding with a filled cell or the floor.
+
+        Args:
+            coords (Coord): The coordinates to drop.
+
+        Returns:
+            int: The number of rows the coordinates can fall.
+        """
+        return self.get_drop_distance_at(coords, 0, 0)
+
+
+    def get_drop_distance_at(self, cells, dx, dy):
+        """
+        Gets how many rows cells can move down from an offset before colliding with a filled cell or the floor.
+        Cells above the surface of their column are answered from the column tops; only cells tucked under
+        an overhang scan their column.
+
+        Args:
+            cells (Coord): The coordinates to drop, such as the base coordinates of a block.
+            dx (int): The column offset of the cells.
+            dy (int): The row offset of the cells.
+
+        Returns:
+            int: The number of rows the cells can fall.
+        """
+        column_tops = self.get_column_tops()
+        distance = self.height
+        for x, y in cells:
+            x += dx
+            y += dy
+            top = column_tops[x]
+            if y >= top:
+                top = self.scan_column(x, y+1)
+            if top - 1 - y < distance:
+                distance = top - 1 - y
+        return distance
+
+
+    def check_collision(self, coords):
+        """
+        Checks if any of the coordinates are outside the walls or floor, or overlap a filled cell.
+
+        Args:
+            coords (Coord): The coordinates to check.
+
+        Returns:
+            bool: True if there is a collision, False otherwise.
+        """
+        for x, y in coords:
+            if self.check_cell(x, y):
+                return True
+        return False
+
+
+    def check_collision_at(self, cells, dx, dy):
+        """
+        Checks if the four cells of a block, at an offset, are outside the walls or floor, or overlap a filled cell.
+        Blocks are checked this way, with the cells of their orientation from CELLS and their position, so that
+        moving one allocates nothing: the cells are unpacked rather than looped over, which would make an iterator.
+
+        Args:
+            cells (tuple): The four (x, y) cells of a block's orientation, from CELLS.
+            dx (int): The column offset of the cells.
+            dy (int): The row offset of the cells.
+
+        Returns:
+            bool: True if there is a collision, False otherwise.
+        """
+        (x0, y0), (x1, y1), (x2, y2), (x3, y3) = cells
+        return (self.check_cell(x0 + dx, y0 + dy) or self.check_cell(x1 + dx, y1 + dy)
+                or self.check_cell(x2 + dx, y2 + dy) or self.check_cell(x3 + dx, y3 + dy))
+
+
+    def check_cell(self, x, y):
+        """
+        Checks if a cell is outside the walls or floor, or filled.
+        Cells above the top of the board only collide with the walls.
+
+        Args:
+            x (int): The column.
+            y (int): The row.
+
+        Returns:
+            bool: True if there is a collision, False otherwise.
+        """
+        if (x < 0 or x >= self.width or y >= self.height):
+            return True
+        return y >= 0 and self.board[y][x] != 0
+
+
+    def get_full_lines(self):
+        """
+        Gets the indices of all completely filled lines. These are tracked as blocks are added, so no rows are scanned.
+
+        Returns:
+            list: A sorted list of line numbers that are full.
+        """
+        return list(self.full_lines)
+
+
+    def count_filled_lines(self, n_lines):
+        """
+        Counts how many of the top lines of the board contain at least one filled cell.
+
+        Args:
+            n_lines (int): The number of lines from the top to look at.
+
+        Returns:
+            int: The number of non-empty lines.
+        """
+        return len([1 for row in self.board[:n_lines] if any(row)])
+
+
+    def check_top_out(self, n_lines):
+        """
+        Checks if any of the top lines of the board contain a filled cell.
+
+        Args:
+            n_lines (int): The number of lines from the top to look at.
+
+        Returns:
+            bool: True if any of the lines are non-empty, False otherwise.
+        """
+        return any(self.row_counts[:n_lines])
+
+
+
+
+class BitBoard(Board):
+    """
+    Represents the board with each row stored as an integer occupancy mask.
+
+    Bit x of a row mask is set when column x is filled. The inherited board list is
+    kept as a colour plane of shape names, and is only read by the renderers.
+
+    Attributes:
+        rows (list): A list of row occupancy masks, top row first.
+        full_mask (int): The mask of a completely filled row.
+    """
+
+    def __init__(self, width=GAME_WIDTH, height=GAME_HEIGHT):
+        super().__init__(width, height)
+        self.full_mask = (1 << width) - 1
+        self.rows = [0] * height
+
+
+    def fill_cells(self, coords, shape_name):
+        """
+        Fills cells with a shape, without checking whether they are already filled.
+
+        Args:
+            coords (list): The (x, y) coordinates of the cells.
+            shape_name (str): The shape to fill them with.
+        """
+        super().fill_cells(coords, shape_name)
+        rows = self.rows
+        for x, y in coords:
+            rows[y] |= 1 << x
+
+
+    def clear(self):
+        """
+        Clears the board.
+        """
+        super().clear()
+        self.rows = [0] * self.height
+
+
+    def set_cells(self, board):
+        """
+        Replaces the contents of the board, rebuilding the row masks.
+
+        Args:
+            board (list): A 2D list of shape names, or 0 for empty cells, with the board's dimensions.
+        """
+        super().set_cells(board)
+        self.rows = [sum(1 << x for x, cell in enumerate(row) if cell) for row in self.board]
+
+
+    def add_garbage_lines(self, count, hole):
+        """
+        Pushes the board up and fills the bottom lines with garbage, except for one column.
+
+        Args:
+            count (int): The number of garbage lines.
+            hole (int): The column left empty in every garbage line.
+        """
+        super().add_garbage_lines(count, hole)
+        if count > 0:
+            self.rows = self.rows[count:] + [self.full_mask & ~(1 << hole)] * count
+
+
+    def clear_line(self, line_number):
+        """
+        Clears a line from the board.
+
+        Args:
+            line_number (int): The number of the line to clear.
+        """
+        super().clear_line(line_number)
+        self.rows.pop(line_number)
+
+
+    def pad_line(self):
+        """
+        Pads the board with an empty line at the top.
+        """
+        super().pad_line()
+        self.rows.insert(0, 0)
+
+
+    def clear_lines(self, line_numbers):
+        """
+        Clears lines from the board in a single pass, dropping the rows above them and padding the top.
+
+        Args:
+            line_numbers (list): The numbers of the lines to clear.
+        """
+        lines = sorted(set(line_numbers))
+        if lines:
+            self.rows = [0] * len(lines) + remove_rows(self.rows, lines)
+        super().clear_lines(lines)
+
+
+    def check_cell(self, x, y):
+        """
+        Checks if a cell is outside the walls or floor, or filled.
+        Cells above the top of the board only collide with the walls.
+
+        Args:
+            x (int): The column.
+            y (int): The row.
+
+        Returns:
+            bool: True if there is a collision, False otherwise.
+        """
+        if (x < 0 or x >= self.width or y >= self.height):
+            return True
+        return y >= 0 and self.rows[y] >> x & 1 == 1
+
+
+    def count_filled_lines(self, n_lines):
+        """
+        Counts how many of the top lines of the board contain at least one filled cell.
+
+        Args:
+            n_lines (int): The number of lines from the top to look at.
+
+        Returns:
+            int: The number of non-empty lines.
+        """
+        return len([1 for mask in self.rows[:n_lines] if mask])
+
+
+    def check_top_out(self, n_lines):
+        """
+        Checks if any of the top lines of the board contain a filled cell.
+
+        Args:
+            n_lines (int): The number of lines from the top to look at.
+
+        Returns:
+            bool: True if any of the lines are non-empty, False otherwise.
+        """
+        return any(self.rows[:n_lines])
+
+
+
+
+class Randomizer:
+    """
+    Chooses the shapes a game is dealt. Every randomizer is seeded, so the same seed deals the same shapes.
+    
+    Attributes:
+        shape_names (list): The shapes to choose from.
+        rng (Random): The random number generator.
+    """
+    
+    def __init__(self, seed=None):
+        self.shape_names = list(SHAPES.keys())
+        self.rng = Random(seed)
+        
+        
+    def next_shape(self):
+        """
+        Draws the next shape.
+        
+        Returns:
+            str: The shape name.
+        """
+        raise NotImplementedError
+        
+        
+    def generate(self, n):
+        """
+        Draws many shapes in one call, the same ones as n calls to next_shape.
+        
+        Args:
+            n (int): The number of shapes.
+            
+        Returns:
+            list: The shape names, in the order they were drawn.
+        """
+        next_shape = self.next_shape
+        return [next_shape() for _ in range(n)]
+    
+    
+    def get_shapes(self):
+        """
+        Gets the shapes the randomizer is holding on to, for saving alongside the state of its rng.
+        
+        Returns:
+            list: The shape names.
+        """
+        return []
+    
+    
+    def set_shapes(self, shapes):
+        """
+        Restores the shapes returned by get_shapes.
+        
+        Args:
+            shapes (list): The shape names.
+        """
+        
+        
+        
+        
+class BagRandomizer(Randomizer):
+    """
+    Deals every shape once per bag, in a shuffled order, so no shape is ever more than 12 pieces away.
+    
+    Attributes:
+        shape_names (list): The shapes to choose from.
+        rng (Random): The random number generator used to shuffle the bags.
+        bag (list): The shapes left in the current bag, drawn from the end.
+    """
+    
+    def __init__(self, seed=None):
+        super().__init__(seed)
+        self.bag = []
+        
+        
+    def next_shape(self):
+        """
+        Draws the next shape, shuffling a new bag if the current one is empty.
+        
+        Returns:
+            str: The shape name.
+        """
+        if not self.bag:
+            self.bag = self.new_bag()
+        return self.bag.pop()
+    
+    
+    def new_bag(self):
+        """
+        Shuffles a new bag.
+        
+        Returns:
+            list: The shapes, drawn from the end.
+        """
+        bag = list(self.shape_names)
+        self.rng.shuffle(bag)
+        return bag
+    
+    
+    def generate(self, n):
+        """
+        Draws many shapes in one call, a whole bag at a time.
+        
+        Args:
+            n (int): The number of shapes.
+            
+        Returns:
+            list: The shape names, in the order they were drawn.
+        """
+        shapes = []
+        bag = self.bag
+        while len(shapes) + len(bag) < n:
+            shapes += reversed(bag)
+            bag = self.new_bag()
+        rest = len(bag) - (n - len(shapes))
+        shapes += reversed(bag[rest:])
+        self.bag = bag[:rest]
+        return shapes
+    
+    
+    def get_shapes(self):
+        """
+        Gets the rest of the current bag.
+        
+        Returns:
+            list: The shape names, drawn from the end.
+        """
+        return list(self.bag)
+    
+    
+    def set_shapes(self, shapes):
+        """
+        Restores the rest of the current bag.
+        
+        Args:
+            shapes (list): The shape names, drawn from the end.
+        """
+        self.bag = list(shapes)
+        
+        
+        
+        
+class RandomRandomizer(Randomizer):
+    """
+    Deals every shape independently at random, so droughts and floods of a shape are possible.
+    """
+    
+    def next_shape(self):
+        """
+        Draws the next shape.
+        
+        Returns:
+            str: The shape name.
+        """
+        # Random.choices draws the same way, so next_shape and generate deal the same shapes
+        return self.shape_names[int(self.rng.random() * len(self.shape_names))]
+    
+    
+    def generate(self, n):
+        """
+        Draws many shapes in one call.
+        
+        Args:
+            n (int): The number of shapes.
+            
+        Returns:
+            list: The shape names, in the order they were drawn.
+        """
+        return self.rng.choices(self.shape_names, k=n)
+    
+    
+    
+    
+class HistoryRandomizer(Randomizer):
+    """
+    Deals shapes like the Tetris: The Grand Master games. Each shape is rolled at random, rerolling up to a limit
+    while it is one of the last few shapes dealt, so repeats are rare but possible.
+    
+    Attributes:
+        shape_names (list): The shapes to choose from.
+        rng (Random): The random number generator.
+        rolls (int): The most rolls per shape. The last roll is dealt even if it is in the history.
+        history (deque): The last shapes dealt, oldest first.
+    """
+    
+    def __init__(self, seed=None, rolls=HISTORY_ROLLS):
+        super().__init__(seed)
+        self.rolls = rolls
+        self.history = deque(HISTORY_START, maxlen=len(HISTORY_START))
+        
+        
+    def next_shape(self):
+        """
+        Draws the next shape.
+        
+        Returns:
+            str: The shape name.
+        """
+        shape_names = self.shape_names
+        random = self.rng.random
+        for _ in range(self.rolls):
+            shape_name = shape_names[int(random() * len(shape_names))]
+            if shape_name not in self.history:
+                break
+        self.history.append(shape_name)
+        return shape_name
+    
+    
+    def get_shapes(self):
+        """
+        Gets the history.
+        
+        Returns:
+            list: The shape names, oldest first.
+        """
+        return list(self.history)
+    
+    
+    def set_shapes(self, shapes):
+        """
+        Restores the history.
+        
+        Args:
+            shapes (list): The shape names, oldest first.
+        """
+        self.history.clear()
+        self.history.extend(shapes)
+        
+        
+        
+        
+class GameEvent:
+    """
+    A change to a game, as published to its listeners.
+    
+    Attributes:
+        type (str): One of EVENTS.
+        version (int): The game's version after the change.
+        The details listed for the type in EVENTS are attributes too.
+    """
+    
+    def __init__(self, event_type, version, **details):
+        self.type = event_type
+        self.version = version
+        self.__dict__.update(details)
+        
+        
+    def __repr__(self):
+        details = ', '.join(f'{name}={value!r}' for name, value in self.__dict__.items() if name not in ('type', 'version'))
+        return f'GameEvent({self.type}, {details})'
+
 
 
 
@@ -183,59 +1059,103 @@ class Tetris:
         width (int): The width of the board.
         height (int): The height of the board.
         board (Board): The board.
-        shape_bag (list): A list of shape names.
+        randomizer (Randomizer): Chooses the shapes of the blocks.
         current_block (Block): The current block.
+        queue (deque): The upcoming blocks, next first.
+        version (int): Counts the changes to the game, so that frontends can skip frames where nothing changed.
+        listeners (list): Functions called with a GameEvent for each change that is one of EVENTS.
     """
     
-    # TODO: Add queue
-    
-    def __init__(self, width=GAME_WIDTH, height=GAME_HEIGHT):
+    def __init__(self, width=GAME_WIDTH, height=GAME_HEIGHT, board_type=Board, seed=None, randomizer=None,
+                 queue_length=QUEUE_LENGTH):
         self.score = 0
         self.width = width
         self.height = height+6
-        self.board = Board(width, height+6)
-        self.shape_bag = list(SHAPES.keys())
-        shuffle(self.shape_bag)
+        self.board = board_type(width, height+6)
+        self.randomizer = BagRandomizer(seed) if randomizer is None else randomizer
         self.current_block = self.get_new_shape()
-        self.queue = []
-        for _ in range(QUEUE_LENGTH):
-            self.queue.append(self.get_new_shape())
+        self.queue = deque(self.get_new_shape() for _ in range(queue_length))
         self.held_block = None
         self.just_held = False
         self.prev_clear = 0
+        self.topped_out = False
+        self.ghost_block = None
+        self.ghost_key = None
+        self.version = 0
+        self.listeners = []
         
-    
-    
-    
-    def get_new_shape(self):
+        
+    def add_listener(self, listener):
         """
-        Gets a new shape from the shape bag.
+        Registers a function to be called with a GameEvent for each event. Listeners are called while the game is
+        changing, so they shouldn't apply actions to it.
         
-        Returns:
-            Block: The new block.
+        Args:
+            listener (function): The function.
+        """
+        self.listeners.append(listener)
+        
+        
+    def remove_listener(self, listener):
+        """
+        Unregisters a listener.
+        
+        Args:
+            listener (function): The function passed to add_listener.
+        """
+        self.listeners.remove(listener)
+        
+        
+    def notify(self, event_type, **details):
+        """
+        Counts a change to the game and publishes it to the listeners.
+        
+        Args:
+            event_type (str): One of EVENTS.
+            **details: The details of the event, as listed in EVENTS.
+        """
+        self.version += 1
+        if self.listeners:
+            self.publish(GameEvent(event_type, self.version, **details))
+            
+            
+    def notify_moved(self, action):
+        """
+        Counts a move of the current block and publishes a PIECE_MOVED event. Unlike notify, nothing is built unless
+        something is listening, as the block moves far more often than anything else changes.
+        
+        Args:
+            action (str): The action that moved the block.
+        """
+        self.version += 1
+        if self.listeners:
+            self.publish(GameEvent('PIECE_MOVED', self.version, action=action))
+            
+            
+    def publish(self, event):
         """
-        if len(self.shape_bag) == 0:
-            self.generate_new_bag()
-        shape_name = self.shape_bag.pop()
-        new_block = Block(shape_name)
-        new_block.coords += Coord(STARTING_PAD)
-        if (shape_name == 'T'):
-            new_block.coords += Coord(Y_UP)
+        Passes an event to each listener.
         
-        return new_block
+        Args:
+            event (GameEvent): The event.
+        """
+        for listener in self.listeners:
+            listener(event)
     
     
-    def generate_new_bag(self):
+    def get_new_shape(self):
         """
-        Generates a new shape bag.
+        Gets a new block from the randomizer.
+        
+        Returns:
+            Block: The new block.
         """
-        self.shape_bag = list(SHAPES.keys())
-        shuffle(self.shape_bag)
+        shape_name = self.randomizer.next_shape()
+        return Block(shape_name, SPAWN_X, SPAWN_Y - (shape_name == 'T'))
         
         
     def add_top_pad(self, block):
-        for _ in range(len([1 for row in self.board.board[:6] if any(row)])):
-            block.coords += Coord(Y_UP)
+        block.move(0, -self.board.count_filled_lines(6))
         return block
         
         
@@ -245,7 +1165,7 @@ class Tetris:
         Moves block up if there are any blocks at the top of or above board.
         """
         self.queue.append(self.get_new_shape())
-        self.current_block = self.add_top_pad(self.queue.pop(0))
+        self.current_block = self.add_top_pad(self.queue.popleft())
         
         
         
@@ -260,14 +1180,7 @@ class Tetris:
         Returns:
             bool: True if there is a collision, False otherwise.
         """
-        coords = block.coords
-        direction = Coord(X_LEFT) if check_left else Coord(X_RIGHT)
-        coords += direction
-        
-        # Check wall collision and block collision
-        if (any([y < 0 for _, y in coords])):
-            return any([(x < 0 or x >= self.width) for x, _ in coords])
-        return any([(x < 0 or x >= self.width or self.board.board[y][x]) for x, y in coords])
+        return self.board.check_collision_at(block.cells, block.x - 1 if check_left else block.x + 1, block.y)
     
     
     def check_y_collision(self, block):
@@ -280,9 +1193,7 @@ class Tetris:
         Returns:
             bool: True if there is a collision, False otherwise.
         """
-        coords = block.coords + Coord(Y_DOWN)
-        
-        return any([((y >= 0) and (y >= self.height or self.board.board[y][x])) for x, y in coords])
+        return self.board.check_collision_at(block.cells, block.x, block.y + 1)
     
     
     def move_x(self, block, is_move_left):
@@ -293,9 +1204,37 @@ class Tetris:
             block (Block): The block to move. Defaults to None.
             is_move_left (bool): Whether to the left.
         """
-        direction = Coord(X_LEFT) if is_move_left else Coord(X_RIGHT)
         if not self.check_x_collision(is_move_left, block):
-            block.coords += direction
+            block.move(-1 if is_move_left else 1, 0)
+            if block is self.current_block:
+                self.notify_moved('LEFT' if is_move_left else 'RIGHT')
+            
+    
+    def rotate(self, block, is_clockwise):
+        """
+        Rotates the block, trying each wall kick in turn against the board.
+
+        Args:
+            block (Block): The block to rotate.
+            is_clockwise (bool): Whether to rotate clockwise.
+
+        Returns:
+            bool: True if the block was rotated, False otherwise.
+        """
+        cells = CELLS[block.shape_name]
+        kicks = block.get_kicks(is_clockwise)
+        # Indexed rather than looped over, so that no iterator is allocated
+        i = 0
+        while i < len(kicks):
+            orientation, dx, dy = kicks[i]
+            x, y = block.x + dx, block.y + dy
+            if not self.board.check_collision_at(cells[orientation], x, y):
+                block.set_position(orientation, x, y)
+                if block is self.current_block:
+                    self.notify_moved('ROTATE_CW' if is_clockwise else 'ROTATE_CCW')
+                return True
+            i += 1
+        return False
             
     
     def move_down(self, block):
@@ -306,16 +1245,33 @@ class Tetris:
             block (Block): The block to move.
         """
         if not self.check_y_collision(block):
-            block.coords += Coord(Y_DOWN)
+            block.move(0, 1)
+            if block is self.current_block:
+                self.notify_moved('SOFT_DROP')
             
             
     def hard_drop(self):
         """
         Drops the current block as far as possible without colliding with other blocks or the floor.
         """
-        while (not self.check_y_collision(self.current_block)):
-            self.move_down(self.current_block)
+        distance = self.get_drop_distance(self.current_block)
+        if distance > 0:
+            self.current_block.move(0, distance)
+            self.notify_moved('HARD_DROP')
         self.place_block()
+        
+        
+    def get_drop_distance(self, block):
+        """
+        Gets how many rows the block can fall before it lands.
+
+        Args:
+            block (Block): The block to drop.
+
+        Returns:
+            int: The number of rows the block can move down.
+        """
+        return max(0, self.board.get_drop_distance_at(block.base_coords, block.x, block.y))
     
     
     def get_cleared_lines(self):
@@ -325,7 +1281,7 @@ class Tetris:
         Returns:
             list: A list of line numbers that are cleared.
         """
-        return sorted([i for i, row in enumerate(self.board.board) if all(row)])
+        return self.board.get_full_lines()
     
     
     def check_cleared_lines(self):
@@ -346,6 +1302,8 @@ class Tetris:
             cleared_lines: The indices of the cleared lines.
         """
         score_map = {1: SCORES['SINGLE'], 2: SCORES['DOUBLE'], 3: SCORES['TRIPLE'], 4: SCORES['TETRIS']}
+        previous_level = self.get_current_level()
+        b2b_broken = self.prev_clear > 4 and len(cleared_lines) < 4
         if (len(cleared_lines) == 4 and self.prev_clear >= 4):
             self.score += SCORES['TETRIS B2B']
         else:
@@ -356,22 +1314,30 @@ class Tetris:
         else:
             self.prev_clear = len(cleared_lines)
             
-        for line in cleared_lines:
-            self.board.clear_line(line)
-            self.board.pad_line()
+        self.board.clear_lines(cleared_lines)
+        self.notify('LINES_CLEARED', count=len(cleared_lines), b2b=max(0, self.prev_clear - 4),
+                    b2b_broken=b2b_broken, score=self.score)
+        level = self.get_current_level()
+        if (level != previous_level):
+            self.notify('LEVEL_CHANGED', level=level, previous_level=previous_level)
             
     
     def get_ghost_block(self):
         """
         Gets the ghost block, which is the block that would be created if the current block were to be dropped as far as possible.
+        The ghost is cached until the current block moves or the board changes.
 
         Returns:
             Block: The ghost block.
         """
-        ghost = deepcopy(self.current_block)
-        while (not self.check_y_collision(ghost)):
-            self.move_down(ghost)
-        return ghost
+        block = self.current_block
+        key = (block.shape_name, block.orientation, block.x, block.y, self.board.version)
+        if key != self.ghost_key:
+            ghost = Block(block.shape_name)
+            ghost.set_position(block.orientation, block.x, block.y + self.get_drop_distance(block))
+            self.ghost_block = ghost
+            self.ghost_key = key
+        return self.ghost_block
     
     
     def get_current_level(self):
@@ -419,9 +1385,13 @@ class Tetris:
         
         This function is used to place the block on the board when it reaches the bottom.
         """
+        coords = self.current_block.coords
         self.board.add_block(self.current_block)
         self.pop_from_queue()
         self.just_held = False
+        self.notify('PIECE_LOCKED', coords=coords, full_lines=len(self.board.get_full_lines()))
+        if self.check_game_over():
+            self.notify('GAME_OVER', score=self.score)
         
         
     def hold_block(self):
@@ -430,17 +1400,69 @@ class Tetris:
         If there is already a held block, it swaps the held block with the current block.
         """
         if (not self.just_held):
-            hold = Block(self.current_block.shape_name)
-            hold.coords += Coord(STARTING_PAD)
+            hold = Block(self.current_block.shape_name, SPAWN_X, SPAWN_Y)
             if self.held_block == None:
                 self.pop_from_queue()
             else:
                 self.current_block = self.add_top_pad(self.held_block)
             self.held_block = hold
             self.just_held = True
+            self.notify('HOLD_USED', shape_name=hold.shape_name)
+            
+            
+    def add_garbage(self, count, hole):
+        """
+        Adds garbage lines sent by an opponent to the bottom of the board. The current block is moved up out of
+        the way if the board was pushed into it, and the game is over if it still overlaps the board at the top.
+        
+        Args:
+            count (int): The number of garbage lines.
+            hole (int): The column left empty in every garbage line.
+        """
+        if count <= 0:
+            return
+        self.board.add_garbage_lines(count, hole)
+        block = self.current_block
+        top = min(y for _, y in block.base_coords)
+        while (self.board.check_collision_at(block.cells, block.x, block.y) and block.y + top > 0):
+            block.move(0, -1)
+        if self.board.check_collision_at(block.cells, block.x, block.y):
+            self.topped_out = True
+        self.notify('GARBAGE_ADDED', count=count, hole=hole)
+        if self.check_game_over():
+            self.notify('GAME_OVER', score=self.score)
             
             
     def check_game_over(self):
-        if any([any(row) for row in self.board.board[:4]]):
-            return True
-        return False
\ No newline at end of file
+        return self.topped_out or self.board.check_top_out(4)
+    
+    
+    def apply_action(self, action):
+        """
+        Applies one of the inputs in ACTIONS to the current block.
+        
+        Args:
+            action (str): The name of the action.
+        """
+        if (action == 'LEFT'):
+            self.move_x(self.current_block, True)
+        elif (action == 'RIGHT'):
+            self.move_x(self.current_block, False)
+        elif (action == 'ROTATE_CW'):
+            self.rotate(self.current_block, True)
+        elif (action == 'ROTATE_CCW'):
+            self.rotate(self.current_block, False)
+        elif (action == 'SOFT_DROP'):
+            self.move_down(self.current_block)
+        elif (action == 'HARD_DROP'):
+            self.hard_drop()
+        elif (action == 'HOLD'):
+            self.hold_block()
+        elif (action == 'LOCK'):
+            self.place_block()
+        elif (action == 'CLEAR'):
+            cleared_lines = self.get_cleared_lines()
+            if cleared_lines:
+                self.clear_lines(cleared_lines)
+        elif (action != 'NOOP'):
+            raise ValueError(f'Unknown action {action}.')
@@ -0,0 +1,348 @@
+"""
+Finds every position a block can lock in, with the shortest inputs that get it there.
+
+The search is a breadth-first search over (orientation, x, y) states, moving with LEFT, RIGHT, SOFT_DROP,
+ROTATE_CW and ROTATE_CCW, and ending with a HARD_DROP. It reaches tucks under overhangs, slides and kicked
+spins as well as plain drops. States are searched a whole row at a time, with each row of states held as a
+bitmask of x positions, like BitBoard. Results are cached by the board's row masks and the block's position.
+"""
+from functools import lru_cache
+
+from tetris_logic import SHAPES, ROTATIONS, KICKS, BitBoard, Block
+
+
+# Empty rows added above the board, for blocks spawned partly above it
+TOP_ROWS = 8
+MOVE_CACHE_SIZE = 4096
+
+
+def get_piece_table(shape_name):
+    """
+    Describes a shape in each orientation relative to its anchor, the top left corner of its bounding box.
+
+    Args:
+        shape_name (str): The name of the shape type.
+
+    Returns:
+        list: For each orientation, (min_x, min_y, width, height, rows), where rows holds (dy, x offsets) for each
+            row of the shape.
+    """
+    table = []
+    for coords in ROTATIONS[shape_name]:
+        min_x = min(x for x, _ in coords)
+        min_y = min(y for _, y in coords)
+        width = max(x for x, _ in coords) - min_x + 1
+        height = max(y for _, y in coords) - min_y + 1
+        rows = [(dy, [x - min_x for x, y in coords if y - min_y == dy]) for dy in range(height)]
+        table.append((min_x, min_y, width, height, rows))
+    return table
+
+
+def get_rotation_shifts(shape_name):
+    """
+    Gets how each rotation, wall kicks included, moves a shape's anchor.
+
+    Args:
+        shape_name (str): The name of the shape type.
+
+    Returns:
+        dict: Maps (orientation, is_clockwise) to a list of (new orientation, x shift, y shift), in the order the
+            kicks are tried.
+    """
+    pieces = PIECES[shape_name]
+    shifts = {}
+    for (orientation, is_clockwise), kicks in KICKS[shape_name].items():
+        shifts[(orientation, is_clockwise)] = [(end,
+                                                kick_x + pieces[end][0] - pieces[orientation][0],
+                                                kick_y + pieces[end][1] - pieces[orientation][1])
+                                               for end, kick_x, kick_y in kicks]
+    return shifts
+
+
+PIECES = {shape_name: get_piece_table(shape_name) for shape_name in SHAPES}
+ROTATION_SHIFTS = {shape_name: get_rotation_shifts(shape_name) for shape_name in SHAPES}
+# For each shape and orientation, the rotation actions with the kicks each one tries
+ROTATION_MOVES = {shape_name: [[(action, shifts[(orientation, is_clockwise)])
+                                for is_clockwise, action in ((True, 'ROTATE_CW'), (False, 'ROTATE_CCW'))]
+                               for orientation in range(4)]
+                  for shape_name, shifts in ROTATION_SHIFTS.items()}
+# The furthest any rotation moves each shape's anchor up or down
+KICK_MARGINS = {shape_name: max([abs(shift_y) for kicks in shifts.values() for _, _, shift_y in kicks], default=0)
+                for shape_name, shifts in ROTATION_SHIFTS.items()}
+
+
+def get_row_masks(board):
+    """
+    Gets the occupancy of each row of a board, in the form of BitBoard.rows.
+
+    Args:
+        board (Board): The board.
+
+    Returns:
+        list: The row masks, top row first.
+    """
+    if isinstance(board, BitBoard):
+        return list(board.rows)
+    return [sum(1 << x for x, cell in enumerate(row) if cell) for row in board.board]
+
+
+def shift_mask(mask, shift):
+    """
+    Shifts a mask of x positions.
+
+    Args:
+        mask (int): The mask.
+        shift (int): How far to move each position, negative for left.
+
+    Returns:
+        int: The shifted mask.
+    """
+    return mask << shift if shift >= 0 else mask >> -shift
+
+
+def get_valid_positions(rows, width, shape_name):
+    """
+    Gets where a shape fits on a board.
+
+    Args:
+        rows (tuple): The row masks of the board, including the TOP_ROWS empty rows.
+        width (int): The width of the board.
+        shape_name (str): The name of the shape type.
+
+    Returns:
+        list: For each orientation, a list with the mask of anchor x positions that fit in each row.
+    """
+    valid = []
+    for _, _, piece_width, piece_height, piece_rows in PIECES[shape_name]:
+        x_range = (1 << (width - piece_width + 1)) - 1
+        orientation_valid = []
+        for r in range(len(rows) - piece_height + 1):
+            blocked = 0
+            for dy, offsets in piece_rows:
+                row = rows[r + dy]
+                if row:
+                    for offset in offsets:
+                        blocked |= row >> offset
+            orientation_valid.append(~blocked & x_range)
+        valid.append(orientation_valid + [0] * piece_height)
+    return valid
+
+
+class MoveMap:
+    """
+    The positions a block can lock in, and the shortest inputs to reach each one.
+
+    Attributes:
+        shape_name (str): The name of the shape type.
+        start (tuple): The block's starting (orientation, row, x) state.
+        locks (dict): Maps each lock (orientation, row, x) state to the state HARD_DROP is pressed in, in order of
+            the number of inputs needed.
+        parents (dict): Maps each (orientation, row) to (x mask, action, source orientation, source row, x shift)
+            entries, recording how the states in the mask were first reached. A SOFT_DROP entry stands for as many
+            soft drops as the rows between its source and its row.
+    """
+
+    def __init__(self, shape_name, start, locks, parents):
+        self.shape_name = shape_name
+        self.start = start
+        self.locks = locks
+        self.parents = parents
+
+
+    def get_coords(self, lock):
+        """
+        Gets the cells a block covers in a state.
+
+        Args:
+            lock (tuple): The (orientation, row, x) state.
+
+        Returns:
+            Coord: The cells.
+        """
+        orientation, r, x = lock
+        min_x, min_y = PIECES[self.shape_name][orientation][:2]
+        block = Block(self.shape_name)
+        block.set_position(orientation, x - min_x, r - TOP_ROWS - min_y)
+        return block.coords
+
+
+    def get_actions(self, lock):
+        """
+        Gets the shortest inputs that lock the block in a state.
+
+        Args:
+            lock (tuple): One of the lock states.
+
+        Returns:
+            list: The actions, ending with HARD_DROP.
+        """
+        orientation, r, x = self.locks[lock]
+        actions = ['HARD_DROP']
+        while (orientation, r, x) != self.start:
+            for mask, action, source_orientation, source_r, shift in self.parents[(orientation, r)]:
+                if mask >> x & 1:
+                    break
+            # Soft drops through open air are recorded as one move
+            actions += [action] * (r - source_r if action == 'SOFT_DROP' else 1)
+            orientation, r, x = source_orientation, source_r, x - shift
+        actions.reverse()
+        return actions
+
+
+    def get_distinct_locks(self):
+        """
+        Gets the lock states that cover distinct cells, keeping the one with the fewest inputs. Orientations that
+        cover the same cells, like the two flat orientations of an S block, count as one position.
+
+        Returns:
+            list: (lock, coords) pairs, fewest inputs first.
+        """
+        placements = {}
+        for lock in self.locks:
+            coords = self.get_coords(lock)
+            cells = frozenset(coords)
+            if cells not in placements:
+                placements[cells] = (lock, coords)
+        return list(placements.values())
+
+
+    def get_placements(self):
+        """
+        Gets every distinct lock position with its inputs.
+
+        Returns:
+            list: (actions, coords) pairs, fewest inputs first.
+        """
+        return [(self.get_actions(lock), coords) for lock, coords in self.get_distinct_locks()]
+
+
+def get_air_row(valid, width, shape_name):
+    """
+    Gets the lowest row where a block is in open air, clear of anything it could touch even after a kick.
+    Every move works the same way in every row above it.
+
+    Args:
+        valid (list): The valid positions, from get_valid_positions.
+        width (int): The width of the board.
+        shape_name (str): The name of the shape type.
+
+    Returns:
+        int: The row, which is negative if the block is never in open air.
+    """
+    x_ranges = [(1 << (width - piece_width + 1)) - 1 for _, _, piece_width, _, _ in PIECES[shape_name]]
+    r = 0
+    while all(valid[orientation][r] == x_range for orientation, x_range in enumerate(x_ranges)):
+        r += 1
+    return r - 1 - KICK_MARGINS[shape_name]
+
+
+@lru_cache(maxsize=MOVE_CACHE_SIZE)
+def search(rows, width, shape_name, start):
+    """
+    Searches every state a block can reach, a layer of equal input counts at a time.
+
+    Soft drops through open air, above anything the block could touch, are taken all at once. Moves there can be
+    reordered freely, so the inputs found are still the fewest.
+
+    Args:
+        rows (tuple): The row masks of the board, including the TOP_ROWS empty rows.
+        width (int): The width of the board.
+        shape_name (str): The name of the shape type.
+        start (tuple): The block's starting (orientation, row, x) state.
+
+    Returns:
+        MoveMap: The reachable lock positions.
+    """
+    valid = get_valid_positions(rows, width, shape_name)
+    n_rows = len(rows)
+    orientation, r, x = start
+    locks = {}
+    parents = {}
+    if not (valid[orientation][r] >> x & 1):
+        return MoveMap(shape_name, start, locks, parents)
+
+    air_r = get_air_row(valid, width, shape_name)
+
+    rotations = ROTATION_MOVES[shape_name]
+    visited = [[0] * (n_rows + 1) for _ in range(4)]
+    dropped = [[0] * (n_rows + 1) for _ in range(4)]
+    # Moves are queued by the number of inputs they take to reach, and states are settled when their layer comes up
+    layers = {0: [(orientation, r, 1 << x, None, orientation, r, 0)]}
+    layer = 0
+    last_layer = 0
+
+    while layer <= last_layer:
+        frontier = {}
+        for target_orientation, target_r, moved, action, source_orientation, source_r, shift in layers.pop(layer, ()):
+            new = moved & ~visited[target_orientation][target_r]
+            if new:
+                visited[target_orientation][target_r] |= new
+                key = (target_orientation, target_r)
+                frontier[key] = frontier.get(key, 0) | new
+                if action:
+                    parents.setdefault(key, []).append((new, action, source_orientation, source_r, shift))
+
+        # Hard drop from every state in this layer. A drop through a cell an earlier drop passed through lands in
+        # the same place with no fewer inputs, so it stops there.
+        for (orientation, r), mask in frontier.items():
+            column = valid[orientation]
+            column_dropped = dropped[orientation]
+            drop_r = r
+            mask &= ~column_dropped[r]
+            while mask:
+                column_dropped[drop_r] |= mask
+                landed = mask & ~column[drop_r + 1]
+                while landed:
+                    low_bit = landed & -landed
+                    x = low_bit.bit_length() - 1
+                    locks[(orientation, drop_r, x)] = (orientation, r, x)
+                    landed ^= low_bit
+                drop_r += 1
+                mask &= column[drop_r] & ~column_dropped[drop_r]
+
+        next_layer = layers.setdefault(layer + 1, [])
+        for (orientation, r), mask in frontier.items():
+            row_valid = valid[orientation][r]
+            next_layer.append((orientation, r, (mask >> 1) & row_valid, 'LEFT', orientation, r, -1))
+            next_layer.append((orientation, r, (mask << 1) & row_valid, 'RIGHT', orientation, r, 1))
+            if (r < air_r):
+                layers.setdefault(layer + air_r - r, []).append((orientation, air_r, mask, 'SOFT_DROP', orientation, r, 0))
+                last_layer = max(last_layer, layer + air_r - r)
+            else:
+                next_layer.append((orientation, r + 1, mask & valid[orientation][r + 1], 'SOFT_DROP', orientation, r, 0))
+            for action, kicks in rotations[orientation]:
+                remaining = mask
+                for end, shift_x, shift_y in kicks:
+                    end_r = r + shift_y
+                    if (end_r < 0 or end_r >= n_rows):
+                        continue
+                    # Each block takes the first kick that fits, so those that fit don't try the later kicks
+                    rotated = shift_mask(remaining, shift_x) & valid[end][end_r]
+                    if rotated:
+                        next_layer.append((end, end_r, rotated, action, orientation, r, shift_x))
+                        remaining &= ~shift_mask(rotated, -shift_x)
+                        if not remaining:
+                            break
+        if frontier:
+            last_layer = max(last_layer, layer + 1)
+        layer += 1
+
+    return MoveMap(shape_name, start, locks, parents)
+
+
+def get_move_map(board, block):
+    """
+    Gets every position a block can lock in on a board, using the cache when the same board and block were searched.
+
+    Args:
+        board (Board): The board.
+        block (Block): The block, in its starting position.
+
+    Returns:
+        MoveMap: The reachable lock positions.
+    """
+    min_x, min_y = PIECES[block.shape_name][block.orientation][:2]
+    start = (block.orientation, block.y + min_y + TOP_ROWS, block.x + min_x)
+    if start[1] < 0:
+        raise ValueError(f'Block is more than {TOP_ROWS} rows above the board.')
+    return search(tuple([0] * TOP_ROWS + get_row_masks(board)), board.width, block.shape_name, start)
@@ -0,0 +1,228 @@
+"""
+Opt-in instrumentation of tetris_logic. It counts the calls to each public method of Tetris, Board, BitBoard and Block
+and adds up their wall time, and it keeps per-frame samples from the frontends.
+
+Nothing is wrapped until Profiler.enable is called, so unprofiled sessions run the original methods untouched.
+Either frontend profiles with --profile, writing the report when the game ends, or whenever it gets SIGUSR1:
+
+    python tetris_gui_pygame.py --profile profile.json
+    kill -USR1 <pid>
+
+The report is written as JSON to the given path, with a readable table next to it in a .txt file.
+"""
+import json
+import signal
+from collections import deque
+from functools import wraps
+from inspect import isfunction
+from pathlib import Path
+from time import perf_counter_ns
+
+from tetris_logic import Tetris, Board, BitBoard, Block
+
+
+PROFILED_CLASSES = (Tetris, Board, BitBoard, Block)
+
+# Frame samples kept per frontend, the oldest being dropped first
+MAX_FRAME_SAMPLES = 100000
+FRAME_PERCENTILES = (50, 95, 99)
+
+
+def get_percentile(samples, percentile):
+    """
+    Gets a percentile of some samples, by the nearest rank.
+
+    Args:
+        samples (list): The samples, sorted.
+        percentile (float): The percentile, from 0 to 100.
+
+    Returns:
+        float: The sample at that percentile.
+    """
+    rank = max(0, min(len(samples) - 1, round(percentile/100*len(samples)) - 1))
+    return samples[rank]
+
+
+class Profiler:
+    """
+    Counts calls and wall time of the methods of the profiled classes, and collects frame times.
+
+    Attributes:
+        classes (tuple): The classes whose methods are profiled.
+        max_frames (int): The number of frame samples kept per frontend.
+        stats (dict): Maps 'Class.method' to [calls, total ns, self ns]. Total time includes the profiled methods
+            it calls and self time doesn't.
+        frames (dict): Maps the name of each frontend to a deque of its frame times in ns.
+        originals (list): The (class, name, function) of every wrapped method, for disable to restore.
+        stack (list): The time spent in profiled calls made by each profiled call in progress, innermost last.
+    """
+
+    def __init__(self, classes=PROFILED_CLASSES, max_frames=MAX_FRAME_SAMPLES):
+        self.classes = classes
+        self.max_frames = max_frames
+        self.stats = {}
+        self.frames = {}
+        self.originals = []
+        self.stack = []
+
+
+    def wrap(self, name, method):
+        """
+        Wraps a method so that its calls and time are counted.
+
+        Args:
+            name (str): The name to count it under.
+            method (function): The method.
+
+        Returns:
+            function: The wrapper.
+        """
+        stats = self.stats.setdefault(name, [0, 0, 0])
+        stack = self.stack
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            # Each call on the stack adds up the time of the profiled calls it makes
+            stack.append(0)
+            start = perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = perf_counter_ns() - start
+                children = stack.pop()
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] += elapsed - children
+                if stack:
+                    stack[-1] += elapsed
+        return wrapper
+
+
+    def enable(self):
+        """
+        Wraps every public method defined on the profiled classes. Inherited methods are counted under the class
+        that defines them.
+        """
+        if self.originals:
+            return
+        for cls in self.classes:
+            for name, attribute in list(vars(cls).items()):
+                if (name.startswith('_') or not isfunction(attribute)):
+                    continue
+                self.originals.append((cls, name, attribute))
+                setattr(cls, name, self.wrap(f'{cls.__name__}.{name}', attribute))
+
+
+    def disable(self):
+        """
+        Restores the original methods. The counts so far are kept.
+        """
+        for cls, name, attribute in self.originals:
+            setattr(cls, name, attribute)
+        self.originals = []
+
+
+    def add_frame(self, frontend, seconds):
+        """
+        Records how long a frame took.
+
+        Args:
+            frontend (str): The name of the frontend.
+            seconds (float): The frame time.
+        """
+        if frontend not in self.frames:
+            self.frames[frontend] = deque(maxlen=self.max_frames)
+        self.frames[frontend].append(int(seconds*1e9))
+
+
+    def get_report(self):
+        """
+        Gets the counts and frame statistics so far.
+
+        Returns:
+            dict: 'methods', a list of each called method's calls and times, most self time first, and 'frames',
+                the count, mean, percentiles and maximum of each frontend's frame times, in ms.
+        """
+        methods = [{
+            'name': name,
+            'calls': calls,
+            'total_ms': round(total/1e6, 3),
+            'self_ms': round(self_time/1e6, 3),
+            'mean_us': round(total/calls/1e3, 3)
+        } for name, (calls, total, self_time) in self.stats.items() if calls]
+        methods.sort(key=lambda method: method['self_ms'], reverse=True)
+
+        frames = {}
+        for frontend, samples in self.frames.items():
+            if not samples:
+                continue
+            samples = sorted(samples)
+            frames[frontend] = {'count': len(samples), 'mean_ms': round(sum(samples)/len(samples)/1e6, 3)}
+            for percentile in FRAME_PERCENTILES:
+                frames[frontend][f'p{percentile}_ms'] = round(get_percentile(samples, percentile)/1e6, 3)
+            frames[frontend]['max_ms'] = round(samples[-1]/1e6, 3)
+        return {'methods': methods, 'frames': frames}
+
+
+    def write_report(self, path):
+        """
+        Writes the report as JSON, and as a table to the same path with a .txt suffix.
+
+        Args:
+            path (str): The JSON file to write.
+        """
+        report = self.get_report()
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+        Path(path).with_suffix('.txt').write_text(format_report(report))
+
+
+    def install_signal_handler(self, path):
+        """
+        Writes the report to a path whenever the process gets SIGUSR1. Does nothing where there is no SIGUSR1.
+
+        Args:
+            path (str): The JSON file to write.
+        """
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.write_report(path))
+
+
+def format_report(report):
+    """
+    Formats a report as readable tables.
+
+    Args:
+        report (dict): The report, from Profiler.get_report.
+
+    Returns:
+        str: The tables.
+    """
+    lines = [f'{"method":<36}{"calls":>10}{"total ms":>12}{"self ms":>12}{"mean µs":>12}']
+    for method in report['methods']:
+        lines.append(f'{method["name"]:<36}{method["calls"]:>10}{method["total_ms"]:>12.3f}'
+                     f'{method["self_ms"]:>12.3f}{method["mean_us"]:>12.3f}')
+    if report['frames']:
+        columns = ['count', 'mean_ms'] + [f'p{percentile}_ms' for percentile in FRAME_PERCENTILES] + ['max_ms']
+        lines.append('')
+        lines.append(f'{"frames":<12}' + ''.join(f'{column:>12}' for column in columns))
+        for frontend, frames in report['frames'].items():
+            lines.append(f'{frontend:<12}{frames["count"]:>12}' +
+                         ''.join(f'{frames[column]:>12.3f}' for column in columns[1:]))
+    return '\n'.join(lines) + '\n'
+
+
+def start_profiling(path):
+    """
+    Enables a profiler for a frontend's --profile option.
+
+    Args:
+        path (str): The JSON file to write the report to on SIGUSR1.
+
+    Returns:
+        Profiler: The enabled profiler.
+    """
+    profiler = Profiler()
+    profiler.enable()
+    profiler.install_signal_handler(path)
+    return profiler
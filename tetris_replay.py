@@ -0,0 +1,194 @@
+"""
+Recording games as timestamped input logs, and replaying them headlessly as fast as possible.
+
+A game is fully determined by its seed, randomizer, queue length and the actions applied to it, gravity and line
+clears included, so a replay ends in exactly the state the recorded game did. The randomizer is recorded by its
+class name, one of the RANDOMIZERS snapshots support, and is rebuilt with its default settings. Replay a recorded game and check it with:
+
+    python tetris_replay.py game.json [--board BitBoard] [--repeat N]
+"""
+import argparse
+import hashlib
+import json
+import sys
+from random import SystemRandom
+from time import perf_counter
+
+from tetris_logic import Tetris, Board, BitBoard, ACTIONS
+from tetris_snapshot import encode_game, RANDOMIZERS
+
+
+REPLAY_VERSION = 2
+BOARD_TYPES = {'Board': Board, 'BitBoard': BitBoard}
+RANDOMIZER_TYPES = {randomizer_type.__name__: randomizer_type for randomizer_type in RANDOMIZERS}
+
+
+def get_random_seed():
+    """
+    Gets a seed for a game that wasn't given one, so that it can still be replayed.
+
+    Returns:
+        int: The seed.
+    """
+    return SystemRandom().getrandbits(32)
+
+
+def get_state_digest(game):
+    """
+    Gets a digest of the whole state of a game, including its random number generator.
+
+    Args:
+        game (Tetris): The game.
+
+    Returns:
+        str: The hex digest of the game's snapshot.
+    """
+    return hashlib.sha256(encode_game(game)).hexdigest()
+
+
+class Recorder:
+    """
+    Applies actions to a game and logs each one with the time it happened.
+
+    Attributes:
+        game (Tetris): The game being recorded.
+        seed (int): The seed the game was created with.
+        start_time (float): The time the recording started, which timestamps are relative to.
+        events (list): The recorded (timestamp, action) pairs, in order.
+    """
+
+    def __init__(self, game, seed, start_time=0):
+        self.game = game
+        self.seed = seed
+        self.start_time = start_time
+        self.events = []
+
+
+    def apply_action(self, action, now):
+        """
+        Applies an action to the game and records it.
+
+        Args:
+            action (str): One of ACTIONS.
+            now (float): The current time, in seconds.
+        """
+        self.game.apply_action(action)
+        self.events.append((round(now - self.start_time, 6), action))
+
+
+    def get_record(self):
+        """
+        Gets the recording, with the final state of the game for replays to check against.
+
+        Returns:
+            dict: The recording.
+        """
+        return {
+            'version': REPLAY_VERSION,
+            'seed': self.seed,
+            'width': self.game.width,
+            'height': self.game.height - 6,
+            'randomizer': type(self.game.randomizer).__name__,
+            'queue_length': len(self.game.queue),
+            'events': self.events,
+            'score': self.game.score,
+            'final_state': get_state_digest(self.game)
+        }
+
+
+    def save(self, path):
+        """
+        Writes the recording to a JSON file.
+
+        Args:
+            path (str): The file to write.
+        """
+        with open(path, 'w') as file:
+            json.dump(self.get_record(), file)
+
+
+def load_record(path):
+    """
+    Reads a recording from a JSON file.
+
+    Args:
+        path (str): The file to read.
+
+    Returns:
+        dict: The recording.
+
+    Raises:
+        ValueError: If the recording is from an unsupported version, or has an unknown randomizer or actions.
+    """
+    with open(path) as file:
+        record = json.load(file)
+    if (record['version'] != REPLAY_VERSION):
+        raise ValueError(f'Unsupported replay version {record["version"]}.')
+    if (record['randomizer'] not in RANDOMIZER_TYPES):
+        raise ValueError(f'Unknown randomizer {record["randomizer"]}.')
+    unknown = {action for _, action in record['events']} - set(ACTIONS)
+    if unknown:
+        raise ValueError(f'Unknown actions {", ".join(sorted(unknown))}.')
+    return record
+
+
+def replay(record, board_type=Board):
+    """
+    Replays a recording without waiting between actions.
+
+    Args:
+        record (dict): The recording.
+        board_type (type): The board class to use.
+
+    Returns:
+        Tetris: The game, in its final state.
+    """
+    randomizer = RANDOMIZER_TYPES[record['randomizer']](record['seed'])
+    game = Tetris(record['width'], record['height'], board_type, randomizer=randomizer,
+                  queue_length=record['queue_length'])
+    apply_action = game.apply_action
+    for _, action in record['events']:
+        apply_action(action)
+    return game
+
+
+def verify(record, game):
+    """
+    Checks that a replayed game ended in the recorded final state.
+
+    Args:
+        record (dict): The recording.
+        game (Tetris): The replayed game.
+
+    Returns:
+        bool: Whether the states match.
+    """
+    return get_state_digest(game) == record['final_state']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a recorded game as fast as possible and check its final state.')
+    parser.add_argument('path', help='recording written with --record')
+    parser.add_argument('--board', choices=BOARD_TYPES, default='Board', help='board class to replay with')
+    parser.add_argument('--repeat', type=int, default=1, help='times to replay, for timing')
+    args = parser.parse_args(argv)
+
+    record = load_record(args.path)
+    times = []
+    for _ in range(args.repeat):
+        start = perf_counter()
+        game = replay(record, BOARD_TYPES[args.board])
+        times.append(perf_counter() - start)
+
+    n_events = len(record['events'])
+    best = min(times)
+    print(f'Replayed {n_events} events in {best*1000:.2f} ms ({n_events/best:,.0f} events/s), score {game.score}')
+    if (not verify(record, game)):
+        print(f'Final state does not match the recording (score {game.score}, recorded {record["score"]})')
+        return 1
+    print('Final state matches the recording')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Schedulers for game logic.
+
+FixedTimestep runs game logic at the same rate however fast frames are drawn. Each frame, the time since the last
+frame is added to an accumulator, and the logic is ticked once for every whole tick that has built up. Frames drawn
+faster than the tick rate run no ticks, and slower frames run several.
+
+TimerWheel runs the gravity and lock deadlines of many games from one clock. Timers are hashed into a ring of slots
+by the tick they are due on, so scheduling and cancelling take constant time, and each tick only looks at the
+timers in one slot. A callback that raises is logged and dropped, along with calling its timer's error handler, so
+one failing timer can't stop the others.
+"""
+import logging
+from math import ceil
+
+
+# Slots in a timer wheel. Timers due more than a full turn of the wheel ahead wait in their slot for later turns.
+WHEEL_SLOTS = 256
+
+logger = logging.getLogger(__name__)
+
+
+class FixedTimestep:
+    """
+    Counts how many fixed length ticks are due at each frame.
+
+    Attributes:
+        tick_time (float): The length of a tick, in seconds.
+        max_ticks (int): The most ticks run in one frame. If more are due, after a long stall, the rest are dropped
+            so that the logic doesn't fall further and further behind.
+        last_time (float): The time of the last frame, or None before the first.
+        accumulator (float): The time built up since the last tick.
+    """
+
+    def __init__(self, tick_rate, max_ticks):
+        self.tick_time = 1/tick_rate
+        self.max_ticks = max_ticks
+        self.last_time = None
+        self.accumulator = 0.0
+
+
+    def reset(self, now):
+        """
+        Starts counting from now, dropping any time built up.
+
+        Args:
+            now (float): The current time, in seconds.
+        """
+        self.last_time = now
+        self.accumulator = 0.0
+
+
+    def advance(self, now):
+        """
+        Adds the time since the last frame and takes the ticks that are due.
+
+        Args:
+            now (float): The current time, in seconds.
+
+        Returns:
+            int: The number of ticks to run.
+        """
+        if (self.last_time is None):
+            self.reset(now)
+            return 0
+        self.accumulator += now - self.last_time
+        self.last_time = now
+        ticks = int(self.accumulator/self.tick_time)
+        if (ticks > self.max_ticks):
+            self.accumulator = 0.0
+            return self.max_ticks
+        self.accumulator -= ticks*self.tick_time
+        return ticks
+
+
+
+class Timer:
+    """
+    A callback scheduled on a TimerWheel.
+
+    Attributes:
+        tick (int): The tick the timer is due on.
+        callback (function): The function to call, or None once the timer has been cancelled.
+        on_error (function): The function to call, with no arguments, if the callback raises, or None.
+    """
+
+    __slots__ = ('tick', 'callback', 'on_error')
+
+    def __init__(self, tick, callback, on_error=None):
+        self.tick = tick
+        self.callback = callback
+        self.on_error = on_error
+
+
+    def cancel(self):
+        """
+        Stops the timer from firing. Cancelled timers are dropped when the wheel next reaches their slot.
+        """
+        self.callback = None
+
+
+class TimerWheel:
+    """
+    Calls scheduled callbacks once their deadlines have passed, to the nearest tick.
+
+    Attributes:
+        tick_time (float): The length of a tick, in seconds.
+        slots (list): The timers hashed by the tick they are due on.
+        start (float): The time of tick 0.
+        tick (int): The last tick that has been run.
+    """
+
+    def __init__(self, tick_time, now, n_slots=WHEEL_SLOTS):
+        self.tick_time = tick_time
+        self.slots = [[] for _ in range(n_slots)]
+        self.start = now
+        self.tick = 0
+
+
+    def schedule(self, delay, callback, on_error=None):
+        """
+        Schedules a callback. It is called on the first tick at or after the delay, and never on the current tick.
+
+        Args:
+            delay (float): The delay from the last tick run, in seconds.
+            callback (function): The function to call, with no arguments.
+            on_error (function): The function to call, with no arguments, if the callback raises. The error is
+                logged either way, and the wheel carries on.
+
+        Returns:
+            Timer: The timer, which can be cancelled.
+        """
+        timer = Timer(self.tick + max(1, ceil(delay/self.tick_time)), callback, on_error)
+        self.slots[timer.tick % len(self.slots)].append(timer)
+        return timer
+
+
+    def advance(self, now):
+        """
+        Runs every tick up to now, calling the timers that are due on each. Callbacks may schedule more timers.
+        A callback that raises is logged and its error handler called, and the rest still run.
+
+        Args:
+            now (float): The current time, in seconds.
+
+        Returns:
+            int: The number of callbacks called.
+        """
+        fired = 0
+        n_slots = len(self.slots)
+        target = int((now - self.start)/self.tick_time)
+        while self.tick < target:
+            self.tick += 1
+            tick = self.tick
+            index = tick % n_slots
+            slot = self.slots[index]
+            if not slot:
+                continue
+            waiting = []
+            self.slots[index] = waiting
+            for timer in slot:
+                if timer.callback is None:
+                    continue
+                if timer.tick > tick:
+                    waiting.append(timer)
+                    continue
+                callback = timer.callback
+                timer.callback = None
+                fired += 1
+                try:
+                    callback()
+                except Exception:
+                    logger.exception('Timer callback %r failed', callback)
+                    if timer.on_error is not None:
+                        self.handle_error(timer.on_error)
+        return fired
+
+
+    def handle_error(self, on_error):
+        """
+        Calls a timer's error handler, logging anything it raises in turn.
+
+        Args:
+            on_error (function): The error handler.
+        """
+        try:
+            on_error()
+        except Exception:
+            logger.exception('Timer error handler %r failed', on_error)
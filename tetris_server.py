@@ -0,0 +1,513 @@
+"""
+Hosts versus games over TCP, running every session in one asyncio event loop.
+
+    python tetris_server.py [--host 127.0.0.1] [--port 7777] [--seed N] [--report SECONDS]
+
+Each connection is a player. Players are paired in the order they connect, and both players of a match get the
+same seed. The server owns the games: it applies the players' inputs, and runs gravity and lock delays for every
+session from one shared timer wheel. Clearing two or more lines sends garbage to the opponent, which first cancels
+any garbage waiting for the sender, and the rest is added to the bottom of the opponent's board when their next
+block locks. When a player tops out or disconnects the match ends, and the players still connected are paired again.
+A timer that raises is logged and only its own session is closed, as if the player had disconnected.
+
+Messages are a type byte followed by fixed fields, little endian:
+
+    INPUT    client  B action, H sequence
+    START    server  Q seed
+    ACK      server  B action, H sequence, I version
+    REJECT   server  H sequence
+    APPLIED  server  B action, I version
+    GARBAGE  server  B count, B hole, I version
+    END      server  B won, I score
+
+Actions are indices into ACTIONS in tetris_logic. Each input is answered with an ACK once it has been applied, or a
+REJECT if there is no game running or the action isn't one a player can send. Everything else the server does to a
+game, gravity, locking, clearing lines and garbage, is sent as APPLIED or GARBAGE, in the order it happened. A client
+that seeds a Tetris with START and applies every ACK, APPLIED and GARBAGE to it in order has the same game as the
+server, and the version in each message is the game's version afterwards, for checking that it does.
+"""
+import argparse
+import asyncio
+import struct
+import sys
+from random import Random
+from time import process_time
+
+from tetris_logic import Tetris, ACTIONS
+from tetris_replay import get_random_seed
+from tetris_scheduler import TimerWheel
+
+
+HOST = '127.0.0.1'
+PORT = 7777
+TICK_TIME = 0.005   # Resolution of gravity and lock deadlines, in seconds
+
+ACTION_IDS = {action: i for i, action in enumerate(ACTIONS)}
+PLAYER_ACTIONS = ('LEFT', 'RIGHT', 'ROTATE_CW', 'ROTATE_CCW', 'SOFT_DROP', 'HARD_DROP', 'HOLD')
+PLAYER_ACTION_IDS = frozenset(ACTION_IDS[action] for action in PLAYER_ACTIONS)
+
+INPUT = 1
+START = 2
+ACK = 3
+REJECT = 4
+APPLIED = 5
+GARBAGE = 6
+END = 7
+
+MESSAGES = {
+    INPUT: struct.Struct('<BBH'),
+    START: struct.Struct('<BQ'),
+    ACK: struct.Struct('<BBHI'),
+    REJECT: struct.Struct('<BH'),
+    APPLIED: struct.Struct('<BBI'),
+    GARBAGE: struct.Struct('<BBBI'),
+    END: struct.Struct('<BBI')
+}
+
+# Garbage lines sent for clearing 1 to 4 lines at once, and the extra line for a back to back tetris
+GARBAGE_LINES = (0, 0, 1, 2, 4)
+B2B_GARBAGE_LINES = 1
+
+
+def get_garbage_lines(count, b2b):
+    """
+    Gets the number of garbage lines a clear sends.
+
+    Args:
+        count (int): The number of lines cleared.
+        b2b (int): The back to back chain after the clear, as in a LINES_CLEARED event.
+
+    Returns:
+        int: The number of garbage lines.
+    """
+    lines = GARBAGE_LINES[count]
+    if (count == 4 and b2b > 0):
+        lines += B2B_GARBAGE_LINES
+    return lines
+
+
+class Session(asyncio.Protocol):
+    """
+    A player's connection, and their game while they are in a match.
+
+    Attributes:
+        server (TetrisServer): The server.
+        transport (Transport): The connection.
+        buffer (bytes): Received bytes that don't make up a whole message yet.
+        outgoing (list): Messages waiting to be written, so that everything one input or timer causes is sent at once.
+        game (Tetris): The game, or None when not in a match.
+        opponent (Session): The other player in the match.
+        pending_garbage (list): The [count, hole] of each attack waiting to be added when the next block locks.
+        gravity_timer (Timer): The next gravity step.
+        lock_timer (Timer): The lock delay of a landed block, or None when the block hasn't landed.
+        locked (bool): Whether a block locked during the action being applied.
+        lines_to_clear (bool): Whether the last locked block left full lines.
+        topped_out (bool): Whether the game is over.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = b''
+        self.outgoing = []
+        self.game = None
+        self.opponent = None
+        self.pending_garbage = []
+        self.gravity_timer = None
+        self.lock_timer = None
+        self.locked = False
+        self.lines_to_clear = False
+        self.topped_out = False
+
+
+    def connection_made(self, transport):
+        """
+        Joins the server when a player connects.
+
+        Args:
+            transport (Transport): The connection.
+        """
+        self.transport = transport
+        self.server.join(self)
+
+
+    def connection_lost(self, exc):
+        """
+        Leaves the server when the connection closes.
+
+        Args:
+            exc (Exception): The error that closed it, or None.
+        """
+        self.server.leave(self)
+
+
+    def data_received(self, data):
+        """
+        Applies every whole input that has arrived, then sends the replies together.
+
+        Args:
+            data (bytes): The bytes received.
+        """
+        buffer = self.buffer + data if self.buffer else data
+        message = MESSAGES[INPUT]
+        end = len(buffer) - len(buffer) % message.size
+        for message_type, action_id, sequence in message.iter_unpack(buffer[:end]):
+            if (message_type != INPUT):
+                self.transport.close()
+                return
+            self.handle_input(action_id, sequence)
+        self.buffer = buffer[end:]
+        self.flush()
+
+
+    def send(self, message_type, *fields):
+        """
+        Queues a message to be written at the next flush.
+
+        Args:
+            message_type (int): The type of message.
+            *fields: The fields of the message.
+        """
+        self.outgoing.append(MESSAGES[message_type].pack(message_type, *fields))
+
+
+    def flush(self):
+        """
+        Writes the queued messages.
+        """
+        if (self.outgoing and self.transport is not None and not self.transport.is_closing()):
+            self.transport.write(b''.join(self.outgoing))
+        self.outgoing.clear()
+
+
+    def start_game(self, opponent, seed):
+        """
+        Starts a match.
+
+        Args:
+            opponent (Session): The other player.
+            seed (int): The seed of the game.
+        """
+        self.game = Tetris(seed=seed)
+        self.game.add_listener(self.handle_game_event)
+        self.opponent = opponent
+        self.pending_garbage = []
+        self.locked = False
+        self.lines_to_clear = False
+        self.topped_out = False
+        self.send(START, seed)
+        self.schedule_gravity()
+
+
+    def end_game(self, won):
+        """
+        Ends the match, stopping the timers and sending the result.
+
+        Args:
+            won (bool): Whether this player won.
+        """
+        self.cancel_timers()
+        self.send(END, won, self.game.score)
+        self.game = None
+        self.opponent = None
+        self.pending_garbage = []
+        self.flush()
+
+
+    def cancel_timers(self):
+        """
+        Cancels the gravity and lock timers.
+        """
+        if self.gravity_timer is not None:
+            self.gravity_timer.cancel()
+            self.gravity_timer = None
+        if self.lock_timer is not None:
+            self.lock_timer.cancel()
+            self.lock_timer = None
+
+
+    def abort(self):
+        """
+        Closes the connection after one of its timers raised. The server leaves the session when it has closed.
+        """
+        self.cancel_timers()
+        if (self.transport is not None and not self.transport.is_closing()):
+            self.transport.close()
+
+
+    def handle_game_event(self, event):
+        """
+        Notes the results of a lock, and sends garbage for clears. Actions are applied once the action that caused
+        the event is finished, by settle.
+
+        Args:
+            event (GameEvent): The event.
+        """
+        if (event.type == 'PIECE_LOCKED'):
+            self.locked = True
+            self.lines_to_clear = event.full_lines > 0
+        elif (event.type == 'LINES_CLEARED'):
+            self.attack(get_garbage_lines(event.count, event.b2b))
+        elif (event.type == 'GAME_OVER'):
+            self.topped_out = True
+
+
+    def attack(self, lines):
+        """
+        Sends garbage to the opponent, after cancelling any garbage waiting for this player.
+
+        Args:
+            lines (int): The number of garbage lines.
+        """
+        pending = self.pending_garbage
+        while (lines and pending):
+            cancelled = min(lines, pending[0][0])
+            lines -= cancelled
+            pending[0][0] -= cancelled
+            if not pending[0][0]:
+                pending.pop(0)
+        if (lines and self.opponent is not None):
+            self.opponent.pending_garbage.append([lines, self.server.rng.randrange(self.game.width)])
+
+
+    def apply(self, action):
+        """
+        Applies an action the server made, telling the player.
+
+        Args:
+            action (str): One of ACTIONS.
+        """
+        self.game.apply_action(action)
+        self.send(APPLIED, ACTION_IDS[action], self.game.version)
+
+
+    def handle_input(self, action_id, sequence):
+        """
+        Applies an input from the player and acknowledges it.
+
+        Args:
+            action_id (int): The index of the action in ACTIONS.
+            sequence (int): The player's number for the input, sent back in the reply.
+        """
+        if (self.game is None or action_id not in PLAYER_ACTION_IDS):
+            self.send(REJECT, sequence)
+            return
+        self.server.inputs += 1
+        self.game.apply_action(ACTIONS[action_id])
+        self.send(ACK, action_id, sequence, self.game.version)
+        # Moving a block that has landed gives it the whole lock delay again, like the terminal frontend
+        if self.lock_timer is not None:
+            self.lock_timer.cancel()
+            self.lock_timer = None
+        if (action_id == ACTION_IDS['SOFT_DROP']):
+            self.schedule_gravity()
+        self.settle()
+
+
+    def settle(self):
+        """
+        Finishes off a lock: clears full lines, adds the garbage that was waiting, and ends the match on a top out.
+        """
+        if self.lines_to_clear:
+            self.lines_to_clear = False
+            self.apply('CLEAR')
+        if self.locked:
+            self.locked = False
+            self.schedule_gravity()
+            while (self.pending_garbage and not self.topped_out):
+                count, hole = self.pending_garbage.pop(0)
+                self.game.add_garbage(count, hole)
+                self.send(GARBAGE, count, hole, self.game.version)
+        if self.topped_out:
+            self.server.end_match(self)
+
+
+    def schedule_gravity(self):
+        """
+        Restarts the wait for the next gravity step, using the interval for the current level.
+        """
+        if self.gravity_timer is not None:
+            self.gravity_timer.cancel()
+        self.gravity_timer = self.server.wheel.schedule(self.game.get_move_time_interval(), self.handle_gravity,
+                                                       self.abort)
+
+
+    def handle_gravity(self):
+        """
+        Moves the block down, or starts the lock delay if it has landed.
+        """
+        self.gravity_timer = None
+        self.schedule_gravity()
+        game = self.game
+        if not game.check_y_collision(game.current_block):
+            self.apply('SOFT_DROP')
+            self.flush()
+        elif self.lock_timer is None:
+            self.lock_timer = self.server.wheel.schedule(game.get_lock_time_interval(), self.handle_lock, self.abort)
+
+
+    def handle_lock(self):
+        """
+        Locks a block whose lock delay has run out.
+        """
+        self.lock_timer = None
+        self.apply('LOCK')
+        self.settle()
+        self.flush()
+
+
+class TetrisServer:
+    """
+    Pairs up players and runs the timers of their games.
+
+    Attributes:
+        wheel (TimerWheel): The gravity and lock timers of every session.
+        rng (Random): The random number generator for seeds and garbage holes.
+        sessions (set): The connected sessions.
+        waiting (Session): A session waiting for an opponent, or None.
+        inputs (int): The number of inputs applied.
+        matches (int): The number of matches finished.
+    """
+
+    def __init__(self, now, seed=None):
+        self.wheel = TimerWheel(TICK_TIME, now)
+        self.rng = Random(get_random_seed() if seed is None else seed)
+        self.sessions = set()
+        self.waiting = None
+        self.inputs = 0
+        self.matches = 0
+
+
+    def join(self, session):
+        """
+        Adds a new connection and looks for an opponent for it.
+
+        Args:
+            session (Session): The session.
+        """
+        self.sessions.add(session)
+        self.find_match(session)
+
+
+    def leave(self, session):
+        """
+        Removes a closed connection. Its opponent wins.
+
+        Args:
+            session (Session): The session.
+        """
+        self.sessions.discard(session)
+        if self.waiting is session:
+            self.waiting = None
+        if session.game is not None:
+            session.cancel_timers()
+            session.game = None
+            opponent = session.opponent
+            session.opponent = None
+            if opponent is not None:
+                self.matches += 1
+                opponent.end_game(True)
+                self.find_match(opponent)
+
+
+    def find_match(self, session):
+        """
+        Starts a match between a session and the one waiting, or leaves it waiting.
+
+        Args:
+            session (Session): The session, which isn't in a match.
+        """
+        if (self.waiting is None or self.waiting is session):
+            self.waiting = session
+            return
+        opponent = self.waiting
+        self.waiting = None
+        seed = self.rng.getrandbits(32)
+        opponent.start_game(session, seed)
+        session.start_game(opponent, seed)
+        opponent.flush()
+        session.flush()
+
+
+    def end_match(self, loser):
+        """
+        Ends a match that a player lost by topping out, and pairs the players again.
+
+        Args:
+            loser (Session): The player who topped out.
+        """
+        self.matches += 1
+        winner = loser.opponent
+        loser.end_game(False)
+        if winner is not None:
+            winner.end_game(True)
+        for session in (loser, winner):
+            if (session is not None and session in self.sessions):
+                self.find_match(session)
+
+
+    async def run_timers(self):
+        """
+        Advances the timer wheel every tick, forever. A session whose timer raises is closed, and the rest play on.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.wheel.tick_time)
+            self.wheel.advance(loop.time())
+
+
+    async def report(self, interval):
+        """
+        Prints the number of sessions, the inputs applied and the CPU used at each interval, forever.
+
+        Args:
+            interval (float): The time between reports, in seconds.
+        """
+        loop = asyncio.get_running_loop()
+        last_time, last_cpu, last_inputs = loop.time(), process_time(), self.inputs
+        while True:
+            await asyncio.sleep(interval)
+            now, cpu = loop.time(), process_time()
+            playing = sum(session.game is not None for session in self.sessions)
+            print(f'{len(self.sessions)} sessions, {playing} playing, {self.matches} matches, '
+                  f'{(self.inputs - last_inputs)/(now - last_time):,.0f} inputs/s, '
+                  f'{(cpu - last_cpu)/(now - last_time)*100:.0f}% CPU', flush=True)
+            last_time, last_cpu, last_inputs = now, cpu, self.inputs
+
+
+async def serve(host=HOST, port=PORT, seed=None, report_interval=None):
+    """
+    Runs a server until it is cancelled.
+
+    Args:
+        host (str): The address to listen on.
+        port (int): The port to listen on.
+        seed (int): The seed for the server's random number generator, random if None.
+        report_interval (float): The time between printed reports, in seconds, or None for no reports.
+    """
+    loop = asyncio.get_running_loop()
+    server = TetrisServer(loop.time(), seed)
+    listener = await loop.create_server(lambda: Session(server), host, port)
+    tasks = [server.run_timers()]
+    if report_interval:
+        tasks.append(server.report(report_interval))
+    async with listener:
+        await asyncio.gather(*tasks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=HOST, help=f'address to listen on (default {HOST})')
+    parser.add_argument('--port', type=int, default=PORT, help=f'port to listen on (default {PORT})')
+    parser.add_argument('--seed', type=int, help='seed for the game seeds and garbage holes, random if not given')
+    parser.add_argument('--report', type=float, metavar='SECONDS', help='print the load every SECONDS')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.seed, args.report))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
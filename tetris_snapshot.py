@@ -0,0 +1,261 @@
+"""
+Compact binary snapshots of Tetris games, for checkpointing and restoring them.
+
+Layout of a version 2 snapshot, little endian:
+
+    header    B version, B width, B height (including the hidden rows), B flags
+    score     I score, B previous clear
+    board     one occupancy bit per cell, row by row from the top, bit x of each row being column x
+    colours   3 bits per filled cell, in the same order, holding the id of the shape the cell came from, or 7 for
+              garbage
+    current   piece
+    held      piece, if FLAG_HELD is set
+    queue     H length, then that many pieces
+    bag       H length, then that many B shape ids: the randomizer's shapes from Randomizer.get_shapes, such as
+              the rest of the bag, popped from the end
+    rng       625 I of the randomizer's Mersenne Twister state, then d gauss_next if FLAG_GAUSS is set, if FLAG_RNG
+              is set
+
+The randomizer is the RANDOMIZERS entry in bits 4 and 5 of the flags, 0 being the 7-bag, and is restored with its
+default settings. FLAG_TOPPED_OUT, bit 6, is set when garbage pushed the board into the current block and it
+couldn't move out of the way, which ends the game. Version 1 snapshots, which had no randomizer bits, always held
+a 7-bag and had B lengths, are not read.
+
+A piece is B shape id, B orientation, b x, b y, where (x, y) is the offset of the block's coords from the base
+coords of its orientation.
+"""
+import struct
+from collections import deque
+
+from tetris_logic import Tetris, Board, Block, BagRandomizer, RandomRandomizer, HistoryRandomizer, SHAPES, GARBAGE
+
+
+SNAPSHOT_VERSION = 2
+
+SHAPE_NAMES = list(SHAPES.keys())
+SHAPE_IDS = {shape_name: i for i, shape_name in enumerate(SHAPE_NAMES)}
+CELL_NAMES = SHAPE_NAMES + [GARBAGE]
+CELL_IDS = {cell: i for i, cell in enumerate(CELL_NAMES)}
+COLOUR_BITS = 3
+
+FLAG_HELD = 1
+FLAG_JUST_HELD = 2
+FLAG_RNG = 4
+FLAG_GAUSS = 8
+RANDOMIZER_SHIFT = 4
+RANDOMIZER_MASK = 3
+FLAG_TOPPED_OUT = 64
+RANDOMIZERS = [BagRandomizer, RandomRandomizer, HistoryRandomizer]
+
+HEADER = struct.Struct('<BBBBIB')
+PIECE = struct.Struct('<BBbb')
+RNG_STATE = struct.Struct('<625I')
+GAUSS = struct.Struct('<d')
+LENGTH = struct.Struct('<H')
+
+
+def encode_piece(block):
+    """
+    Encodes a block as a piece.
+
+    Args:
+        block (Block): The block.
+
+    Returns:
+        bytes: The encoded piece.
+    """
+    return PIECE.pack(SHAPE_IDS[block.shape_name], block.orientation, block.x, block.y)
+
+
+def decode_piece(data, offset):
+    """
+    Decodes a piece into a block.
+
+    Args:
+        data (bytes): The snapshot.
+        offset (int): Where the piece starts.
+
+    Returns:
+        Block: The block.
+    """
+    shape_id, orientation, x, y = PIECE.unpack_from(data, offset)
+    block = Block(SHAPE_NAMES[shape_id])
+    block.set_position(orientation, x, y)
+    return block
+
+
+def encode_board(board):
+    """
+    Encodes the cells of a board as occupancy bits followed by the colour plane.
+
+    Args:
+        board (Board): The board.
+
+    Returns:
+        bytes: The encoded board.
+    """
+    width = board.width
+    occupancy = 0
+    colours = 0
+    shift = 0
+    for y, row in enumerate(board.board):
+        if (row.count(0) == width):
+            continue
+        for x, cell in enumerate(row):
+            if cell:
+                occupancy |= 1 << (y*width + x)
+                colours |= CELL_IDS[cell] << shift
+                shift += COLOUR_BITS
+
+    return (occupancy.to_bytes((width*board.height + 7)//8, 'little') +
+            colours.to_bytes((shift + 7)//8, 'little'))
+
+
+def decode_board(data, offset, width, height):
+    """
+    Decodes the cells of a board.
+
+    Args:
+        data (bytes): The snapshot.
+        offset (int): Where the board starts.
+        width (int): The width of the board.
+        height (int): The height of the board.
+
+    Returns:
+        tuple: The 2D list of cells, and the offset after the board.
+    """
+    end = offset + (width*height + 7)//8
+    occupancy = int.from_bytes(data[offset:end], 'little')
+    colours_end = end + (occupancy.bit_count()*COLOUR_BITS + 7)//8
+    colours = int.from_bytes(data[end:colours_end], 'little')
+
+    colour_mask = (1 << COLOUR_BITS) - 1
+    row_mask = (1 << width) - 1
+    cells = []
+    for y in range(height):
+        row = [0] * width
+        mask = occupancy >> y*width & row_mask
+        while mask:
+            low_bit = mask & -mask
+            row[low_bit.bit_length() - 1] = CELL_NAMES[colours & colour_mask]
+            colours >>= COLOUR_BITS
+            mask ^= low_bit
+        cells.append(row)
+    return cells, colours_end
+
+
+def encode_game(game, include_rng=True):
+    """
+    Encodes a game as a snapshot.
+
+    Args:
+        game (Tetris): The game.
+        include_rng (bool): Whether to include the random number generator's state, which is most of the snapshot.
+            Without it, a restored game draws different bags once its current bag runs out.
+
+    Returns:
+        bytes: The snapshot.
+
+    Raises:
+        ValueError: If the game's randomizer isn't one of RANDOMIZERS.
+    """
+    if (type(game.randomizer) not in RANDOMIZERS):
+        raise ValueError(f'Cannot snapshot a game using {type(game.randomizer).__name__}.')
+    flags = RANDOMIZERS.index(type(game.randomizer)) << RANDOMIZER_SHIFT
+    if (game.held_block is not None):
+        flags |= FLAG_HELD
+    if (game.just_held):
+        flags |= FLAG_JUST_HELD
+    if (game.topped_out):
+        flags |= FLAG_TOPPED_OUT
+    if (include_rng):
+        _, state, gauss_next = game.randomizer.rng.getstate()
+        flags |= FLAG_RNG
+        if (gauss_next is not None):
+            flags |= FLAG_GAUSS
+
+    parts = [HEADER.pack(SNAPSHOT_VERSION, game.width, game.height, flags, game.score, game.prev_clear),
+             encode_board(game.board),
+             encode_piece(game.current_block)]
+    if (flags & FLAG_HELD):
+        parts.append(encode_piece(game.held_block))
+    parts.append(LENGTH.pack(len(game.queue)))
+    parts += [encode_piece(block) for block in game.queue]
+    shapes = game.randomizer.get_shapes()
+    parts.append(LENGTH.pack(len(shapes)))
+    parts.append(bytes([SHAPE_IDS[shape_name] for shape_name in shapes]))
+    if (flags & FLAG_RNG):
+        parts.append(RNG_STATE.pack(*state))
+        if (flags & FLAG_GAUSS):
+            parts.append(GAUSS.pack(gauss_next))
+    return b''.join(parts)
+
+
+def decode_game(data, board_type=Board):
+    """
+    Restores a game from a snapshot.
+
+    Args:
+        data (bytes): The snapshot.
+        board_type (type): The board class to use.
+
+    Returns:
+        Tetris: The game. Its randomizer's random number generator is freshly seeded if the snapshot doesn't include
+            its state.
+
+    Raises:
+        ValueError: If the snapshot is from an unsupported version or has trailing bytes.
+    """
+    version, width, height, flags, score, prev_clear = HEADER.unpack_from(data)
+    if (version != SNAPSHOT_VERSION):
+        raise ValueError(f'Unsupported snapshot version {version}.')
+
+    # Built without Tetris.__init__, which would deal a queue only to replace it
+    game = Tetris.__new__(Tetris)
+    game.width = width
+    game.height = height
+    game.board = board_type(width, height)
+    game.score = score
+    game.prev_clear = prev_clear
+    game.just_held = bool(flags & FLAG_JUST_HELD)
+    game.topped_out = bool(flags & FLAG_TOPPED_OUT)
+    game.ghost_block = None
+    game.ghost_key = None
+    game.version = 0
+    game.listeners = []
+
+    cells, offset = decode_board(data, HEADER.size, width, height)
+    game.board.set_cells(cells)
+
+    game.current_block = decode_piece(data, offset)
+    offset += PIECE.size
+    game.held_block = None
+    if (flags & FLAG_HELD):
+        game.held_block = decode_piece(data, offset)
+        offset += PIECE.size
+
+    queue_length, = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    game.queue = deque()
+    for _ in range(queue_length):
+        game.queue.append(decode_piece(data, offset))
+        offset += PIECE.size
+
+    n_shapes, = LENGTH.unpack_from(data, offset)
+    offset += LENGTH.size
+    game.randomizer = RANDOMIZERS[flags >> RANDOMIZER_SHIFT & RANDOMIZER_MASK]()
+    game.randomizer.set_shapes([SHAPE_NAMES[shape_id] for shape_id in data[offset:offset + n_shapes]])
+    offset += n_shapes
+
+    if (flags & FLAG_RNG):
+        state = RNG_STATE.unpack_from(data, offset)
+        offset += RNG_STATE.size
+        gauss_next = None
+        if (flags & FLAG_GAUSS):
+            gauss_next, = GAUSS.unpack_from(data, offset)
+            offset += GAUSS.size
+        game.randomizer.rng.setstate((3, state, gauss_next))
+
+    if (offset != len(data)):
+        raise ValueError(f'Snapshot has {len(data) - offset} unexpected trailing bytes.')
+    return game
@@ -0,0 +1,441 @@
+"""
+Hosts terminal games over TCP, one per connection, for playing with telnet or nc.
+
+    python tetris_terminal_server.py [--host 127.0.0.1] [--port 2323] [--report SECONDS]
+    telnet localhost 2323
+    stty raw -echo; nc localhost 2323; stty sane
+
+The board is drawn like tetris_gui_cmd.py, with the same keys: the arrow keys, z and x. q or Ctrl-C leaves.
+Every game runs in one asyncio event loop, with gravity and lock delays on a shared timer wheel. Frames are only
+drawn when the game's version changes, and only the cells that changed since the last frame are sent, each run of
+them after an ANSI cursor move. A game whose timer raises is logged and closed, and the other games carry on.
+With --report the server prints its frame rate, bytes per frame and CPU per session.
+"""
+import argparse
+import asyncio
+import curses
+import sys
+from time import process_time
+
+from tetris_logic import Tetris
+from tetris_gui_cmd import render_rows, KEY_ACTIONS
+from tetris_replay import get_random_seed
+from tetris_scheduler import TimerWheel
+
+
+HOST = '127.0.0.1'
+PORT = 2323
+TICK_TIME = 0.005   # Resolution of gravity and lock deadlines, in seconds
+
+ESC = 0x1b
+CLEAR_SCREEN = '\x1b[2J\x1b[?25l'
+SHOW_CURSOR = '\x1b[?25h'
+QUIT_KEYS = (3, 4, ord('q'))    # Ctrl-C, Ctrl-D and q
+
+# Final bytes of the arrow key sequences, ESC [ A or ESC O A, as curses key codes
+ESCAPE_KEYS = {ord('A'): curses.KEY_UP, ord('B'): curses.KEY_DOWN, ord('C'): curses.KEY_RIGHT, ord('D'): curses.KEY_LEFT}
+
+# Telnet commands. The server offers to echo and to suppress go ahead, which puts telnet clients in character mode.
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+SE = 240
+ECHO = 1
+SUPPRESS_GO_AHEAD = 3
+TELNET_SETUP = bytes([IAC, WILL, ECHO, IAC, WILL, SUPPRESS_GO_AHEAD])
+
+
+def move_cursor(x, y):
+    """
+    Gets the ANSI sequence that moves the cursor.
+
+    Args:
+        x (int): The column, from 0.
+        y (int): The row, from 0.
+
+    Returns:
+        str: The sequence.
+    """
+    return f'\x1b[{y + 1};{x + 1}H'
+
+
+class AnsiScreen:
+    """
+    Remembers what a remote terminal shows, and draws frames as the changes since the last one.
+
+    Attributes:
+        rows (list): The lines last drawn, or None before the first frame.
+    """
+
+    def __init__(self):
+        self.rows = None
+
+
+    def draw(self, rows):
+        """
+        Gets the bytes that turn the last frame into a new one. The first frame clears the screen first.
+        Changed cells close enough together to be cheaper to redraw than to move the cursor over are sent as one run.
+
+        Args:
+            rows (list): The lines of the new frame.
+
+        Returns:
+            bytes: The ANSI output, empty if nothing changed.
+        """
+        parts = []
+        previous = self.rows
+        if previous is None:
+            parts.append(CLEAR_SCREEN)
+            previous = [' '*len(row) for row in rows]
+        for y, row in enumerate(rows):
+            old = previous[y]
+            if row == old:
+                continue
+            changed = [x for x, (cell, old_cell) in enumerate(zip(row, old)) if cell != old_cell]
+            start = end = changed[0]
+            for x in changed[1:]:
+                # A gap is redrawn if that takes fewer bytes than moving over it
+                if len(row[end + 1:x].encode()) > len(move_cursor(x, y)):
+                    parts.append(move_cursor(start, y) + row[start:end + 1])
+                    start = x
+                end = x
+            parts.append(move_cursor(start, y) + row[start:end + 1])
+        self.rows = list(rows)
+        return ''.join(parts).encode()
+
+
+class KeyParser:
+    """
+    Turns the bytes sent by a telnet client or raw terminal into key codes like getch's, skipping telnet commands.
+
+    Attributes:
+        pending (bytes): The start of a key or command split across reads.
+    """
+
+    def __init__(self):
+        self.pending = b''
+
+
+    def feed(self, data):
+        """
+        Parses the bytes received.
+
+        Args:
+            data (bytes): The bytes.
+
+        Returns:
+            list: The key codes, curses key codes for the arrow keys and byte values for the rest.
+        """
+        data = self.pending + data
+        keys = []
+        i = 0
+        n = len(data)
+        while i < n:
+            byte = data[i]
+            if (byte == IAC):
+                if i + 1 >= n:
+                    break
+                command = data[i + 1]
+                if (command in (WILL, WONT, DO, DONT)):
+                    if i + 2 >= n:
+                        break
+                    i += 3
+                elif (command == SB):
+                    end = data.find(bytes([IAC, SE]), i + 2)
+                    if end < 0:
+                        break
+                    i = end + 2
+                else:
+                    i += 2
+            elif (byte == ESC):
+                if i + 1 >= n or (data[i + 1] in b'[O' and i + 2 >= n):
+                    break
+                if (data[i + 1] in b'[O' and data[i + 2] in ESCAPE_KEYS):
+                    keys.append(ESCAPE_KEYS[data[i + 2]])
+                    i += 3
+                else:
+                    i += 1
+            else:
+                keys.append(byte)
+                i += 1
+        self.pending = data[i:]
+        return keys
+
+
+class TerminalSession(asyncio.Protocol):
+    """
+    A connection playing one game.
+
+    Attributes:
+        server (TerminalServer): The server.
+        transport (Transport): The connection.
+        keys (KeyParser): The parser for the bytes received.
+        screen (AnsiScreen): What the player's terminal shows.
+        game (Tetris): The game.
+        drawn_version (int): The game's version when the last frame was drawn.
+        gravity_timer (Timer): The next gravity step.
+        lock_timer (Timer): The lock delay of a landed block, or None when the block hasn't landed.
+        lines_to_clear (bool): Whether the last locked block left full lines.
+        topped_out (bool): Whether the game is over.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.keys = KeyParser()
+        self.screen = AnsiScreen()
+        self.game = Tetris(seed=get_random_seed())
+        self.game.add_listener(self.handle_game_event)
+        self.drawn_version = None
+        self.gravity_timer = None
+        self.lock_timer = None
+        self.lines_to_clear = False
+        self.topped_out = False
+
+
+    def connection_made(self, transport):
+        """
+        Starts the game, and draws its first frame.
+
+        Args:
+            transport (Transport): The connection.
+        """
+        self.transport = transport
+        self.server.sessions.add(self)
+        transport.write(TELNET_SETUP)
+        self.schedule_gravity()
+        self.draw()
+
+
+    def connection_lost(self, exc):
+        """
+        Stops the game.
+
+        Args:
+            exc (Exception): The error that closed the connection, or None.
+        """
+        self.server.sessions.discard(self)
+        self.cancel_timers()
+
+
+    def data_received(self, data):
+        """
+        Applies the keys that arrived, then draws one frame for all of them.
+
+        Args:
+            data (bytes): The bytes received.
+        """
+        for key in self.keys.feed(data):
+            if (key in QUIT_KEYS):
+                self.end_game()
+                return
+            action = KEY_ACTIONS.get(key)
+            if (action is None):
+                continue
+            self.game.apply_action(action)
+            # Moving a block that has landed gives it the whole lock delay again, like the local frontend
+            if self.lock_timer is not None:
+                self.lock_timer.cancel()
+                self.lock_timer = None
+            if (action == 'SOFT_DROP'):
+                self.schedule_gravity()
+            self.settle()
+            if self.topped_out:
+                return
+        self.draw()
+
+
+    def handle_game_event(self, event):
+        """
+        Notes when a locked block leaves full lines or tops out, to be handled once the action is finished.
+
+        Args:
+            event (GameEvent): The event.
+        """
+        if (event.type == 'PIECE_LOCKED'):
+            self.lines_to_clear = event.full_lines > 0
+        elif (event.type == 'GAME_OVER'):
+            self.topped_out = True
+
+
+    def settle(self):
+        """
+        Clears full lines after a lock, and ends the game on a top out.
+        """
+        if self.lines_to_clear:
+            self.lines_to_clear = False
+            self.game.apply_action('CLEAR')
+        if self.topped_out:
+            self.end_game()
+
+
+    def draw(self):
+        """
+        Sends the cells that changed, if the game has changed since the last frame.
+        """
+        if (self.game.version == self.drawn_version or self.transport.is_closing()):
+            return
+        output = self.screen.draw(render_rows(self.game))
+        self.drawn_version = self.game.version
+        self.transport.write(output)
+        self.server.frames += 1
+        self.server.bytes_sent += len(output)
+
+
+    def end_game(self):
+        """
+        Draws the last frame with the score under the board, and closes the connection.
+        """
+        self.cancel_timers()
+        self.draw()
+        message = f'{move_cursor(0, len(self.screen.rows))}GAME OVER  score {self.game.score}\r\n{SHOW_CURSOR}'
+        self.transport.write(message.encode())
+        self.transport.close()
+
+
+    def abort(self):
+        """
+        Closes the connection after one of its timers raised, leaving the terminal's cursor showing.
+        """
+        self.cancel_timers()
+        if (self.transport is not None and not self.transport.is_closing()):
+            self.transport.write(f'\r\n{SHOW_CURSOR}'.encode())
+            self.transport.close()
+
+
+    def cancel_timers(self):
+        """
+        Cancels the gravity and lock timers.
+        """
+        if self.gravity_timer is not None:
+            self.gravity_timer.cancel()
+            self.gravity_timer = None
+        if self.lock_timer is not None:
+            self.lock_timer.cancel()
+            self.lock_timer = None
+
+
+    def schedule_gravity(self):
+        """
+        Restarts the wait for the next gravity step, using the interval for the current level.
+        """
+        if self.gravity_timer is not None:
+            self.gravity_timer.cancel()
+        self.gravity_timer = self.server.wheel.schedule(self.game.get_move_time_interval(), self.handle_gravity,
+                                                       self.abort)
+
+
+    def handle_gravity(self):
+        """
+        Moves the block down, or starts the lock delay if it has landed.
+        """
+        self.gravity_timer = None
+        self.schedule_gravity()
+        game = self.game
+        if not game.check_y_collision(game.current_block):
+            game.apply_action('SOFT_DROP')
+            self.draw()
+        elif self.lock_timer is None:
+            self.lock_timer = self.server.wheel.schedule(game.get_lock_time_interval(), self.handle_lock, self.abort)
+
+
+    def handle_lock(self):
+        """
+        Locks a block whose lock delay has run out.
+        """
+        self.lock_timer = None
+        self.game.apply_action('LOCK')
+        self.schedule_gravity()
+        self.settle()
+        if not self.topped_out:
+            self.draw()
+
+
+class TerminalServer:
+    """
+    Runs the timers of every game and counts what is sent.
+
+    Attributes:
+        wheel (TimerWheel): The gravity and lock timers of every session.
+        sessions (set): The connected sessions.
+        frames (int): The number of frames drawn.
+        bytes_sent (int): The number of bytes of frames sent.
+    """
+
+    def __init__(self, now):
+        self.wheel = TimerWheel(TICK_TIME, now)
+        self.sessions = set()
+        self.frames = 0
+        self.bytes_sent = 0
+
+
+    async def run_timers(self):
+        """
+        Advances the timer wheel every tick, forever. A session whose timer raises is closed, and the rest play on.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.wheel.tick_time)
+            self.wheel.advance(loop.time())
+
+
+    async def report(self, interval):
+        """
+        Prints the number of sessions, the frames and bytes sent and the CPU used at each interval, forever.
+
+        Args:
+            interval (float): The time between reports, in seconds.
+        """
+        loop = asyncio.get_running_loop()
+        last_time, last_cpu, last_frames, last_bytes = loop.time(), process_time(), self.frames, self.bytes_sent
+        while True:
+            await asyncio.sleep(interval)
+            now, cpu = loop.time(), process_time()
+            frames = self.frames - last_frames
+            sent = self.bytes_sent - last_bytes
+            elapsed = now - last_time
+            sessions = len(self.sessions)
+            print(f'{sessions} sessions, {frames/elapsed:,.0f} frames/s, {sent/max(frames, 1):.1f} bytes/frame, '
+                  f'{sent/elapsed/1024:,.1f} KiB/s, {(cpu - last_cpu)/elapsed*100:.1f}% CPU'
+                  + (f', {(cpu - last_cpu)/elapsed/sessions*1000:.3f} ms CPU/s per session' if sessions else ''),
+                  flush=True)
+            last_time, last_cpu, last_frames, last_bytes = now, cpu, self.frames, self.bytes_sent
+
+
+async def serve(host=HOST, port=PORT, report_interval=None):
+    """
+    Runs a server until it is cancelled.
+
+    Args:
+        host (str): The address to listen on.
+        port (int): The port to listen on.
+        report_interval (float): The time between printed reports, in seconds, or None for no reports.
+    """
+    loop = asyncio.get_running_loop()
+    server = TerminalServer(loop.time())
+    listener = await loop.create_server(lambda: TerminalSession(server), host, port)
+    tasks = [server.run_timers()]
+    if report_interval:
+        tasks.append(server.report(report_interval))
+    async with listener:
+        await asyncio.gather(*tasks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=HOST, help=f'address to listen on (default {HOST})')
+    parser.add_argument('--port', type=int, default=PORT, help=f'port to listen on (default {PORT})')
+    parser.add_argument('--report', type=float, metavar='SECONDS', help='print the load every SECONDS')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.report))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
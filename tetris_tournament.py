@@ -0,0 +1,204 @@
+"""
+Plays many seeded headless games with the bot across a pool of processes, streaming each result to a JSON lines file.
+
+    python tetris_tournament.py --games 10000 [--workers N] [--weight holes=-0.5] [--output results.jsonl]
+
+A game that raises is recorded with its error. A game that kills its worker process is found by replaying the
+games that were running at the time one by one, and is recorded as crashed, while the rest carry on in a new pool.
+"""
+import argparse
+import json
+import os
+import sys
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from statistics import mean, median, stdev
+from time import perf_counter
+
+from tetris_logic import Tetris, Board, BitBoard
+from tetris_bot import TetrisBot, DEFAULT_WEIGHTS
+
+
+BOARD_TYPES = {'Board': Board, 'BitBoard': BitBoard}
+
+# Games submitted per worker, so that workers never wait for the next game
+GAMES_IN_FLIGHT_PER_WORKER = 2
+
+
+def play_game(seed, max_blocks, weights, board_type_name):
+    """
+    Plays one game with the bot. Runs in a worker process.
+
+    Args:
+        seed (int): The seed for the game.
+        max_blocks (int): The maximum number of blocks to place.
+        weights (dict): The bot's weights.
+        board_type_name (str): The name of the board class to use.
+
+    Returns:
+        dict: The seed, score, lines cleared, level reached, blocks placed, whether the game topped out and how long it took.
+    """
+    start = perf_counter()
+    bot = TetrisBot(weights)
+    game = Tetris(board_type=BOARD_TYPES[board_type_name], seed=seed)
+    blocks = 0
+    lines = 0
+    while (blocks < max_blocks and not game.check_game_over()):
+        for action in bot.choose_actions(game):
+            game.apply_action(action)
+        lines += len(game.get_cleared_lines())
+        game.apply_action('CLEAR')
+        blocks += 1
+    return {
+        'seed': seed,
+        'score': game.score,
+        'lines': lines,
+        'level': game.get_current_level(),
+        'pieces': blocks,
+        'topped_out': game.check_game_over(),
+        'seconds': round(perf_counter() - start, 4)
+    }
+
+
+def play_game_safely(play, seed, *args):
+    """
+    Plays a game, turning any exception into a result so one bad game doesn't stop the tournament.
+
+    Args:
+        play (function): The function that plays a game, like play_game.
+        seed (int): The seed for the game.
+        *args: The rest of the arguments to play.
+
+    Returns:
+        dict: The result, or the seed and the error.
+    """
+    try:
+        return play(seed, *args)
+    except Exception:
+        return {'seed': seed, 'error': traceback.format_exc(limit=-3)}
+
+
+def run_pool(seeds, workers, args, on_result, play=play_game):
+    """
+    Plays games in a process pool until they're all done or a worker process dies.
+
+    Args:
+        seeds (deque): The seeds of the games to play. Seeds are popped as they're submitted.
+        workers (int): The number of worker processes.
+        args (tuple): The arguments to play after the seed.
+        on_result (function): Called with each result as it finishes.
+        play (function): The function that plays a game.
+
+    Returns:
+        list: The seeds of the games that were running when a worker died, or an empty list if none did.
+    """
+    in_flight = {}
+    with ProcessPoolExecutor(workers) as executor:
+        try:
+            while (seeds or in_flight):
+                while (seeds and len(in_flight) < workers*GAMES_IN_FLIGHT_PER_WORKER):
+                    seed = seeds.popleft()
+                    in_flight[executor.submit(play_game_safely, play, seed, *args)] = seed
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    del in_flight[future]
+                    on_result(result)
+        except BrokenProcessPool:
+            return list(in_flight.values())
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    return []
+
+
+def run_tournament(seeds, workers, args, on_result, play=play_game):
+    """
+    Plays every game, recovering from worker processes that die.
+
+    When a worker dies, every game it might have been playing is replayed alone in its own process.
+    The one that dies again is recorded as crashed, and the rest of the games go on in a new pool.
+
+    Args:
+        seeds (list): The seeds of the games to play.
+        workers (int): The number of worker processes.
+        args (tuple): The arguments to play after the seed.
+        on_result (function): Called with each result as it finishes.
+        play (function): The function that plays a game.
+    """
+    seeds = deque(seeds)
+    while seeds:
+        for seed in run_pool(seeds, workers, args, on_result, play):
+            if run_pool(deque([seed]), 1, args, on_result, play):
+                on_result({'seed': seed, 'error': 'worker process crashed'})
+
+
+def summarise(results, elapsed):
+    """
+    Prints aggregate statistics of the finished games.
+
+    Args:
+        results (list): The results of every game.
+        elapsed (float): The wall time of the tournament, in seconds.
+    """
+    games = [result for result in results if 'error' not in result]
+    print(f'{len(results)} games in {elapsed:.1f} s ({len(results)/elapsed:.1f} games/s), '
+          f'{len(results) - len(games)} failed')
+    if not games:
+        return
+    for key in ('score', 'lines', 'level', 'pieces'):
+        values = [game[key] for game in games]
+        spread = stdev(values) if len(values) > 1 else 0.0
+        print(f'{key:<8} mean {mean(values):>10.1f}  median {median(values):>8}  stdev {spread:>8.1f}  '
+              f'min {min(values):>6}  max {max(values):>6}')
+    print(f'topped out in {sum(game["topped_out"] for game in games)} of {len(games)} games')
+
+
+def parse_weight(text):
+    """
+    Parses a --weight option.
+
+    Args:
+        text (str): The option, as name=value.
+
+    Returns:
+        tuple: The feature name and its weight.
+    """
+    name, _, value = text.partition('=')
+    if name not in DEFAULT_WEIGHTS:
+        raise argparse.ArgumentTypeError(f'unknown feature {name}, expected one of {", ".join(DEFAULT_WEIGHTS)}')
+    return name, float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', type=int, default=100, help='number of games')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game, incremented for each game')
+    parser.add_argument('--pieces', type=int, default=500, help='maximum blocks to place per game')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--board', choices=BOARD_TYPES, default='Board', help='board class to play on')
+    parser.add_argument('--weight', type=parse_weight, action='append', default=[], metavar='NAME=VALUE',
+                        help='override one of the bot\'s weights')
+    parser.add_argument('--output', default='results.jsonl', help='JSON lines file to stream results to')
+    args = parser.parse_args(argv)
+
+    weights = DEFAULT_WEIGHTS | dict(args.weight)
+    results = []
+    start = perf_counter()
+    with open(args.output, 'w') as file:
+        def on_result(result):
+            results.append(result)
+            file.write(json.dumps(result) + '\n')
+            file.flush()
+
+        run_tournament(range(args.seed, args.seed + args.games), args.workers,
+                       (args.pieces, weights, args.board), on_result)
+
+    summarise(results, perf_counter() - start)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())